@@ -1,67 +1,417 @@
+import os
+import re
+import math
+import json
+import time
+import tempfile
 import base64
+import struct
 from flask_cors import CORS
-from flask import Flask, request, jsonify
-from core.audio_api import generate_dialogue_audio
+from flask import Flask, Response, abort, request, jsonify, send_file, stream_with_context
+from core import ratelimit, tracing
 from core.agent_manager import AgentManager
+from core.audio_api import TTS_CACHE
+from core.audio_codecs import UnsupportedAudioFormat, negotiate_audio_format
+from core.retrieval import ALLOWED_FILE_TYPES, load_context_index
+from core.pipeline import (
+    ExchangeCancelled, convert_exchange_audio, replay_exchange, run_exchange, stream_exchange
+)
+from core.episode import EpisodeTrack, delete_episode, episode_paths, read_chapters
+from core.sessions import SessionLimitError, SessionStore
 
 DEFAULT_VOICE_EN_MAN = "en_man"
 DEFAULT_VOICE_MABEL = "mabel"
 
+# /api/stream frames: 1 byte kind, 1 byte speaker, 4 byte big-endian payload length, payload.
+# Kinds: T = reply text (JSON), A = raw 16-bit mono PCM, E = end of clip,
+#        X = synthesis error (UTF-8), D = exchange done (JSON with timings)
+FRAME_HEADER = struct.Struct(">ccI")
+FRAME_KINDS = {"text": b"T", "audio": b"A", "end": b"E", "error": b"X", "done": b"D"}
+
+EPISODE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Session-Id", "X-Episode-Id", "Server-Timing"])
+
+
+def release_session(session):
+    """A session's episodes are only reachable through it, so they go when it is evicted."""
+    for episode_id in session.episode_ids:
+        delete_episode(episode_id)
 
-manager = None
-initial_topic = ""
-last_response = ""
+
+# Every browser gets its own debate, keyed by the session id it sends back
+SESSIONS = SessionStore(ttl_seconds=30 * 60, max_sessions=100, on_evict=release_session)
 
 @app.route("/")
 def home():
     return "Hello, Flask Server is Running! 🚀"
 
 
+def get_session(data):
+    """
+    Looks up (or starts) the caller's debate and applies the end/topic fields of the request.
+    The session id comes from the body or the X-Session-Id header; a new one is issued if absent.
+    Ending the debate or changing its topic starts a new one and drops any speculative exchange.
+    """
+    session_id = data.get('session_id') or request.headers.get("X-Session-Id")
+    session = SESSIONS.get_or_create(
+        session_id, lambda: AgentManager(data['agent_1'], data['agent_2'])
+    )
+
+    with session.lock:
+        if session.apply_request(data['agent_1'], data['agent_2'], data['topic_input'], data['end']):
+            # A new debate gets a new recording; earlier ones stay downloadable
+            session.episode = EpisodeTrack()
+            session.episode_ids.append(session.episode.episode_id)
+
+    return session
+
+
+def record_episode_turn(session, speaker, text, audio=None, pcm=None):
+    """Appends a finished turn to the session's episode; a failure never fails the exchange."""
+    try:
+        if pcm is not None:
+            session.episode.append_pcm(pcm, speaker, text)
+        elif audio:
+            session.episode.append_audio(audio, speaker, text)
+    except Exception as e:
+        print(f"Could not add turn to episode {session.episode.episode_id}: {e}")
+
+
+def session_limit_response(error):
+    return jsonify({"error": str(error)}), 503
+
+
+def backpressure_response():
+    """
+    A 503 with Retry-After when the API queues are too long for another exchange to start
+    in time; None when it can go ahead.
+    """
+    if ratelimit.LIMITER is None:
+        return None
+    retry_after = ratelimit.LIMITER.retry_after(("llm", "tts"))
+    if retry_after is None:
+        return None
+    response = jsonify({"error": "the API is busy, try again shortly", "retry_after": round(retry_after, 1)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(math.ceil(retry_after))
+    return response
+
+
+def encode_frame(kind, speaker, payload):
+    if payload is None:
+        body = b""
+    elif isinstance(payload, (bytes, bytearray, memoryview)):
+        body = bytes(payload)
+    elif isinstance(payload, str):
+        body = payload.encode("utf-8")
+    else:
+        body = json.dumps(payload).encode("utf-8")
+    return FRAME_HEADER.pack(FRAME_KINDS[kind], (speaker or "-").encode("ascii"), len(body)) + body
+
+
+def speculate_next_exchange(session, audio_format="wav"):
+    """
+    Starts generating the session's next exchange (both turns and their audio) while the
+    client is still playing the current one. The caller holds session.lock.
+
+    The audio is kept as WAV, which /api/stream replays as PCM without a lossy round trip,
+    plus one encoding in audio_format (the format the client last asked for) if that differs.
+
+    The job has the manager to itself until it is taken: the handlers wait for it before
+    running an exchange, /api/context before changing the manager, and a new debate gets
+    a new manager. A failed or cancelled job leaves the debate as it found it.
+    """
+    manager, topic = session.manager, session.topic
+
+    def job(cancelled):
+        checkpoint = manager.checkpoint()
+        try:
+            # Prefetching must never delay a request someone is waiting on
+            with ratelimit.priority(ratelimit.BATCH):
+                exchange = run_exchange(
+                    manager,
+                    topic,
+                    DEFAULT_VOICE_MABEL,
+                    DEFAULT_VOICE_EN_MAN,
+                    audio_speed_factor=1.1,
+                    cancelled=cancelled,
+                )
+            # A failed turn comes back as error text, which must not be served (or spoken) later
+            if manager.replies_since(checkpoint) < 2:
+                raise RuntimeError(f"a turn failed: {exchange['response1']} | {exchange['response2']}")
+            exchanges = {"wav": exchange}
+            if audio_format != "wav":
+                exchanges[audio_format] = convert_exchange_audio(exchange, audio_format)
+            if cancelled.is_set():
+                raise ExchangeCancelled()
+            return exchanges
+        except Exception:
+            # Nobody will hear this exchange, so its turns leave the debate again
+            manager.rollback(checkpoint)
+            raise
+
+    session.speculate(topic, job)
+
+
+def take_speculative_exchange(session, audio_format="wav"):
+    """
+    The precomputed next exchange (waiting for it if still running), or None if there is
+    none or it failed, in which case the caller runs the exchange live.
+    Its audio is encoded from the WAV now if it was not prepared in audio_format.
+    """
+    speculation = session.take_speculation(session.topic)
+    if speculation is None:
+        return None
+
+    start = time.perf_counter()
+    try:
+        exchanges = speculation.result()
+    except Exception as e:
+        # The job already rolled its turns back
+        print(f"Speculative exchange failed, running it live instead: {e}")
+        return None
+    exchange = exchanges.get(audio_format) or convert_exchange_audio(exchanges["wav"], audio_format)
+    exchange["timings"]["speculation_wait"] = round((time.perf_counter() - start) * 1000, 1)
+    return exchange
+
+
 @app.route("/api/test", methods=["POST"])
 def test():
-    global manager, initial_topic, last_response
-    data = request.get_json()
+    # Stage spans recorded while serving the request are reported in its Server-Timing header
+    with tracing.trace("api.test") as trace:
+        return run_test_exchange(trace)
 
-    prompt_1 = data['agent_1']
-    prompt_2 = data['agent_2']
 
-    end = data['end']
+def run_test_exchange(trace):
+    data = request.get_json()
+
+    # Audio format: "format" in the body or query string, else the Accept header, else WAV
+    try:
+        audio_format = negotiate_audio_format(
+            data.get('format') or request.args.get('format'), request.headers.get("Accept")
+        )
+    except UnsupportedAudioFormat as e:
+        return jsonify({"error": str(e)}), 400
 
-    if end:
-        manager = None
-        initial_topic = ""
+    # Shed load up front rather than letting the exchange queue behind a long API backlog
+    busy = backpressure_response()
+    if busy is not None:
+        return busy
 
-    if manager is None:
-        manager = AgentManager(prompt_1, prompt_2)
-    
-    if not initial_topic:
-        initial_topic = data['topic_input']
+    try:
+        session = get_session(data)
+    except SessionLimitError as e:
+        return session_limit_response(e)
 
-    response1 = manager.run_turn(initial_topic)
-    response2 = manager.run_turn(response1)
-    last_response = response2
+    # One exchange at a time per debate; other sessions run in parallel
+    with session.lock:
+        exchange = take_speculative_exchange(session, audio_format.name)
+        if exchange is None:
+            # run both turns, overlapping agent A's audio with agent B's generation;
+            # the audio stays in memory so concurrent requests never share a file
+            exchange = run_exchange(
+                session.manager,
+                session.topic,
+                DEFAULT_VOICE_MABEL,
+                DEFAULT_VOICE_EN_MAN,
+                audio_speed_factor=1.1,
+                audio_format=audio_format.name,
+            )
+        session.last_response = exchange["response2"]
+        session.touch()
 
-    print("Audio response obtained")
+        # The episode decodes the clips whatever their format
+        record_episode_turn(session, "a", exchange["response1"], audio=exchange["a_audio"])
+        record_episode_turn(session, "b", exchange["response2"], audio=exchange["b_audio"])
 
-    # turn response1 and response2 into audio files
-    generate_dialogue_audio(response1, "audio_references/a.wav", DEFAULT_VOICE_MABEL, audio_speed_factor=1.1)
-    generate_dialogue_audio(response2, "audio_references/b.wav", DEFAULT_VOICE_EN_MAN, audio_speed_factor=1.1)
+        speculate_next_exchange(session, audio_format.name)
 
-    print("Finished generating audio files")
+    print(f"Finished exchange, stage timings (ms): {exchange['timings']}")
 
-    with open("audio_references/a.wav", "rb") as f:
-        a_data = base64.b64encode(f.read()).decode("utf-8")
-    with open("audio_references/b.wav", "rb") as f:
-        b_data = base64.b64encode(f.read()).decode("utf-8")
+    with tracing.span("base64.encode", bytes=len(exchange["a_audio"]) + len(exchange["b_audio"])):
+        a_data = base64.b64encode(exchange["a_audio"]).decode("utf-8")
+        b_data = base64.b64encode(exchange["b_audio"]).decode("utf-8")
 
-    return jsonify({
-        "response1": response1,
-        "response2": response2,
+    response = jsonify({
+        "session_id": session.session_id,
+        "episode_id": session.episode.episode_id,
+        "response1": exchange["response1"],
+        "response2": exchange["response2"],
         "a_audio": a_data,
-        "b_audio": b_data
+        "b_audio": b_data,
+        "audio_format": audio_format.name,
+        "audio_mime_type": audio_format.mime_type,
+        "timings": exchange["timings"]
     })
+    response.headers["X-Session-Id"] = session.session_id
+    response.headers["Server-Timing"] = trace.server_timing(exchange["timings"])
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+@app.route("/api/stream", methods=["POST"])
+def stream():
+    """
+    Same exchange as /api/test, but text and raw PCM are sent as chunked frames as soon as they exist.
+    A speculatively generated exchange is replayed as frames instead of being streamed live.
+    """
+    data = request.get_json()
+
+    busy = backpressure_response()
+    if busy is not None:
+        return busy
+
+    try:
+        session = get_session(data)
+    except SessionLimitError as e:
+        return session_limit_response(e)
+
+    def generate():
+        with session.lock:
+            exchange = take_speculative_exchange(session)
+            if exchange is not None:
+                events = replay_exchange(exchange)
+            else:
+                events = stream_exchange(
+                    session.manager,
+                    session.topic,
+                    DEFAULT_VOICE_MABEL,
+                    DEFAULT_VOICE_EN_MAN,
+                    audio_speed_factor=1.1,
+                )
+
+            texts, clips = {}, {"a": [], "b": []}
+            for kind, speaker, payload in events:
+                if kind == "text":
+                    texts[speaker] = payload["text"]
+                    if speaker == "b":
+                        session.last_response = payload["text"]
+                elif kind == "audio":
+                    clips[speaker].append(payload)
+                elif kind == "end" and clips[speaker]:
+                    # (a failed synthesis has no audio, and gets no chapter)
+                    record_episode_turn(
+                        session, speaker, texts.get(speaker, ""), pcm=b"".join(clips[speaker])
+                    )
+                if kind == "done":
+                    print(f"Finished streamed exchange, stage timings (ms): {payload['timings']}")
+                yield encode_frame(kind, speaker, payload)
+            session.touch()
+            speculate_next_exchange(session)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/octet-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Session-Id": session.session_id,
+            "X-Episode-Id": session.episode.episode_id,
+        },
+    )
+
+
+@app.route("/api/context", methods=["POST"])
+def upload_context():
+    """
+    Attaches a context document (.txt, .docx or .pdf, multipart field "file") to the caller's
+    session. It is indexed once per distinct content; every later turn of the session's
+    debates gets the passages relevant to it.
+    """
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"error": "no file uploaded"}), 400
+    extension = os.path.splitext(upload.filename)[1].lower()
+    if extension not in ALLOWED_FILE_TYPES:
+        return jsonify({"error": f"unsupported file type, expected one of: {', '.join(ALLOWED_FILE_TYPES)}"}), 400
+
+    session_id = request.form.get("session_id") or request.headers.get("X-Session-Id")
+    try:
+        # Placeholder agents; the first exchange starts the debate with the real ones
+        session = SESSIONS.get_or_create(session_id, lambda: AgentManager("", ""))
+    except SessionLimitError as e:
+        return session_limit_response(e)
+
+    # Indexing happens outside the session lock; a re-upload of the same content is a cache hit
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"context{extension}")
+        upload.save(path)
+        try:
+            index = load_context_index(path)
+        except Exception as e:
+            print(f"Could not index context file {upload.filename}: {e}")
+            return jsonify({"error": f"could not read {upload.filename}: {e}"}), 400
+
+    with session.lock:
+        # A speculative exchange may be running on the manager; let it finish first
+        session.wait_for_speculation()
+        session.context_index = index
+        if session.topic:
+            session.manager.set_context_index(index)
+        session.touch()
+
+    response = jsonify({
+        "session_id": session.session_id,
+        "file": upload.filename,
+        "passages": len(index.passages),
+    })
+    response.headers["X-Session-Id"] = session.session_id
+    return response
+
+
+@app.route("/api/episodes/<episode_id>", methods=["GET"])
+def episode_audio(episode_id):
+    """
+    The debate recorded so far as one WAV file. Range requests are supported, so it can be
+    streamed or re-fetched incrementally while the debate goes on.
+    """
+    if not EPISODE_ID_PATTERN.match(episode_id):
+        abort(404)
+    path, _ = episode_paths(episode_id)
+    if not os.path.isfile(path):
+        abort(404)
+    return send_file(
+        os.path.abspath(path),
+        mimetype="audio/wav",
+        conditional=True,
+        download_name=f"debate-{episode_id}.wav",
+    )
+
+
+@app.route("/api/episodes/<episode_id>/chapters", methods=["GET"])
+def episode_chapters(episode_id):
+    """Speaker, text and start/end time of every turn in the episode."""
+    if not EPISODE_ID_PATTERN.match(episode_id):
+        abort(404)
+    _, path = episode_paths(episode_id)
+    if not os.path.isfile(path):
+        abort(404)
+    return jsonify(read_chapters(path))
+
+
+@app.route("/api/sessions", methods=["GET"])
+def session_stats():
+    """Live debate sessions with their idle time and approximate memory use."""
+    return jsonify(SESSIONS.stats())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text format: per-stage duration histograms, token counters and cache/session/queue gauges."""
+    cache = TTS_CACHE.stats()
+    gauges = {f"tts_cache_{name}": value for name, value in cache.items()}
+    gauges["live_sessions"] = len(SESSIONS)
+    if ratelimit.LIMITER is not None:
+        gauges.update(ratelimit.LIMITER.gauges())
+    return Response(tracing.METRICS.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/tts-cache", methods=["GET"])
+def tts_cache_stats():
+    """Hit/miss/eviction counters and sizes of the TTS cache."""
+    return jsonify(TTS_CACHE.stats())
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,151 @@
+import math
+import base64
+import asyncio
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from core import ratelimit, tracing
+from core.agent_manager import AgentManager
+from core.audio_api import TTS_CACHE
+from core.audio_codecs import UnsupportedAudioFormat, negotiate_audio_format
+from core.pipeline import arun_exchange
+from core.sessions import SessionLimitError, SessionStore
+
+# Async counterpart of app.py: every exchange is a set of tasks on one event loop,
+# so a single process can keep hundreds of debates in flight.
+# Run with: uvicorn asgi:app --port 5000
+
+DEFAULT_VOICE_EN_MAN = "en_man"
+DEFAULT_VOICE_MABEL = "mabel"
+
+SESSIONS = SessionStore(ttl_seconds=30 * 60, max_sessions=1000)
+
+
+async def home(request: Request):
+    return PlainTextResponse("Hello, ASGI Server is Running! 🚀")
+
+
+async def get_session(request: Request, data: dict):
+    """
+    Same session handling as app.get_session (DebateSession.apply_request), using the
+    session's asyncio lock. Debates served here are not recorded as episodes.
+    """
+    session_id = data.get('session_id') or request.headers.get("X-Session-Id")
+    session = SESSIONS.get_or_create(
+        session_id, lambda: AgentManager(data['agent_1'], data['agent_2'])
+    )
+
+    async with session.async_lock:
+        session.apply_request(data['agent_1'], data['agent_2'], data['topic_input'], data['end'])
+
+    return session
+
+
+async def test(request: Request):
+    # Stage spans recorded while serving the request are reported in its Server-Timing header
+    with tracing.trace("api.test") as trace:
+        return await run_test_exchange(request, trace)
+
+
+async def run_test_exchange(request: Request, trace: tracing.Trace):
+    data = await request.json()
+
+    try:
+        audio_format = negotiate_audio_format(
+            data.get('format') or request.query_params.get('format'), request.headers.get("Accept")
+        )
+    except UnsupportedAudioFormat as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    # Same load shedding as app.backpressure_response
+    retry_after = ratelimit.LIMITER.retry_after(("llm", "tts")) if ratelimit.LIMITER else None
+    if retry_after is not None:
+        return JSONResponse(
+            {"error": "the API is busy, try again shortly", "retry_after": round(retry_after, 1)},
+            status_code=503,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    try:
+        session = await get_session(request, data)
+    except SessionLimitError as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+
+    async with session.async_lock:
+        exchange = await arun_exchange(
+            session.manager,
+            session.topic,
+            DEFAULT_VOICE_MABEL,
+            DEFAULT_VOICE_EN_MAN,
+            audio_speed_factor=1.1,
+            audio_format=audio_format.name,
+        )
+        session.last_response = exchange["response2"]
+        session.touch()
+
+    print(f"Finished exchange, stage timings (ms): {exchange['timings']}")
+
+    with tracing.span("base64.encode", bytes=len(exchange["a_audio"]) + len(exchange["b_audio"])):
+        a_data = base64.b64encode(exchange["a_audio"]).decode("utf-8")
+        b_data = base64.b64encode(exchange["b_audio"]).decode("utf-8")
+
+    return JSONResponse({
+        "session_id": session.session_id,
+        "response1": exchange["response1"],
+        "response2": exchange["response2"],
+        "a_audio": a_data,
+        "b_audio": b_data,
+        "audio_format": audio_format.name,
+        "audio_mime_type": audio_format.mime_type,
+        "timings": exchange["timings"],
+    }, headers={
+        # Sent back by the client (header or body) to keep talking to the same debate
+        "X-Session-Id": session.session_id,
+        "Server-Timing": trace.server_timing(exchange["timings"]),
+        "Vary": "Accept",
+    })
+
+
+async def session_stats(request: Request):
+    # Measuring every session's memory is CPU work; keep it off the event loop
+    return JSONResponse(await asyncio.to_thread(SESSIONS.stats))
+
+
+async def tts_cache_stats(request: Request):
+    return JSONResponse(TTS_CACHE.stats())
+
+
+async def metrics(request: Request):
+    gauges = {f"tts_cache_{name}": value for name, value in TTS_CACHE.stats().items()}
+    gauges["live_sessions"] = len(SESSIONS)
+    if ratelimit.LIMITER is not None:
+        gauges.update(ratelimit.LIMITER.gauges())
+    return Response(tracing.METRICS.render(gauges), media_type="text/plain; version=0.0.4")
+
+
+app = Starlette(
+    routes=[
+        Route("/", home),
+        Route("/api/test", test, methods=["POST"]),
+        Route("/api/sessions", session_stats, methods=["GET"]),
+        Route("/api/tts-cache", tts_cache_stats, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["*"],
+            allow_methods=["*"],
+            allow_headers=["*"],
+            expose_headers=["X-Session-Id", "Server-Timing"],
+        )
+    ],
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, port=5000)
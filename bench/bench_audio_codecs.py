@@ -0,0 +1,78 @@
+"""
+Encode time against bytes saved for the output formats in core/audio_codecs.py.
+
+For each format the same speech-like clip (24 kHz, 16-bit mono, like the TTS output) is
+encoded in memory. The benchmark reports the encode time, the real-time factor, the
+encoded size and the size of the base64 payload that /api/test would ship.
+
+    python -m bench.bench_audio_codecs --seconds 10 --out bench/results/audio_codecs.json
+"""
+import os
+
+# One encoder thread per request, so measure on one core
+for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(variable, "1")
+
+import sys
+import json
+import time
+import base64
+import argparse
+import platform
+
+import soundfile as sf
+
+from bench.bench_time_stretch import SAMPLE_RATE, best_of, speech_like_signal
+from core.audio_api import pcm_to_wav
+from core.audio_codecs import AUDIO_FORMATS, encode_audio
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Encode time vs. size of the audio output formats.")
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the test clip")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", default="bench/results/audio_codecs.json")
+    args = parser.parse_args(argv)
+
+    wav = pcm_to_wav(speech_like_signal(args.seconds), 1, 2, SAMPLE_RATE)
+    wav_b64 = len(base64.b64encode(wav))
+
+    results = []
+    for name, audio_format in AUDIO_FORMATS.items():
+        encoded = encode_audio(wav, audio_format)
+        seconds = best_of(args.repeats, lambda: encode_audio(wav, audio_format))
+        b64 = len(base64.b64encode(encoded))
+        results.append({
+            "format": name,
+            "encode_ms": round(seconds * 1000, 2),
+            "rtf": round(seconds / args.seconds, 5),
+            "bytes": len(encoded),
+            "base64_bytes": b64,
+            "kbit_per_s": round(len(encoded) * 8 / args.seconds / 1000, 1),
+            "saved_vs_wav": round(1 - b64 / wav_b64, 3),
+        })
+        r = results[-1]
+        print(
+            f"{name:5s} encode {r['encode_ms']:8.2f} ms  {r['bytes']:9d} bytes  "
+            f"{r['kbit_per_s']:6.1f} kbit/s  saved {r['saved_vs_wav']:.1%}"
+        )
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "libsndfile": sf.__libsndfile_version__,
+            "platform": platform.platform(),
+            "input_s": args.seconds,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Real-time factor of the pitch-preserving time-stretch (core/dsp.py) on one core.
+
+RTF = processing time / duration of the input audio, so 0.01 means one second of speech
+is stretched in 10 ms. Both the whole-clip path (time_stretch) and the streaming path
+(TimeStretcher fed 8192-byte blocks, as stream_dialogue_audio does) are measured.
+
+    python -m bench.bench_time_stretch --seconds 20 --out bench/results/time_stretch.json
+"""
+import os
+
+# Pin BLAS to one thread before NumPy is imported, the figures are per core
+for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(variable, "1")
+
+import sys
+import json
+import time
+import argparse
+import platform
+
+import numpy as np
+
+from core.dsp import TimeStretcher, time_stretch
+
+SAMPLE_RATE = 24000
+BLOCK_BYTES = 8192
+
+
+def speech_like_signal(seconds: float, seed: int = 0) -> bytes:
+    """Harmonic tone with a wandering pitch and a syllable-rate envelope, as int16 PCM."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voice = sum(np.sin(h * phase) / h for h in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+    signal = voice * envelope + 0.02 * rng.standard_normal(len(t))
+    return (signal / np.abs(signal).max() * 12000).astype("<i2").tobytes()
+
+
+def best_of(repeats: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def stream(pcm: bytes, speed: float) -> bytes:
+    stretcher = TimeStretcher(speed, SAMPLE_RATE)
+    out = [stretcher.process(pcm[i:i + BLOCK_BYTES]) for i in range(0, len(pcm), BLOCK_BYTES)]
+    out.append(stretcher.flush())
+    return b"".join(out)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time-stretch real-time factor on one core.")
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of the test clip")
+    parser.add_argument("--speeds", default="1.1,1.25,1.5,2.0")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--out", default="bench/results/time_stretch.json")
+    args = parser.parse_args(argv)
+
+    pcm = speech_like_signal(args.seconds)
+    results = []
+    for speed in (float(s) for s in args.speeds.split(",")):
+        whole = best_of(args.repeats, lambda: time_stretch(pcm, speed, SAMPLE_RATE))
+        streamed = best_of(args.repeats, lambda: stream(pcm, speed))
+        results.append({
+            "speed": speed,
+            "rtf_whole": round(whole / args.seconds, 5),
+            "rtf_stream": round(streamed / args.seconds, 5),
+            "output_s": round(len(stream(pcm, speed)) / 2 / SAMPLE_RATE, 3),
+        })
+        print(
+            f"speed {speed:4.2f}: RTF whole {results[-1]['rtf_whole']:.5f}, "
+            f"streamed {results[-1]['rtf_stream']:.5f}"
+        )
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "input_s": args.seconds,
+            "block_bytes": BLOCK_BYTES,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
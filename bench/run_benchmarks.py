@@ -0,0 +1,285 @@
+"""
+End-to-end benchmarks against the local stand-in server (bench/stub_server.py).
+
+Measures:
+  ttft               time to first token of a streamed chat completion
+  first_sentence     time until LLMAgent's streaming path delivers its first sentence
+  ttfa_tts           time to the first PCM chunk from stream_dialogue_audio
+  ttfa_stream        time to the first audio frame of /api/stream
+  exchange_cold      full /api/test latency for a fresh session
+  exchange_next      /api/test latency for the next exchange of a session (speculated)
+  throughput         exchanges/s and turns/s with N clients debating concurrently
+
+    python -m bench.run_benchmarks --runs 10 --concurrency 1,4,16 --out bench/results/latest.json
+    python -m bench.run_benchmarks --compare bench/results/baseline.json
+
+The result file is JSON, so two runs can be diffed (--compare prints the p50 changes).
+"""
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import threading
+import statistics
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Callable, Dict, List
+
+from bench.stub_server import StubConfig, create_app
+
+TOPIC = "Should cities ban private cars from their centres?"
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 1),
+        "p50": percentile(0.5),
+        "p95": percentile(0.95),
+        "min": round(ordered[0], 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+def repeat(runs: int, fn: Callable[[], float]) -> Dict[str, float]:
+    return summarize([fn() for _ in range(runs)])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub(config: StubConfig) -> str:
+    """Runs the stand-in server on a background thread and returns its base URL."""
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# --- Benchmarks (the core modules are imported by main once the environment points at the stub) ---
+
+def bench_ttft(llm_api) -> float:
+    start = time.perf_counter()
+    stream = llm_api.CLIENT.chat.completions.create(
+        model=llm_api.LLM_MODEL_NAME,
+        messages=[{"role": "user", "content": TOPIC}],
+        stream=True,
+    )
+    try:
+        for event in stream:
+            if event.choices and event.choices[0].delta.content:
+                return (time.perf_counter() - start) * 1000
+    finally:
+        stream.close()
+    return float("nan")
+
+
+def bench_first_sentence(llm_api) -> float:
+    agent = llm_api.LLMAgent(name="", persona="You are a debater.", model=llm_api.LLM_MODEL_NAME)
+    first = []
+    start = time.perf_counter()
+
+    def on_sentence(sentence):
+        if not first:
+            first.append((time.perf_counter() - start) * 1000)
+
+    agent.generate_response(TOPIC, stream=True, on_sentence=on_sentence, max_words=30)
+    return first[0] if first else float("nan")
+
+
+def bench_ttfa_tts(audio_api, counter=iter(range(10 ** 9))) -> float:
+    # Unique text each run so the TTS cache cannot answer
+    text = f"Run {next(counter)}: cars in the centre cost everyone clean air and quiet streets."
+    start = time.perf_counter()
+    chunks = audio_api.stream_dialogue_audio(text, audio_api.DEFAULT_VOICE_MABEL)
+    try:
+        next(chunks)
+        return (time.perf_counter() - start) * 1000
+    finally:
+        chunks.close()
+
+
+def new_debate(**extra) -> dict:
+    return dict(agent_1="an optimist", agent_2="a sceptic", topic_input=TOPIC, end=False, **extra)
+
+
+def bench_ttfa_stream(flask_app) -> float:
+    client = flask_app.test_client()
+    start = time.perf_counter()
+    response = client.post("/api/stream", json=new_debate(), buffered=False)
+    try:
+        buffer = b""
+        for data in response.response:
+            buffer += data
+            # Frames start with a kind byte; look for the first audio frame header
+            while len(buffer) >= 6:
+                kind, length = buffer[:1], int.from_bytes(buffer[2:6], "big")
+                if kind == b"A":
+                    return (time.perf_counter() - start) * 1000
+                if len(buffer) < 6 + length:
+                    break
+                buffer = buffer[6 + length:]
+    finally:
+        response.close()
+    return float("nan")
+
+
+def bench_exchange_cold(flask_app) -> float:
+    client = flask_app.test_client()
+    start = time.perf_counter()
+    client.post("/api/test", json=new_debate()).get_json()
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_exchange_next(flask_app, playback_s: float) -> float:
+    """Second exchange of a session, requested after the first one has been 'played'."""
+    client = flask_app.test_client()
+    first = client.post("/api/test", json=new_debate()).get_json()
+    time.sleep(playback_s)
+    start = time.perf_counter()
+    client.post("/api/test", json=new_debate(session_id=first["session_id"])).get_json()
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_throughput(flask_app, clients: int, exchanges_per_client: int) -> Dict[str, float]:
+    """clients debates run at once, each requesting its exchanges back to back."""
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def debate():
+        client = flask_app.test_client()
+        session_id = None
+        for _ in range(exchanges_per_client):
+            start = time.perf_counter()
+            reply = client.post("/api/test", json=new_debate(session_id=session_id)).get_json()
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+            session_id = reply["session_id"]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for future in [pool.submit(debate) for _ in range(clients)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    exchanges = clients * exchanges_per_client
+    return {
+        "clients": clients,
+        "exchanges": exchanges,
+        "elapsed_s": round(elapsed, 2),
+        "exchanges_per_s": round(exchanges / elapsed, 2),
+        "turns_per_s": round(2 * exchanges / elapsed, 2),
+        "latency_ms": summarize(latencies),
+    }
+
+
+def compare(current: dict, baseline_path: str) -> None:
+    """Prints the p50 change of every latency metric against an earlier result file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    for name, stats in current["results"].items():
+        old = baseline.get(name)
+        if isinstance(stats, dict) and "p50" in stats and old and old.get("p50"):
+            change = (stats["p50"] - old["p50"]) / old["p50"] * 100
+            print(f"{name:16s} p50 {old['p50']:9.1f} -> {stats['p50']:9.1f} ms ({change:+.1f}%)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against the local stub server.")
+    parser.add_argument("--runs", type=int, default=10, help="samples per latency benchmark")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated client counts")
+    parser.add_argument("--exchanges-per-client", type=int, default=3)
+    parser.add_argument("--playback-s", type=float, default=3.0,
+                        help="pause before the next exchange in exchange_next")
+    parser.add_argument("--out", default="bench/results/latest.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own logging")
+    for name, default in asdict(StubConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args(argv)
+
+    config = StubConfig(**{name: getattr(args, name) for name in asdict(StubConfig())})
+    base_url = start_stub(config)
+
+    # Must be set before the core modules create their clients
+    os.environ["BOSON_API_KEY"] = "bench"
+    os.environ["BOSON_LLM_ENDPOINT"] = base_url
+    os.environ["BOSON_AUDIO_ENDPOINT"] = base_url
+    os.environ["TTS_CACHE_DIR"] = ""
+
+    from core import audio_api, llm_api
+    import app
+
+    results = {}
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        results["ttft"] = repeat(args.runs, lambda: bench_ttft(llm_api))
+        results["first_sentence"] = repeat(args.runs, lambda: bench_first_sentence(llm_api))
+        results["ttfa_tts"] = repeat(args.runs, lambda: bench_ttfa_tts(audio_api))
+        results["ttfa_stream"] = repeat(args.runs, lambda: bench_ttfa_stream(app.app))
+        results["exchange_cold"] = repeat(args.runs, lambda: bench_exchange_cold(app.app))
+        results["exchange_next"] = repeat(
+            args.runs, lambda: bench_exchange_next(app.app, args.playback_s)
+        )
+        results["throughput"] = [
+            bench_throughput(app.app, int(n), args.exchanges_per_client)
+            for n in args.concurrency.split(",")
+        ]
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+            "stub": asdict(config),
+        },
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {args.out}")
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+Local, OpenAI-compatible stand-in for the Boson endpoints, so the app can be run and
+measured without the network.
+
+It serves the three calls the app makes:
+  POST /v1/chat/completions   chat (streaming and non-streaming), audio-input chat
+                              (transcription) and audio-output chat (voice cloning)
+  POST /v1/audio/speech       raw 16-bit mono PCM at 24 kHz, streamed as it is "synthesized"
+
+Latency, jitter, generation speed and error injection are configurable:
+
+    python -m bench.stub_server --port 8081 --latency-ms 300 --jitter-ms 50 \\
+        --tokens-per-s 40 --audio-rtf 0.25 --error-rate 0.02
+
+Point the app at it with BOSON_LLM_ENDPOINT=http://127.0.0.1:8081/v1 and
+BOSON_AUDIO_ENDPOINT=http://127.0.0.1:8081/v1 (any BOSON_API_KEY works).
+"""
+import io
+import json
+import time
+import wave
+import base64
+import random
+import asyncio
+import argparse
+import itertools
+from dataclasses import dataclass, asdict
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+# Rough speaking rate used to size the synthesized audio
+SECONDS_PER_WORD = 0.35
+
+WORDS = (
+    "progress demands careful thought about who benefits and who pays the price while "
+    "machines learn faster than institutions adapt so we must weigh evidence honestly"
+).split()
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 200.0      # time to first byte of every response
+    jitter_ms: float = 50.0        # uniform +/- jitter added to latency_ms
+    tokens_per_s: float = 50.0     # chat generation speed after the first token
+    reply_words: int = 30          # length of a chat reply
+    audio_rtf: float = 0.3         # seconds of synthesis per second of audio (real-time factor)
+    audio_chunk_ms: float = 100.0  # audio produced per streamed chunk
+    error_rate: float = 0.0        # fraction of requests answered with an error
+    error_status: int = 500        # HTTP status of injected errors (e.g. 429 or 503)
+    seed: int = 0
+
+
+class StubState:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.counter = itertools.count()
+        self.requests = 0
+        self.errors = 0
+
+    async def first_byte_delay(self) -> None:
+        jitter = self.random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        await asyncio.sleep(max(0.0, self.config.latency_ms + jitter) / 1000)
+
+    def should_fail(self) -> bool:
+        self.requests += 1
+        if self.random.random() < self.config.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    def reply_text(self) -> str:
+        # Every reply is distinct, so the TTS cache never hides synthesis time
+        n = next(self.counter)
+        words = [WORDS[(n + i) % len(WORDS)] for i in range(self.config.reply_words)]
+        return f"Reply {n}: " + " ".join(words) + "."
+
+
+def error_response(state: StubState) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"message": "injected stub error", "type": "server_error", "code": None}},
+        status_code=state.config.error_status,
+    )
+
+
+def pcm_for_text(text: str) -> bytes:
+    """A quiet tone as long as the text would take to say."""
+    seconds = max(0.5, len(text.split()) * SECONDS_PER_WORD)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 220 * t) * 3000).astype("<i2").tobytes()
+
+
+def wav_for_text(text: str) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm_for_text(text))
+    return buffer.getvalue()
+
+
+def has_audio_input(messages) -> bool:
+    return any(
+        isinstance(m.get("content"), list)
+        and any(part.get("type") == "input_audio" for part in m["content"])
+        for m in messages
+        if m.get("role") == "user"
+    )
+
+
+def completion(model: str, message: dict, finish_reason: str = "stop") -> dict:
+    return {
+        "id": f"chatcmpl-stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def chunk(model: str, delta: dict, finish_reason=None) -> str:
+    body = {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(body)}\n\n"
+
+
+async def chat_completions(request: Request):
+    state: StubState = request.app.state.stub
+    body = await request.json()
+    model = body.get("model", "stub")
+    messages = body.get("messages", [])
+
+    await state.first_byte_delay()
+    if state.should_fail():
+        return error_response(state)
+
+    if "audio" in (body.get("modalities") or []):
+        # Voice cloning: the reply carries the audio as base64 WAV
+        text = messages[-1].get("content", "") if messages else ""
+        await asyncio.sleep(len(text.split()) * SECONDS_PER_WORD * state.config.audio_rtf)
+        message = {
+            "role": "assistant",
+            "content": None,
+            "audio": {
+                "id": "audio-stub",
+                "data": base64.b64encode(wav_for_text(text)).decode("ascii"),
+                "expires_at": 0,
+                "transcript": text,
+            },
+        }
+        return JSONResponse(completion(model, message))
+
+    if has_audio_input(messages):
+        text = "This is a stub transcription of the uploaded audio."
+    else:
+        text = state.reply_text()
+    tokens = text.split(" ")
+    token_delay = 1 / state.config.tokens_per_s
+
+    if not body.get("stream"):
+        await asyncio.sleep(len(tokens) * token_delay)
+        return JSONResponse(completion(model, {"role": "assistant", "content": text}))
+
+    async def events():
+        yield chunk(model, {"role": "assistant", "content": ""})
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(token_delay)
+            yield chunk(model, {"content": token if i == 0 else " " + token})
+        yield chunk(model, {}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def speech(request: Request):
+    state: StubState = request.app.state.stub
+    body = await request.json()
+
+    await state.first_byte_delay()
+    if state.should_fail():
+        return error_response(state)
+
+    pcm = pcm_for_text(body.get("input", ""))
+    chunk_bytes = int(SAMPLE_RATE * state.config.audio_chunk_ms / 1000) * SAMPLE_WIDTH
+    chunk_delay = state.config.audio_chunk_ms / 1000 * state.config.audio_rtf
+
+    async def audio():
+        for offset in range(0, len(pcm), chunk_bytes):
+            if offset:
+                await asyncio.sleep(chunk_delay)
+            yield pcm[offset:offset + chunk_bytes]
+
+    return StreamingResponse(audio(), media_type="audio/pcm")
+
+
+async def stats(request: Request):
+    state: StubState = request.app.state.stub
+    return JSONResponse(
+        {"config": asdict(state.config), "requests": state.requests, "errors": state.errors}
+    )
+
+
+def create_app(config: StubConfig = None) -> Starlette:
+    app = Starlette(
+        routes=[
+            Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+            Route("/v1/audio/speech", speech, methods=["POST"]),
+            Route("/stats", stats, methods=["GET"]),
+        ]
+    )
+    app.state.stub = StubState(config or StubConfig())
+    return app
+
+
+def parse_config(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in for the Boson endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    for name, default in asdict(StubConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args(argv)
+    config = StubConfig(**{name: getattr(args, name) for name in asdict(StubConfig())})
+    return args, config
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args, config = parse_config()
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
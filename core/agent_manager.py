@@ -1,61 +1,298 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from core import tracing
 from core.llm_api import LLMAgent
-from typing import List
+from core.retrieval import ContextIndex, format_passages
+from core.scheduling import TurnScheduler, get_scheduler
+from core.transcript import MODERATOR, Transcript
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 LLM_MODEL_NAME = "Qwen3-32B-non-thinking-Hackathon"
 # LLM_MODEL_NAME = "Qwen3-14B-Hackathon"
 
+# Panel agents are labelled A, B, C, ...
+AGENT_LABELS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# Voices handed out to agents in turn when none are given
+DEFAULT_VOICES = ["mabel", "en_man"]
+
+# Fan-out drafts of all panelists run here at the same time
+DRAFT_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="draft")
+
 class AgentManager:
-    """Manages the two conversational agents and runs the dialogue."""
+    """
+    Manages the conversational agents and runs the dialogue: two for a debate, or a panel
+    of any size (extra personas after the first two). Who speaks next is up to the turn
+    scheduler (see core/scheduling.py); the default alternates like a plain debate.
+    """
     
     # Define Agent Personas to showcase emotional range and distinct voices
     PERSONA_A = "You are agent A, and "
     PERSONA_B = "You are agent B, and "
+
+    # Word budget for a single reply (also enforced on the token stream when streaming)
+    MAX_WORDS = 30
+
+    # Prompt budget per agent; older turns are folded into a running summary beyond it
+    CONTEXT_TOKEN_BUDGET = 2000
+
+    # Passages of the context document (if any) added to each turn's prompt
+    CONTEXT_PASSAGES = 3
     
-    def __init__(self, prompt1, prompt2):
+    def __init__(
+        self,
+        prompt1,
+        prompt2,
+        *more_prompts,
+        scheduler: Union[TurnScheduler, str, None] = None,
+        voices: Optional[List[str]] = None,
+    ):
         self.PERSONA_A += prompt1
         self.PERSONA_B += prompt2
+        personas = [self.PERSONA_A, self.PERSONA_B] + [
+            f"You are agent {AGENT_LABELS[index + 2]}, and {prompt}"
+            for index, prompt in enumerate(more_prompts)
+        ]
 
-        # Initialize the two distinct agents
-        self.agent_a = LLMAgent(name="", persona=self.PERSONA_A, model=LLM_MODEL_NAME)
-        self.agent_b = LLMAgent(name="", persona=self.PERSONA_B, model=LLM_MODEL_NAME)
-        
-        # Track the current speaking agent
+        # Initialize one agent per persona
+        self.agents = [
+            LLMAgent(
+                name="", persona=persona, model=LLM_MODEL_NAME,
+                context_token_budget=self.CONTEXT_TOKEN_BUDGET,
+            )
+            for persona in personas
+        ]
+        self.agent_a, self.agent_b = self.agents[0], self.agents[1]
+
+        self.scheduler = scheduler if isinstance(scheduler, TurnScheduler) else get_scheduler(scheduler)
+        # Voice of each agent for generate_dialogue_audio
+        self.voices = voices or [DEFAULT_VOICES[i % len(DEFAULT_VOICES)] for i in range(len(self.agents))]
+
+        # One shared transcript; each agent's history is a view derived from it
+        self._attach_transcript()
+
+        # Track the current speaking agent, and the index of the one that spoke last
         self.current_speaker = self.agent_a
-        self.dialogue_history: List[str] = [] # Stores text output for the UI/TTS
+        self.last_speaker: Optional[int] = None
+
+        self.context_index: Optional[ContextIndex] = None
+
+    def _attach_transcript(self):
+        self.transcript = Transcript()
+        for index, agent in enumerate(self.agents):
+            agent.history = self.transcript.view(index, agent.persona, self._turn_prompt)
+
+    @property
+    def dialogue_history(self) -> List[str]:
+        """Text output of the agents for the UI/TTS, derived from the transcript."""
+        return [
+            f"{self.agents[record.speaker].name}: {record.text}"
+            for record in self.transcript
+            if record.speaker != MODERATOR
+        ]
         
     def reset_dialogue(self):
-        """Resets both agents' memories and the dialogue history."""
-        self.agent_a.history = [{"role": "system", "content": self.PERSONA_A}]
-        self.agent_b.history = [{"role": "system", "content": self.PERSONA_B}]
-        self.dialogue_history = []
+        """Resets all agents' memories and the dialogue history."""
+        for agent in self.agents:
+            agent.reset_history()
+        self._attach_transcript()
         self.current_speaker = self.agent_a
+        self.last_speaker = None
+
+    def resume(self, opening_prompt: str, replies: List[str], speakers: Optional[List[int]] = None) -> None:
+        """
+        Rebuilds a debate from saved text: the opening prompt followed by the agents'
+        replies in speaking order (by default alternating; pass each reply's agent index
+        for a panel). The next run_turn continues where it left off.
+        """
+        self.reset_dialogue()
+        if speakers is None:
+            speakers = [index % len(self.agents) for index in range(len(replies))]
+        # Each reply answered the line before it, the first one the opening prompt
+        prompt = opening_prompt
+        for speaker, reply in zip(speakers, replies):
+            self.agents[speaker].history.append({"role": "user", "content": prompt})
+            self.agents[speaker].history.append({"role": "assistant", "content": reply})
+            prompt = reply
+        if replies:
+            self._after_turn(speakers[len(replies) - 1])
+
+    def checkpoint(self) -> Tuple[int, List[int], LLMAgent, Optional[int]]:
+        """The state to return to with rollback (e.g. before a speculative exchange)."""
+        marks = [agent.history.mark() for agent in self.agents]
+        return len(self.transcript), marks, self.current_speaker, self.last_speaker
+
+    def rollback(self, checkpoint: Tuple[int, List[int], LLMAgent, Optional[int]]) -> None:
+        """Undoes every turn taken since checkpoint, as if they never happened."""
+        length, marks, self.current_speaker, self.last_speaker = checkpoint
+        self.transcript.truncate(length)
+        # Each view is rewound on its own: a prompt it reused (the topic) predates length
+        for agent, mark in zip(self.agents, marks):
+            agent.history.rewind(mark)
+
+    def replies_since(self, checkpoint: Tuple[int, List[int], LLMAgent, Optional[int]]) -> int:
+        """How many agent replies were recorded since checkpoint (a failed turn records none)."""
+        return sum(1 for record in self.transcript[checkpoint[0]:] if record.speaker != MODERATOR)
+
+    def voice_of(self, speaker: int) -> str:
+        """The voice generate_dialogue_audio should use for agent number speaker."""
+        return self.voices[speaker % len(self.voices)]
+
+    def label_of(self, speaker: int) -> str:
+        return AGENT_LABELS[speaker]
+
+    def _after_turn(self, speaker: int) -> None:
+        self.last_speaker = speaker
+        if not self.scheduler.fan_out:
+            self.current_speaker = self.agents[self.scheduler.next_speaker(self, speaker)]
+
+    def set_context_index(self, index: Optional[ContextIndex]) -> None:
+        """Grounds both agents in a context document (see core.retrieval); None detaches it."""
+        self.context_index = index
+        for agent in self.agents:
+            agent.context_provider = self._retrieve_context if index is not None else None
+
+    def _retrieve_context(self, prompt: str) -> str:
+        """
+        The passages matching the topic and the line being answered. The raw transcript text
+        is searched rather than the rendered prompt, whose boilerplate would only add noise.
+        """
+        last = self.transcript.last()
+        if last is None:
+            return ""
+        first = self.transcript[0]
+        topic = first.text if first.speaker == MODERATOR else ""
+        query = topic if last is first else f"{topic} {last.text}"
+        with tracing.span("context.retrieve"):
+            passages = self.context_index.search(query, self.CONTEXT_PASSAGES)
+        if not passages:
+            return ""
+        return (
+            "Relevant excerpts from the context document (use them where they support your point):\n"
+            + format_passages(passages)
+        )
+
+    def _view_prompt(self, prompt_text: str) -> str:
+        """
+        The raw text to hand to the speaker's transcript view. When prompt_text is the reply
+        returned by the previous turn it maps back to that transcript record, so it is not
+        stored a second time.
+        """
+        last = self.transcript.last()
+        if last is not None and last.speaker != MODERATOR:
+            if prompt_text == f"{self.agents[last.speaker].name}: {last.text}":
+                return last.text
+        return prompt_text
 
-    def run_turn(self, prompt_text: str = "") -> str:
+    def run_turn(
+        self,
+        prompt_text: str = "",
+        stream: bool = False,
+        on_sentence: Optional[Callable[[str], None]] = None,
+    ) -> str:
         """
         Runs one turn of the conversation.
         The prompt_text is the previous agent's output, or the user's initial prompt.
+        With stream=True the reply is streamed, on_sentence fires for each finished
+        sentence and generation stops at MAX_WORDS.
         """
-        
-        # Determine the listener (the other agent)
-        listener = self.agent_b if self.current_speaker == self.agent_a else self.agent_a
+        # A fan-out scheduler lets every panelist draft and picks the reply instead
+        if self.scheduler.fan_out:
+            return self._run_fan_out_turn(prompt_text, on_sentence)
+
+        speaker = self.agents.index(self.current_speaker)
 
-        # The prompt for the current speaker is the previous speaker's output (or the user's input)
-        turn_prompt = f"Previous Speaker said: {prompt_text}. Respond to them in at most 30 words and continue the argument."
+        # The prompt for the current speaker is the previous speaker's output (or the user's input);
+        # the speaker's transcript view renders it with _turn_prompt
+        turn_prompt = self._view_prompt(prompt_text)
 
         # 1. Generate the response
-        response_text = self.current_speaker.generate_response(turn_prompt)
+        if stream:
+            response_text = self.current_speaker.generate_response(
+                turn_prompt, stream=True, on_sentence=on_sentence, max_words=self.MAX_WORDS
+            )
+        else:
+            response_text = self.current_speaker.generate_response(turn_prompt)
         
-        # 2. Store the result
-        self.dialogue_history.append(response_text)
+        # 2. The result is already stored: the reply went into the shared transcript
         
-        # 3. Swap speaker for the next turn
-        self.current_speaker = listener
+        # 3. Hand the turn on (the scheduler decides to whom); a failed turn keeps the speaker
+        if len(self.transcript) and self.transcript.last().speaker == speaker:
+            self._after_turn(speaker)
 
         # The manager needs to return the *text* of the response so the UI can update
         # and so the audio API can be called.
         print(f"RESPONSE: {response_text}")
         return response_text
 
+    async def arun_turn(self, prompt_text: str = "") -> str:
+        """Async version of run_turn (non-streaming)."""
+        if self.scheduler.fan_out:
+            return await self._arun_fan_out_turn(prompt_text)
+
+        speaker = self.agents.index(self.current_speaker)
+        response_text = await self.current_speaker.agenerate_response(self._view_prompt(prompt_text))
+
+        if len(self.transcript) and self.transcript.last().speaker == speaker:
+            self._after_turn(speaker)
+
+        print(f"RESPONSE: {response_text}")
+        return response_text
+
+    # --- Fan-out turns ---
+
+    def _open_fan_out(self, prompt_text: str) -> List[int]:
+        """Gives the prompt to every panelist who drafts (it is stored once) and returns them."""
+        turn_prompt = self._view_prompt(prompt_text)
+        candidates = [i for i in range(len(self.agents)) if i != self.last_speaker]
+        for index in candidates:
+            self.agents[index].history.append({"role": "user", "content": turn_prompt})
+        return candidates
+
+    def _close_fan_out(self, candidates: List[int], drafts: Dict[int, Optional[str]]) -> str:
+        drafts = {index: text for index, text in drafts.items() if text}
+        if not drafts:
+            for index in candidates:
+                self.agents[index].history.pop()
+            return "[panel]: API ERROR: every draft failed"
+
+        speaker = self.scheduler.pick_draft(self, drafts)
+        response_text = self.agents[speaker].accept_draft(drafts[speaker])
+        # The others did not speak, so the prompt leaves their histories again
+        for index in candidates:
+            if index != speaker:
+                self.agents[index].history.pop()
+        self.current_speaker = self.agents[speaker]
+        self._after_turn(speaker)
+        print(f"RESPONSE: {response_text}")
+        return response_text
+
+    def _run_fan_out_turn(self, prompt_text: str, on_sentence: Optional[Callable[[str], None]]) -> str:
+        candidates = self._open_fan_out(prompt_text)
+        futures = {
+            index: DRAFT_EXECUTOR.submit(tracing.bind(self.agents[index].draft_response))
+            for index in candidates
+        }
+        response_text = self._close_fan_out(candidates, {i: f.result() for i, f in futures.items()})
+        # The reply only exists once all drafts are in, so it is delivered as one "sentence"
+        if on_sentence is not None and not response_text.startswith("["):
+            on_sentence(self.transcript.last().text)
+        return response_text
+
+    async def _arun_fan_out_turn(self, prompt_text: str) -> str:
+        candidates = self._open_fan_out(prompt_text)
+        results = await asyncio.gather(*(self.agents[i].adraft_response() for i in candidates))
+        return self._close_fan_out(candidates, dict(zip(candidates, results)))
+
+    def _turn_prompt(self, prompt_text: str) -> str:
+        return f"Previous Speaker said: {prompt_text}. Respond to them in at most {self.MAX_WORDS} words and continue the argument."
+
+    def context_stats(self) -> dict:
+        """Prompt-size counters of every agent (tokens sent vs. full history, summaries made)."""
+        return {
+            f"agent_{AGENT_LABELS[index].lower()}": dict(agent.context_stats)
+            for index, agent in enumerate(self.agents)
+        }
+
     def get_full_dialogue_text(self) -> str:
         """Returns the entire dialogue text formatted for easy reading."""
         return "\n".join(self.dialogue_history)
@@ -89,10 +326,6 @@ if __name__ == "__main__":
             # Update the last response to feed the next agent
             last_response = response
             
-            # Simple delay to prevent overwhelming the API during the test
-            import time
-            time.sleep(2) 
-            
         except Exception as e:
             print(f"Error during turn {i + 1}: {e}")
             break
@@ -1,98 +1,113 @@
+import io
 import os
+import re
+import asyncio
 import time
 import wave
 import base64
 import openai
 import numpy as np
-import sounddevice as sd
 import soundfile as sf
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 from dotenv import load_dotenv
+from core import ratelimit, tracing
+from core.audio_codecs import ENCODER_POOL, encode_audio, get_audio_format
+from core.audio_prep import (
+    ASR_SAMPLE_RATE,
+    ASR_UPLOAD_FORMAT,
+    encode_for_upload,
+    load_mono,
+    prepare_upload,
+    trim_silence,
+)
+from core.dsp import TimeStretcher, time_stretch
+from core.recorder import VoiceRecorder
+from core.tts_cache import TTSCache
+from core.vad import plan_segments
+from core.voices import VoiceProfile, VoiceRegistry
 
 load_dotenv()
 
 CHARACATER_JAMES_DAVIS = "james_davis"
-CHARACTER_TO_REFERENCE_MAP = {
-    "james_davis": (
-        (
-            "After that I went on to graduate school at the Institute for Aerospace Studies "
-            "where I completed two masters and a PhD. My research area is in materials for fusion reactors. "
-            "This is an area I got interested in when I was actually an undergraduate student and I spent two summers "
-            "working up at UTIAS in the research lab which I now run. And this whole time I've been looking at various "
-            "aspects of how very high temperature plasmas in a fusion reactor interact with the materials that are "
-            "intended to keep the plasma from escaping."
-        ),
-        "audio_references/davis_trimmed.wav",
-    )
-}
-
-DEFAULT_VOICE_EN_MAN = "en_man"
-DEFAULT_VOICE_MABEL = "mabel"
-
-BOSON_API_KEY = os.getenv("BOSON_API_KEY")
-BOSON_AUDIO_ENDPOINT = os.getenv("BOSON_AUDIO_ENDPOINT")
 
-CLIENT = openai.Client(
-    api_key=BOSON_API_KEY, base_url=BOSON_AUDIO_ENDPOINT, max_retries=2, timeout=30
+# Reference clips for clone_audio, loaded and encoded once (voices can also be added at runtime)
+VOICE_REGISTRY = VoiceRegistry()
+VOICE_REGISTRY.register(
+    CHARACATER_JAMES_DAVIS,
+    (
+        "After that I went on to graduate school at the Institute for Aerospace Studies "
+        "where I completed two masters and a PhD. My research area is in materials for fusion reactors. "
+        "This is an area I got interested in when I was actually an undergraduate student and I spent two summers "
+        "working up at UTIAS in the research lab which I now run. And this whole time I've been looking at various "
+        "aspects of how very high temperature plasmas in a fusion reactor interact with the materials that are "
+        "intended to keep the plasma from escaping."
+    ),
+    "audio_references/davis_trimmed.wav",
+    use_mmap=True,
 )
 
+DEFAULT_VOICE_EN_MAN = "en_man"
+DEFAULT_VOICE_MABEL = "mabel"
 
-class VoiceRecorder:
-    def __init__(self, sample_rate=44100):
-        self.sample_rate = sample_rate
-        self.is_recording = False
-        self.audio_data = []
-        self.stream = None
-
-    def start_recording(self):
-        if self.is_recording:
-            print("Already recording!")
-            return
-
-        self.is_recording = True
-        self.audio_data = []
-
-        def callback(indata, frames, time, status):
-            if self.is_recording:
-                self.audio_data.append(indata.copy())
+TTS_MODEL_NAME = "higgs-audio-generation-Hackathon"
 
-        self.stream = sd.InputStream(
-            samplerate=self.sample_rate, channels=1, callback=callback, dtype="float32"
-        )
-        self.stream.start()
-        print("Recording started...")
+# Part of the cache format id of every clip; it names the speed method so clips sped up
+# by rewriting the header rate (older cache entries) are never served
+SPEED_METHOD = "wsola"
 
-    def stop_recording(self, path="audio_references/recording.wav"):
-        if not self.is_recording:
-            print("Not currently recording")
-            return
+# Format of the raw PCM returned by the speech endpoint
+PCM_NUM_CHANNELS = 1
+PCM_SAMPLE_WIDTH = 2
+PCM_SAMPLE_RATE = 24000
 
-        self.is_recording = False
-        time.sleep(0.1)  # let last bit finish
+# Recordings longer than TRANSCRIBE_SEGMENT_S are cut at silences into segments of at most
+# that length, overlapping by TRANSCRIBE_OVERLAP_S, and transcribed TRANSCRIBE_WORKERS at a time
+TRANSCRIBE_SEGMENT_S = float(os.getenv("TRANSCRIBE_SEGMENT_S", "30"))
+TRANSCRIBE_OVERLAP_S = 1.0
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "4"))
 
-        if self.stream:
-            self.stream.stop()
-            self.stream.close()
+BOSON_API_KEY = os.getenv("BOSON_API_KEY")
+BOSON_AUDIO_ENDPOINT = os.getenv("BOSON_AUDIO_ENDPOINT")
 
-        if self.audio_data:
-            audio_array = np.concatenate(self.audio_data, axis=0)
-            sf.write(path, audio_array, self.sample_rate)
-            return path
+# (http_client queues calls by endpoint and priority, and records/replays them when a
+# cassette is active; see core/ratelimit.py and core/cassette.py)
+CLIENT = openai.Client(
+    api_key=BOSON_API_KEY, base_url=BOSON_AUDIO_ENDPOINT, max_retries=2, timeout=30,
+    http_client=ratelimit.http_client("audio"),
+)
+# Async twin for the a* functions below, so one event loop can multiplex many requests
+ASYNC_CLIENT = openai.AsyncClient(
+    api_key=BOSON_API_KEY, base_url=BOSON_AUDIO_ENDPOINT, max_retries=2, timeout=30,
+    http_client=ratelimit.async_http_client("audio"),
+)
 
-        print("No audio data")
-        return None
+# Synthesized speech is cached in memory and on disk (set TTS_CACHE_DIR="" to disable the disk tier)
+TTS_CACHE = TTSCache(
+    max_memory_bytes=int(os.getenv("TTS_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+    disk_dir=os.getenv("TTS_CACHE_DIR", "audio_references/tts_cache") or None,
+    max_disk_bytes=int(os.getenv("TTS_CACHE_DISK_MB", "512")) * 1024 * 1024,
+)
 
 
 def encode_audio_to_base64(file_path: str) -> str:
     try:
-        with open(file_path, "rb") as audio_file:
-            return base64.b64encode(audio_file.read()).decode("utf-8")
+        with tracing.span("file.read"):
+            with open(file_path, "rb") as audio_file:
+                data = audio_file.read()
+        with tracing.span("base64.encode", bytes=len(data)):
+            return base64.b64encode(data).decode("utf-8")
     except FileNotFoundError:
         print(f"Error: Audio reference file not found at {file_path}")
         return ""
 
 
 def write_wav(
-    path: str, num_channels: int, sample_width: int, frame_rate: int, frames: int
+    path: Union[str, BinaryIO],
+    num_channels: int,
+    sample_width: int,
+    frame_rate: int,
+    frames: bytes,
 ) -> None:
     with wave.open(path, "wb") as out_wav:
         out_wav.setnchannels(num_channels)
@@ -101,53 +116,218 @@ def write_wav(
         out_wav.writeframes(frames)
 
 
-def adjust_audio_speed(path: str, speed_factor: float):
-    with wave.open(path, "rb") as wav:
+def pcm_to_wav(
+    frames: bytes, num_channels: int, sample_width: int, frame_rate: int
+) -> bytes:
+    """Wraps raw PCM in a WAV header, entirely in memory."""
+    with tracing.span("wav.write", bytes=len(frames)):
+        buffer = io.BytesIO()
+        write_wav(buffer, num_channels, sample_width, frame_rate, frames)
+        return buffer.getvalue()
+
+
+def adjust_pcm_speed(pcm_data: bytes, speed_factor: float, frame_rate: int = PCM_SAMPLE_RATE) -> bytes:
+    """Time-stretches 16-bit mono PCM by speed_factor without changing its pitch."""
+    if speed_factor == 1.0:
+        return pcm_data
+    with tracing.span("audio.adjust_speed", factor=speed_factor, bytes=len(pcm_data)):
+        return time_stretch(pcm_data, speed_factor, frame_rate)
+
+
+def adjust_wav_speed(wav_data: bytes, speed_factor: float) -> bytes:
+    """In-memory version of adjust_audio_speed: returns the WAV played speed_factor times faster, at the same pitch."""
+    with wave.open(io.BytesIO(wav_data), "rb") as wav:
         params = wav.getparams()
         frames = wav.readframes(params.nframes)
 
-    write_wav(
-        path,
-        params.nchannels,
-        params.sampwidth,
-        int(params.framerate * speed_factor),
-        frames,
+    if params.nchannels != 1 or params.sampwidth != 2:
+        raise ValueError("adjust_wav_speed expects 16-bit mono audio")
+
+    return pcm_to_wav(
+        adjust_pcm_speed(frames, speed_factor, params.framerate),
+        params.nchannels, params.sampwidth, params.framerate,
+    )
+
+
+def adjust_audio_speed(path: str, speed_factor: float):
+    with tracing.span("file.read"):
+        with open(path, "rb") as f:
+            data = f.read()
+
+    _write_file(path, adjust_wav_speed(data, speed_factor))
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with tracing.span("file.write", bytes=len(data)):
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def _speech_request(dialogue_text: str, voice: str) -> dict:
+    return dict(
+        model=TTS_MODEL_NAME,
+        voice=voice,
+        input=dialogue_text,
+        response_format="pcm",
+    )
+
+
+def _speech_to_wav(pcm_data: bytes, audio_speed_factor: float) -> bytes:
+    # The speed change is a pitch-preserving time-stretch of the PCM, done before the header is built
+    return pcm_to_wav(
+        adjust_pcm_speed(pcm_data, audio_speed_factor),
+        PCM_NUM_CHANNELS,
+        PCM_SAMPLE_WIDTH,
+        PCM_SAMPLE_RATE,
+    )
+
+
+def _cache_key(dialogue_text: str, voice: str, audio_speed_factor: float, audio_format: str) -> str:
+    return TTSCache.make_key(
+        TTS_MODEL_NAME, voice, dialogue_text, audio_speed_factor, f"{audio_format}-{SPEED_METHOD}"
     )
 
 
+def _encode(wav_data: bytes, audio_format) -> bytes:
+    with tracing.span("audio.encode", format=audio_format.name, bytes=len(wav_data)):
+        return encode_audio(wav_data, audio_format)
+
+
 def generate_dialogue_audio(
     dialogue_text: str,
-    audio_file_path: str,
+    audio_file_path: Optional[str],
     voice: str,
     audio_speed_factor: float = 1.0,
-) -> None:
+    audio_format: str = "wav",
+) -> bytes:
+    """
+    Synthesizes dialogue_text and returns it in audio_format (see core.audio_codecs):
+    WAV bytes by default, or Opus/MP3/FLAC encoded in memory on ENCODER_POOL.
+    The file at audio_file_path is only written when a path is given.
+    """
+    output_format = get_audio_format(audio_format)
     if not BOSON_API_KEY or not BOSON_AUDIO_ENDPOINT:
         print("Audio API key or endpoint not configured.")
         return b""
 
-    response = CLIENT.audio.speech.create(
-        model="higgs-audio-generation-Hackathon",
-        voice=voice,
-        input=dialogue_text,
-        response_format="pcm",
-    )
+    def synthesize() -> bytes:
+        with tracing.span("tts.request", voice=voice, chars=len(dialogue_text)):
+            response = CLIENT.audio.speech.create(**_speech_request(dialogue_text, voice))
+        return _speech_to_wav(response.content, audio_speed_factor)
+
+    wav_key = _cache_key(dialogue_text, voice, audio_speed_factor, "wav")
+    if output_format.container is None:
+        data = TTS_CACHE.get_or_create(wav_key, synthesize)
+    else:
+        def encode() -> bytes:
+            wav_data = TTS_CACHE.get_or_create(wav_key, synthesize)
+            return ENCODER_POOL.submit(tracing.bind(_encode), wav_data, output_format).result()
+
+        key = _cache_key(dialogue_text, voice, audio_speed_factor, output_format.name)
+        data = TTS_CACHE.get_or_create(key, encode)
+
+    if audio_file_path:
+        _write_file(audio_file_path, data)
+
+    return data
+
+
+def stream_dialogue_audio(
+    dialogue_text: str, voice: str, chunk_size: int = 8192, audio_speed_factor: float = 1.0
+) -> Iterator[bytes]:
+    """
+    Streams the speech for dialogue_text as raw PCM chunks (PCM_SAMPLE_RATE Hz,
+    16-bit mono) while the endpoint is still producing it. Every chunk holds whole
+    samples, so it can be played or forwarded as soon as it is yielded.
+    With audio_speed_factor != 1 each chunk is time-stretched (pitch preserved) on the way out.
+    """
+    if not BOSON_API_KEY or not BOSON_AUDIO_ENDPOINT:
+        print("Audio API key or endpoint not configured.")
+        return
+
+    # The cache holds the unstretched clip, so every speed shares one entry
+    stretcher = TimeStretcher(audio_speed_factor, PCM_SAMPLE_RATE)
+    cache_key = TTSCache.make_key(TTS_MODEL_NAME, voice, dialogue_text, 1.0, "pcm")
+    cached = TTS_CACHE.get(cache_key)
+    if cached is not None:
+        # A cached clip is replayed in chunks of the same size
+        for start in range(0, len(cached), chunk_size):
+            block = stretcher.process(cached[start:start + chunk_size])
+            if block:
+                yield block
+        tail = stretcher.flush()
+        if tail:
+            yield tail
+        return
+
+    chunks = []
+    start = time.perf_counter()
+    with tracing.span("tts.stream", voice=voice, chars=len(dialogue_text)) as span, \
+            CLIENT.audio.speech.with_streaming_response.create(
+                **_speech_request(dialogue_text, voice)
+            ) as response:
+        leftover = b""
+        for chunk in response.iter_bytes(chunk_size):
+            chunk = leftover + chunk
+            # Hold back a trailing half sample until the next chunk completes it
+            usable = len(chunk) - len(chunk) % PCM_SAMPLE_WIDTH
+            leftover = chunk[usable:]
+            if usable:
+                if not chunks:
+                    span.set("ttfa_ms", round((time.perf_counter() - start) * 1000, 1))
+                chunks.append(chunk[:usable])
+                block = stretcher.process(chunks[-1])
+                if block:
+                    yield block
+
+    tail = stretcher.flush()
+    if tail:
+        yield tail
+
+    # Only reached when the whole clip was streamed, so partial audio is never cached
+    TTS_CACHE.put(cache_key, b"".join(chunks))
+
+
+async def agenerate_dialogue_audio(
+    dialogue_text: str,
+    audio_file_path: Optional[str],
+    voice: str,
+    audio_speed_factor: float = 1.0,
+    audio_format: str = "wav",
+) -> bytes:
+    """Async version of generate_dialogue_audio (shares its cache)."""
+    output_format = get_audio_format(audio_format)
+    if not BOSON_API_KEY or not BOSON_AUDIO_ENDPOINT:
+        print("Audio API key or endpoint not configured.")
+        return b""
 
-    num_channels = 1
-    sample_width = 2
-    sample_rate = 24000
+    async def synthesize() -> bytes:
+        with tracing.span("tts.request", voice=voice, chars=len(dialogue_text)):
+            response = await ASYNC_CLIENT.audio.speech.create(**_speech_request(dialogue_text, voice))
+        # The time-stretch is CPU-bound; on the event loop it would stall every other debate
+        return await asyncio.to_thread(_speech_to_wav, response.content, audio_speed_factor)
 
-    pcm_data = response.content
+    wav_key = _cache_key(dialogue_text, voice, audio_speed_factor, "wav")
+    if output_format.container is None:
+        data = await TTS_CACHE.aget_or_create(wav_key, synthesize)
+    else:
+        async def encode() -> bytes:
+            wav_data = await TTS_CACHE.aget_or_create(wav_key, synthesize)
+            return await asyncio.get_running_loop().run_in_executor(
+                ENCODER_POOL, tracing.bind(_encode), wav_data, output_format
+            )
 
-    write_wav(audio_file_path, num_channels, sample_width, sample_rate, pcm_data)
+        key = _cache_key(dialogue_text, voice, audio_speed_factor, output_format.name)
+        data = await TTS_CACHE.aget_or_create(key, encode)
 
-    adjust_audio_speed(audio_file_path, audio_speed_factor)
+    if audio_file_path:
+        await asyncio.to_thread(_write_file, audio_file_path, data)
 
+    return data
 
-def transcribe_audio(audio_path: str) -> str:
-    audio_base64 = encode_audio_to_base64(audio_path)
-    file_format = audio_path.split(".")[-1]
 
-    response = CLIENT.chat.completions.create(
+def _transcription_request(audio_base64: str, file_format: str) -> dict:
+    return dict(
         model="higgs-audio-understanding-Hackathon",
         messages=[
             {"role": "system", "content": "Transcribe the COMPLETE audio for me."},
@@ -167,26 +347,202 @@ def transcribe_audio(audio_path: str) -> str:
         max_completion_tokens=6000,
     )
 
+
+class TranscriptSegment(NamedTuple):
+    index: int
+    start_s: float
+    end_s: float
+    text: str
+
+
+def _word_key(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def merge_overlapping_text(previous: str, following: str, max_words: int = 30) -> str:
+    """
+    Joins the transcripts of two overlapping segments, dropping the words they share: the
+    longest run (two words or more) that ends previous and starts following, allowing for
+    up to two words at the start of following that were cut off mid-word.
+    """
+    if not previous:
+        return following
+    if not following:
+        return previous
+    tail = [_word_key(w) for w in previous.split()[-max_words:]]
+    words = following.split()
+    head = [_word_key(w) for w in words[:max_words + 2]]
+
+    for k in range(min(len(tail), len(head)), 1, -1):
+        for skip in range(min(3, len(head) - k + 1)):
+            if head[skip:skip + k] == tail[-k:]:
+                rest = " ".join(words[skip + k:])
+                return f"{previous} {rest}" if rest else previous
+    return f"{previous} {following}"
+
+
+def stitch_transcript(segments: Iterable[TranscriptSegment]) -> str:
+    """Joins segment transcripts in audio order, removing the text repeated in the overlaps."""
+    text = ""
+    for segment in sorted(segments, key=lambda s: s.index):
+        text = merge_overlapping_text(text, segment.text.strip())
+    return text
+
+
+def _load_segments(
+    audio_path: str, max_segment_s: float, overlap_s: float
+) -> Tuple[np.ndarray, int, List[Tuple[int, int]]]:
+    """The clip as trimmed mono float at ASR_SAMPLE_RATE and the (start, end) samples of each segment."""
+    mono = trim_silence(load_mono(audio_path, ASR_SAMPLE_RATE), ASR_SAMPLE_RATE)
+    ranges = plan_segments(mono, ASR_SAMPLE_RATE, max_segment_s, overlap_s)
+    return mono, ASR_SAMPLE_RATE, ranges
+
+
+def _segment_base64(mono: np.ndarray, sample_rate: int, start: int, end: int) -> str:
+    data = encode_for_upload(mono[start:end], sample_rate)
+    with tracing.span("base64.encode", bytes=len(data)):
+        return base64.b64encode(data).decode("utf-8")
+
+
+def _upload_base64(audio_path: str) -> str:
+    """A clip prepared for upload (see prepare_upload), base64-encoded."""
+    prepared = prepare_upload(audio_path)
+    print(
+        f"Transcription upload: {prepared.bytes_after} bytes "
+        f"({prepared.bytes_before} before downmixing, resampling and trimming)"
+    )
+    with tracing.span("base64.encode", bytes=prepared.bytes_after):
+        return base64.b64encode(prepared.data).decode("utf-8")
+
+
+def transcribe_segments(
+    audio_path: str,
+    max_segment_s: float = TRANSCRIBE_SEGMENT_S,
+    overlap_s: float = TRANSCRIBE_OVERLAP_S,
+    workers: int = TRANSCRIBE_WORKERS,
+) -> Iterator[TranscriptSegment]:
+    """
+    Transcribes a recording in segments cut at silences, workers requests at a time, and
+    yields each segment as soon as it is done (so not necessarily in order; see
+    stitch_transcript). With enough workers the latency is that of one segment, whatever
+    the length of the recording.
+    """
+    mono, sample_rate, ranges = _load_segments(audio_path, max_segment_s, overlap_s)
+
+    def transcribe(index: int, start: int, end: int) -> TranscriptSegment:
+        audio_base64 = _segment_base64(mono, sample_rate, start, end)
+        with tracing.span("asr.request", segment=index):
+            response = CLIENT.chat.completions.create(
+                **_transcription_request(audio_base64, ASR_UPLOAD_FORMAT)
+            )
+        text = response.choices[0].message.content or ""
+        return TranscriptSegment(index, start / sample_rate, end / sample_rate, text)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="asr") as pool:
+        futures = [
+            pool.submit(tracing.bind(transcribe), index, start, end)
+            for index, (start, end) in enumerate(ranges)
+        ]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # The caller stopped early or a segment failed: don't send the rest
+            for future in futures:
+                future.cancel()
+
+
+async def atranscribe_segments(
+    audio_path: str,
+    max_segment_s: float = TRANSCRIBE_SEGMENT_S,
+    overlap_s: float = TRANSCRIBE_OVERLAP_S,
+    workers: int = TRANSCRIBE_WORKERS,
+) -> AsyncIterator[TranscriptSegment]:
+    """Async twin of transcribe_segments."""
+    mono, sample_rate, ranges = await asyncio.to_thread(
+        _load_segments, audio_path, max_segment_s, overlap_s
+    )
+    limit = asyncio.Semaphore(max(1, workers))
+
+    async def transcribe(index: int, start: int, end: int) -> TranscriptSegment:
+        async with limit:
+            audio_base64 = _segment_base64(mono, sample_rate, start, end)
+            with tracing.span("asr.request", segment=index):
+                response = await ASYNC_CLIENT.chat.completions.create(
+                    **_transcription_request(audio_base64, ASR_UPLOAD_FORMAT)
+                )
+        text = response.choices[0].message.content or ""
+        return TranscriptSegment(index, start / sample_rate, end / sample_rate, text)
+
+    tasks = [
+        asyncio.ensure_future(transcribe(index, start, end))
+        for index, (start, end) in enumerate(ranges)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def transcribe_audio(audio_path: str, max_segment_s: float = TRANSCRIBE_SEGMENT_S) -> str:
+    """Transcribes a clip in one request, or in concurrent segments if it is longer than max_segment_s."""
+    if sf.info(audio_path).duration > max_segment_s:
+        return stitch_transcript(transcribe_segments(audio_path, max_segment_s))
+
+    audio_base64 = _upload_base64(audio_path)
+
+    with tracing.span("asr.request"):
+        response = CLIENT.chat.completions.create(
+            **_transcription_request(audio_base64, ASR_UPLOAD_FORMAT)
+        )
+
     return response.choices[0].message.content
 
 
-def clone_audio(reference_name, output_path, dialogue_text):
+async def atranscribe_audio(audio_path: str, max_segment_s: float = TRANSCRIBE_SEGMENT_S) -> str:
+    info = await asyncio.to_thread(sf.info, audio_path)
+    if info.duration > max_segment_s:
+        return stitch_transcript([s async for s in atranscribe_segments(audio_path, max_segment_s)])
+
+    audio_base64 = await asyncio.to_thread(_upload_base64, audio_path)
+
+    with tracing.span("asr.request"):
+        response = await ASYNC_CLIENT.chat.completions.create(
+            **_transcription_request(audio_base64, ASR_UPLOAD_FORMAT)
+        )
+
+    return response.choices[0].message.content
+
+
+def register_recorded_voice(
+    name: str, path: str, transcript: Optional[str] = None
+) -> VoiceProfile:
+    """
+    Adds a VoiceRecorder recording (or any reference clip) to VOICE_REGISTRY.
+    Without a transcript the clip is transcribed first, since cloning needs both.
+    """
+    if transcript is None:
+        transcript = transcribe_audio(path)
+    return VOICE_REGISTRY.register(name, transcript, path)
+
+
+def _clone_request(profile: VoiceProfile, dialogue_text: str) -> dict:
     system = "You are an AI assistant that converts the tone of a speech to be similar to that of a reference audio"
-    resp = CLIENT.chat.completions.create(
+    return dict(
         model="higgs-audio-generation-Hackathon",
         messages=[
             {"role": "system", "content": system},
-            {"role": "user", "content": CHARACTER_TO_REFERENCE_MAP[reference_name][0]},
+            {"role": "user", "content": profile.transcript},
             {
                 "role": "assistant",
                 "content": [
                     {
                         "type": "input_audio",
                         "input_audio": {
-                            "data": encode_audio_to_base64(
-                                CHARACTER_TO_REFERENCE_MAP[reference_name][1]
-                            ),
-                            "format": "wav",
+                            "data": profile.audio_base64,
+                            "format": profile.audio_format,
                         },
                     }
                 ],
@@ -202,10 +558,29 @@ def clone_audio(reference_name, output_path, dialogue_text):
         extra_body={"top_k": 50},
     )
 
+
+def clone_audio(reference_name, output_path, dialogue_text):
+    profile = VOICE_REGISTRY.get(reference_name)
+    print(f"Cloning with '{profile.name}': {profile.payload_bytes} bytes of reference audio")
+
+    with tracing.span("tts.clone", voice=profile.name):
+        resp = CLIENT.chat.completions.create(**_clone_request(profile, dialogue_text))
+
     audio_b64 = resp.choices[0].message.audio.data
     open(output_path, "wb").write(base64.b64decode(audio_b64))
 
 
+async def aclone_audio(reference_name, output_path, dialogue_text):
+    profile = VOICE_REGISTRY.get(reference_name)
+    print(f"Cloning with '{profile.name}': {profile.payload_bytes} bytes of reference audio")
+
+    with tracing.span("tts.clone", voice=profile.name):
+        resp = await ASYNC_CLIENT.chat.completions.create(**_clone_request(profile, dialogue_text))
+
+    audio_b64 = resp.choices[0].message.audio.data
+    await asyncio.to_thread(_write_file, output_path, base64.b64decode(audio_b64))
+
+
 if __name__ == "__main__":
     # recorder = VoiceRecorder()
 
@@ -0,0 +1,99 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+import soundfile as sf
+
+
+class AudioFormat(NamedTuple):
+    name: str
+    mime_type: str
+    container: Optional[str]  # soundfile format; None means the WAV is returned as is
+    subtype: Optional[str]
+
+
+# Output formats a client can ask for. Opus gives the smallest speech files; WAV is the default.
+AUDIO_FORMATS: Dict[str, AudioFormat] = {
+    "wav": AudioFormat("wav", "audio/wav", None, None),
+    "opus": AudioFormat("opus", "audio/ogg; codecs=opus", "OGG", "OPUS"),
+    "mp3": AudioFormat("mp3", "audio/mpeg", "MP3", "MPEG_LAYER_III"),
+    "flac": AudioFormat("flac", "audio/flac", "FLAC", "PCM_16"),
+}
+DEFAULT_AUDIO_FORMAT = "wav"
+
+# Media types in an Accept header, mapped to the format that satisfies them
+MIME_TO_FORMAT = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+}
+
+# Encoding is CPU-bound (libsndfile releases the GIL), so it gets its own pool sized to the cores
+ENCODER_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="encode")
+
+
+class UnsupportedAudioFormat(ValueError):
+    """Raised for an output format name that is not in AUDIO_FORMATS."""
+
+
+def get_audio_format(name: str) -> AudioFormat:
+    try:
+        return AUDIO_FORMATS[name.lower()]
+    except KeyError:
+        raise UnsupportedAudioFormat(
+            f"unsupported audio format '{name}', expected one of: {', '.join(AUDIO_FORMATS)}"
+        ) from None
+
+
+def negotiate_audio_format(requested: Optional[str], accept: Optional[str]) -> AudioFormat:
+    """
+    Picks the output format: an explicit request parameter wins, then the audio type with the
+    highest q-value in the Accept header, then WAV. Raises UnsupportedAudioFormat for a bad parameter.
+    """
+    if requested:
+        return get_audio_format(requested)
+
+    best, best_q = DEFAULT_AUDIO_FORMAT, 0.0
+    for item in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        name = MIME_TO_FORMAT.get(media_type.lower())
+        if name is None:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = name, q
+    return AUDIO_FORMATS[best]
+
+
+def encode_audio(data: bytes, audio_format: AudioFormat) -> bytes:
+    """
+    Re-encodes an in-memory clip (WAV, or any other format in AUDIO_FORMATS) into
+    audio_format, without touching the disk. WAV input asked for as WAV is returned as is.
+    """
+    if not data or (audio_format.container is None and data[:4] == b"RIFF"):
+        return data
+
+    samples, sample_rate = sf.read(io.BytesIO(data), dtype="int16")
+    out = io.BytesIO()
+    sf.write(
+        out,
+        np.ascontiguousarray(samples),
+        sample_rate,
+        format=audio_format.container or "WAV",
+        subtype=audio_format.subtype or "PCM_16",
+    )
+    return out.getvalue()
@@ -0,0 +1,86 @@
+import io
+import os
+from typing import NamedTuple
+
+import numpy as np
+import soundfile as sf
+
+from core import tracing
+from core.dsp import resample
+from core.vad import VAD_FRAME_MS, frame_levels_db, frame_zcr, speech_frames
+
+# The understanding model hears 16 kHz mono; anything above that is upload overhead
+ASR_SAMPLE_RATE = int(os.getenv("ASR_SAMPLE_RATE", "16000"))
+# "wav" (16-bit PCM) is accepted everywhere; "flac" halves it again where the endpoint takes it
+ASR_UPLOAD_FORMAT = os.getenv("ASR_UPLOAD_FORMAT", "wav")
+# Silence kept before the first and after the last speech frame when trimming
+TRIM_PAD_MS = 150
+
+UPLOAD_SUBTYPES = {"wav": ("WAV", "PCM_16"), "flac": ("FLAC", "PCM_16")}
+
+
+class PreparedAudio(NamedTuple):
+    data: bytes
+    file_format: str
+    sample_rate: int
+    duration_s: float
+    bytes_before: int
+    bytes_after: int
+
+
+def load_mono(path: str, sample_rate: int = ASR_SAMPLE_RATE) -> np.ndarray:
+    """Reads any soundfile-readable clip as mono float32 at sample_rate."""
+    with tracing.span("file.read"):
+        samples, source_rate = sf.read(path, dtype="float32", always_2d=True)
+    mono = samples[:, 0] if samples.shape[1] == 1 else samples.mean(axis=1)
+    with tracing.span("audio.resample", source_rate=source_rate, sample_rate=sample_rate):
+        return resample(mono, source_rate, sample_rate)
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int, pad_ms: int = TRIM_PAD_MS) -> np.ndarray:
+    """Cuts leading and trailing non-speech, keeping pad_ms of it on each side."""
+    frame = max(1, sample_rate * VAD_FRAME_MS // 1000)
+    speech = np.flatnonzero(
+        speech_frames(frame_levels_db(samples, frame), frame_zcr(samples, frame))
+    )
+    if not len(speech):
+        return samples
+    pad = sample_rate * pad_ms // 1000
+    start = max(0, int(speech[0]) * frame - pad)
+    end = min(len(samples), (int(speech[-1]) + 1) * frame + pad)
+    return samples[start:end]
+
+
+def encode_for_upload(samples: np.ndarray, sample_rate: int, upload_format: str = ASR_UPLOAD_FORMAT) -> bytes:
+    container, subtype = UPLOAD_SUBTYPES[upload_format]
+    pcm = np.clip(np.rint(samples * 32767), -32768, 32767).astype(np.int16)
+    out = io.BytesIO()
+    with tracing.span("audio.encode", format=upload_format):
+        sf.write(out, pcm, sample_rate, format=container, subtype=subtype)
+    return out.getvalue()
+
+
+def prepare_upload(
+    path: str,
+    sample_rate: int = ASR_SAMPLE_RATE,
+    upload_format: str = ASR_UPLOAD_FORMAT,
+    trim: bool = True,
+) -> PreparedAudio:
+    """
+    Turns a recording into the smallest clip the understanding model needs, in memory:
+    mono, resampled to sample_rate, 16-bit (or FLAC) and without leading/trailing silence.
+    A 44.1 kHz recording shrinks 2.8x (16-bit) to 5.5x (float) as WAV before trimming,
+    and about 1.5x more as FLAC.
+    """
+    samples = load_mono(path, sample_rate)
+    if trim:
+        samples = trim_silence(samples, sample_rate)
+    data = encode_for_upload(samples, sample_rate, upload_format)
+    return PreparedAudio(
+        data=data,
+        file_format=upload_format,
+        sample_rate=sample_rate,
+        duration_s=len(samples) / sample_rate,
+        bytes_before=os.path.getsize(path),
+        bytes_after=len(data),
+    )
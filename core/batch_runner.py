@@ -0,0 +1,239 @@
+"""
+Headless batch runner: runs many debates at once from a JSONL job file.
+
+Each line of the job file is one debate:
+
+    {"id": "ai-jobs", "topic": "...", "persona_a": "...", "persona_b": "...",
+     "turns": 6, "voices": ["mabel", "en_man"], "audio": true}
+
+Only topic, persona_a and persona_b are required; "context" may name a .txt/.docx/.pdf
+file the agents should draw on (see core/retrieval.py). A panel job gives "personas" (a
+list of any length) instead of persona_a/persona_b, and may pick a turn "scheduler"
+(round_robin, moderator, most_relevant; see core/scheduling.py); voices are handed out
+to the panelists in turn. Every job writes to <out>/<id>/:
+transcript.jsonl (one line per finished turn), turn_XX_<speaker>.wav, and result.json
+once the debate is complete. Re-running the same command skips finished jobs and
+continues interrupted ones from their saved turns. All API calls queue at batch priority,
+behind interactive traffic in the same process (see core/ratelimit.py).
+
+    python -m core.batch_runner jobs.jsonl --out batch_output --concurrency 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from core import ratelimit, tracing
+from core.agent_manager import AGENT_LABELS, AgentManager
+from core.audio_api import DEFAULT_VOICE_EN_MAN, DEFAULT_VOICE_MABEL, generate_dialogue_audio
+from core.retrieval import load_context_index
+
+
+class Throughput:
+    """
+    Counts finished debates and turns across worker threads. Jobs an earlier run already
+    finished are only counted as skipped, so they do not inflate the rates.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.debates = 0
+        self.turns = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def add_turn(self) -> None:
+        with self._lock:
+            self.turns += 1
+
+    def add_skipped(self) -> None:
+        with self._lock:
+            self.skipped += 1
+
+    def add_debate(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.debates += 1
+            else:
+                self.failed += 1
+
+    def report(self) -> Dict[str, float]:
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            return {
+                "elapsed_s": round(elapsed, 1),
+                "debates": self.debates,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "turns": self.turns,
+                "debates_per_min": round(self.debates / elapsed * 60, 2) if elapsed else 0.0,
+                "turns_per_s": round(self.turns / elapsed, 3) if elapsed else 0.0,
+            }
+
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            job.setdefault("id", f"job_{line_no:05d}")
+            job.setdefault("turns", 6)
+            job.setdefault("voices", [DEFAULT_VOICE_MABEL, DEFAULT_VOICE_EN_MAN])
+            job.setdefault("audio", True)
+            jobs.append(job)
+    return jobs
+
+
+def _load_done_turns(transcript_path: str) -> List[Dict[str, Any]]:
+    """Turns saved by an earlier, interrupted run (a torn last line is ignored)."""
+    turns = []
+    if os.path.exists(transcript_path):
+        with open(transcript_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    turns.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    return turns
+
+
+def run_job(
+    job: Dict[str, Any], out_dir: str, audio_pool: ThreadPoolExecutor, stats: Throughput
+) -> Optional[Dict[str, Any]]:
+    """Runs (or continues) one debate and returns its result; None if an earlier run finished it."""
+    with ratelimit.priority(ratelimit.BATCH):
+        return _run_job(job, out_dir, audio_pool, stats)
+
+
+def _run_job(
+    job: Dict[str, Any], out_dir: str, audio_pool: ThreadPoolExecutor, stats: Throughput
+) -> Optional[Dict[str, Any]]:
+    job_dir = os.path.join(out_dir, job["id"])
+    result_path = os.path.join(job_dir, "result.json")
+    if os.path.exists(result_path):
+        return None
+
+    os.makedirs(job_dir, exist_ok=True)
+    transcript_path = os.path.join(job_dir, "transcript.jsonl")
+    done_turns = _load_done_turns(transcript_path)[: job["turns"]]
+    start = time.perf_counter()
+
+    personas = job.get("personas") or [job["persona_a"], job["persona_b"]]
+    manager = AgentManager(*personas, scheduler=job.get("scheduler"), voices=job["voices"])
+    if job.get("context"):
+        # Indexed once per distinct file content, however many jobs share it
+        manager.set_context_index(load_context_index(job["context"]))
+    if done_turns:
+        manager.resume(
+            job["topic"],
+            [t["text"] for t in done_turns],
+            [AGENT_LABELS.index(t["speaker"].upper()) for t in done_turns],
+        )
+        last_response = manager.dialogue_history[-1]
+    else:
+        last_response = job["topic"]
+
+    def synthesize(turn: Dict[str, Any]) -> None:
+        path = os.path.join(job_dir, turn["audio"])
+        if not os.path.exists(path):
+            voice = manager.voice_of(AGENT_LABELS.index(turn["speaker"].upper()))
+            generate_dialogue_audio(turn["text"], path, voice)
+
+    # Audio of saved turns may be missing if the previous run stopped mid-synthesis
+    # (bound so synthesis keeps the batch priority in the audio threads)
+    audio_jobs = [audio_pool.submit(tracing.bind(synthesize), t) for t in done_turns] if job["audio"] else []
+
+    # Rewrite the file with only the valid turns, then append as the debate goes on
+    with open(transcript_path, "w", encoding="utf-8") as transcript_file:
+        for turn in done_turns:
+            transcript_file.write(json.dumps(turn) + "\n")
+
+        for index in range(len(done_turns), job["turns"]):
+            turns_before = len(manager.transcript)
+            last_response = manager.run_turn(last_response)
+            if len(manager.transcript) == turns_before:
+                # The agent reports API failures as text instead of raising
+                raise RuntimeError(last_response)
+            # The scheduler decides who spoke, so read it back from the manager
+            speaker = manager.label_of(manager.last_speaker).lower()
+
+            turn = {
+                "turn": index + 1,
+                "speaker": speaker,
+                "text": manager.transcript.last().text,
+                "audio": f"turn_{index + 1:02d}_{speaker}.wav",
+            }
+            transcript_file.write(json.dumps(turn) + "\n")
+            transcript_file.flush()
+            stats.add_turn()
+
+            # Synthesis of this turn overlaps the generation of the next one
+            if job["audio"]:
+                audio_jobs.append(audio_pool.submit(tracing.bind(synthesize), turn))
+
+    for future in audio_jobs:
+        future.result()
+
+    result = {
+        "id": job["id"],
+        "topic": job["topic"],
+        "turns": job["turns"],
+        "resumed_from_turn": len(done_turns),
+        "elapsed_s": round(time.perf_counter() - start, 2),
+    }
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def run_batch(jobs_path: str, out_dir: str, concurrency: int = 4) -> Dict[str, Any]:
+    jobs = load_jobs(jobs_path)
+    os.makedirs(out_dir, exist_ok=True)
+    stats = Throughput()
+
+    print(f"Running {len(jobs)} debates with concurrency {concurrency}")
+    # Each debate has at most one synthesis in flight per turn, so one audio slot per debate
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="debate") as debate_pool, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-audio") as audio_pool:
+        futures = {debate_pool.submit(run_job, job, out_dir, audio_pool, stats): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                if future.result() is None:
+                    stats.add_skipped()
+                    print(f"[skipped] {job['id']}: finished in an earlier run")
+                    continue
+                stats.add_debate(ok=True)
+                print(f"[done] {job['id']} | {stats.report()}")
+            except Exception as e:
+                stats.add_debate(ok=False)
+                print(f"[failed] {job['id']}: {e}")
+
+    report = stats.report()
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Finished: {report}")
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run many debates from a JSONL job file.")
+    parser.add_argument("jobs", help="JSONL file with one debate job per line")
+    parser.add_argument("--out", default="batch_output", help="output directory")
+    parser.add_argument("--concurrency", type=int, default=4, help="debates running at once")
+    args = parser.parse_args(argv)
+
+    report = run_batch(args.jobs, args.out, args.concurrency)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+Record/replay of the Boson API calls at the HTTP transport level.
+
+Every openai client in the app gets its httpx client through here (via core/ratelimit.py). With
+BOSON_CASSETTE_MODE unset nothing changes. Otherwise requests go through a
+CassetteTransport:
+
+  record  every call goes to the network and its response is saved
+  replay  calls are answered from the cassette only (a miss is an error, nothing is sent)
+  auto    answered from the cassette when possible, recorded otherwise
+
+A cassette is a directory (BOSON_CASSETTE_DIR) with an append-only index.jsonl, one line
+per response, keyed by a hash of the canonical request (method, path, query and the JSON
+body with sorted keys; headers such as the API key are left out). Small text bodies are
+stored inline; audio and other large bodies go to content-addressed files under blobs/.
+Identical requests made several times replay their responses in recorded order.
+
+Replay is instant unless BOSON_CASSETTE_LATENCY is set: 1 replays the recorded time to
+headers and the timing of every streamed chunk, 0.5 half of it, and so on.
+
+    BOSON_CASSETTE_MODE=record python -m core.batch_runner jobs.jsonl --out run1
+    BOSON_CASSETTE_MODE=replay python -m core.batch_runner jobs.jsonl --out run2
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+import openai
+
+CASSETTE_MODE = os.getenv("BOSON_CASSETTE_MODE", "off").lower()
+CASSETTE_DIR = os.getenv("BOSON_CASSETTE_DIR", "cassettes")
+CASSETTE_LATENCY = float(os.getenv("BOSON_CASSETTE_LATENCY", "0"))
+CASSETTE_MODES = ("off", "record", "replay", "auto")
+
+# Bodies up to this size that are plain text are kept in the index itself
+INLINE_BODY_BYTES = 4096
+# Response headers worth replaying; the rest (dates, request ids, cookies) only add noise
+KEPT_HEADERS = ("content-type", "content-encoding")
+
+
+class CassetteMiss(httpx.TransportError):
+    """A replay-mode request that is not on the cassette."""
+
+
+def request_key(request: httpx.Request) -> str:
+    """Canonical hash of a request: what the API sees, minus credentials and client noise."""
+    body = request.read()
+    if body and request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+        except ValueError:
+            pass
+    query = urlencode(sorted(parse_qsl(request.url.query.decode())))
+    digest = hashlib.sha256(f"{request.method} {request.url.path}?{query}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class CassetteStore:
+    """The on-disk cassette: index.jsonl plus blobs/, loaded into memory on first use."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.blob_dir = os.path.join(directory, "blobs")
+        # Entries written by this process carry its run id; see _load
+        self.run_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._replayed: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        # Callers hold self._lock. When a request was re-recorded, only its latest run counts.
+        if self._entries is None:
+            entries: Dict[str, List[Dict[str, Any]]] = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        entry = json.loads(line)
+                        runs = entries.setdefault(entry["key"], [])
+                        if runs and runs[-1]["run"] != entry["run"]:
+                            runs.clear()
+                        runs.append(entry)
+            self._entries = entries
+        return self._entries
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self._load()
+
+    def next_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """The next recorded response for key, repeating the last one once all were served."""
+        with self._lock:
+            responses = self._load().get(key)
+            if not responses:
+                self.stats["misses"] += 1
+                return None
+            served = self._replayed.get(key, 0)
+            self._replayed[key] = served + 1
+            self.stats["hits"] += 1
+            return responses[min(served, len(responses) - 1)]
+
+    def body(self, entry: Dict[str, Any]) -> bytes:
+        if entry.get("blob"):
+            with open(self._blob_path(entry["blob"]), "rb") as f:
+                return f.read()
+        return entry.get("body", "").encode("utf-8")
+
+    def save(
+        self,
+        key: str,
+        request: httpx.Request,
+        response: httpx.Response,
+        body: bytes,
+        headers_ms: float,
+        chunks: List[Tuple[int, float]],
+    ) -> None:
+        entry: Dict[str, Any] = {
+            "key": key,
+            "run": self.run_id,
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() in KEPT_HEADERS},
+            "headers_ms": round(headers_ms, 1),
+            "chunks": [[size, round(at_ms, 1)] for size, at_ms in chunks],
+        }
+        text = None
+        if len(body) <= INLINE_BODY_BYTES and "content-encoding" not in response.headers:
+            try:
+                text = body.decode("utf-8")
+            except UnicodeDecodeError:
+                pass
+        if text is not None:
+            entry["body"] = text
+        else:
+            entry["blob"] = self._write_blob(body)
+
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            entries = self._load()
+            runs = entries.setdefault(key, [])
+            if runs and runs[-1]["run"] != self.run_id:
+                runs.clear()
+            runs.append(entry)
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.stats["recorded"] += 1
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _write_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+        return digest
+
+
+class _Recorder:
+    """Collects a response body and its chunk timing as the client reads it."""
+
+    def __init__(self, store, key, request, response, started):
+        self.store, self.key, self.request, self.response = store, key, request, response
+        self.started = started
+        self.headers_ms = (time.perf_counter() - started) * 1000
+        self.parts: List[bytes] = []
+        self.chunks: List[Tuple[int, float]] = []
+        self.complete = False
+
+    def add(self, chunk: bytes) -> None:
+        self.parts.append(chunk)
+        self.chunks.append((len(chunk), (time.perf_counter() - self.started) * 1000))
+
+    def finish(self) -> None:
+        # A body the client stopped reading halfway is not worth replaying
+        if self.complete:
+            body = b"".join(self.parts)
+            self.store.save(self.key, self.request, self.response, body, self.headers_ms, self.chunks)
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, recorder: _Recorder):
+        self._inner = inner
+        self._recorder = recorder
+
+    def __iter__(self):
+        for chunk in self._inner:
+            self._recorder.add(chunk)
+            yield chunk
+        self._recorder.complete = True
+
+    def close(self) -> None:
+        self._inner.close()
+        self._recorder.finish()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, recorder: _Recorder):
+        self._inner = inner
+        self._recorder = recorder
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            self._recorder.add(chunk)
+            yield chunk
+        self._recorder.complete = True
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+        self._recorder.finish()
+
+
+def _replay_chunks(entry: Dict[str, Any], body: bytes):
+    """(delay_s from the request start, chunk) pairs of a recorded body."""
+    offset = 0
+    for size, at_ms in entry["chunks"] or [[len(body), entry["headers_ms"]]]:
+        yield at_ms * CASSETTE_LATENCY / 1000, body[offset:offset + size]
+        offset += size
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, entry: Dict[str, Any], body: bytes, started: float):
+        self._entry, self._body, self._started = entry, body, started
+
+    def __iter__(self):
+        for due, chunk in _replay_chunks(self._entry, self._body):
+            wait = due - (time.perf_counter() - self._started)
+            if wait > 0:
+                time.sleep(wait)
+            yield chunk
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, entry: Dict[str, Any], body: bytes, started: float):
+        self._entry, self._body, self._started = entry, body, started
+
+    async def __aiter__(self):
+        for due, chunk in _replay_chunks(self._entry, self._body):
+            wait = due - (time.perf_counter() - self._started)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield chunk
+
+
+class _CassetteBase:
+    def __init__(self, store: CassetteStore, mode: str):
+        if mode not in CASSETTE_MODES[1:]:
+            raise ValueError(f"unknown cassette mode '{mode}', expected one of: {', '.join(CASSETTE_MODES)}")
+        self.store = store
+        self.mode = mode
+
+    def _lookup(self, request: httpx.Request) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """The request's key and the entry to replay, or None if it has to go to the network."""
+        key = request_key(request)
+        if self.mode == "record" or (self.mode == "auto" and not self.store.has(key)):
+            return key, None
+        entry = self.store.next_entry(key)
+        if entry is None:
+            print(f"Cassette miss: {request.method} {request.url.path} ({key[:12]})")
+            raise CassetteMiss(f"no recorded response for {request.method} {request.url.path}", request=request)
+        return key, entry
+
+    def _replayed(self, entry: Dict[str, Any], stream) -> httpx.Response:
+        return httpx.Response(entry["status"], headers=entry["headers"], stream=stream)
+
+
+class CassetteTransport(_CassetteBase, httpx.BaseTransport):
+    def __init__(self, store: CassetteStore, mode: str, inner: Optional[httpx.BaseTransport] = None):
+        super().__init__(store, mode)
+        self.inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        key, entry = self._lookup(request)
+        if entry is not None:
+            delay = entry["headers_ms"] * CASSETTE_LATENCY / 1000
+            if delay > 0:
+                time.sleep(delay)
+            return self._replayed(entry, _ReplayStream(entry, self.store.body(entry), started))
+
+        response = self.inner.handle_request(request)
+        recorder = _Recorder(self.store, key, request, response, started)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, recorder),
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncCassetteTransport(_CassetteBase, httpx.AsyncBaseTransport):
+    def __init__(self, store: CassetteStore, mode: str, inner: Optional[httpx.AsyncBaseTransport] = None):
+        super().__init__(store, mode)
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        key, entry = self._lookup(request)
+        if entry is not None:
+            delay = entry["headers_ms"] * CASSETTE_LATENCY / 1000
+            if delay > 0:
+                await asyncio.sleep(delay)
+            body = await asyncio.to_thread(self.store.body, entry)
+            return self._replayed(entry, _AsyncReplayStream(entry, body, started))
+
+        response = await self.inner.handle_async_request(request)
+        recorder = _Recorder(self.store, key, request, response, started)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_AsyncRecordingStream(response.stream, recorder),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+# One store per process, shared by every client, so replay order is global
+STORE = CassetteStore(CASSETTE_DIR) if CASSETTE_MODE != "off" else None
+
+
+def http_client(inner: Optional[httpx.BaseTransport] = None) -> Optional[httpx.Client]:
+    """
+    The httpx client for an openai.Client: None (the default) unless a cassette is active.
+    Recorded calls go out through inner (e.g. the rate limiter), or straight to the network.
+    """
+    if STORE is None:
+        return None
+    return openai.DefaultHttpxClient(transport=CassetteTransport(STORE, CASSETTE_MODE, inner))
+
+
+def async_http_client(inner: Optional[httpx.AsyncBaseTransport] = None) -> Optional[httpx.AsyncClient]:
+    """Async twin of http_client, for openai.AsyncClient."""
+    if STORE is None:
+        return None
+    return openai.DefaultAsyncHttpxClient(transport=AsyncCassetteTransport(STORE, CASSETTE_MODE, inner))
@@ -0,0 +1,215 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Analysis frame and search tolerance of the time-stretcher. 30 ms frames keep a full
+# period of low voices inside each frame; 10 ms of tolerance is enough to find a match.
+STRETCH_FRAME_MS = 30
+STRETCH_TOLERANCE_MS = 10
+
+
+class TimeStretcher:
+    """
+    Pitch-preserving time-stretch (WSOLA) for 16-bit mono PCM, applied block by block.
+
+    speed > 1 makes the audio shorter (faster speech) without changing its pitch. Feed
+    PCM with process() as it arrives; every call returns the output that is final so
+    far, so streamed TTS can be played as it is stretched. flush() returns the tail.
+
+    Each output frame is the input segment, near its nominal position, that best
+    continues the previous one (the offset with the highest cross-correlation),
+    overlap-added with a Hann window at 50% overlap.
+    """
+
+    def __init__(self, speed: float, sample_rate: int = 24000):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.speed = speed
+        self.frame = 2 * (sample_rate * STRETCH_FRAME_MS // 2000)
+        self.hop_out = self.frame // 2
+        self.hop_in = self.hop_out * speed
+        self.tolerance = sample_rate * STRETCH_TOLERANCE_MS // 1000
+
+        # Periodic Hann: two windows at 50% overlap sum to exactly one
+        n = np.arange(self.frame)
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * n / self.frame)).astype(np.float32)
+        # The first frame has no predecessor to fade in from
+        self.first_window = self.window.copy()
+        self.first_window[:self.hop_out] = 1.0
+
+        self._input = np.zeros(0, dtype=np.float32)
+        self._input_start = 0  # absolute index of self._input[0]
+        self._input_total = 0
+        self._output = np.zeros(self.frame, dtype=np.float32)
+        self._output_start = 0  # absolute index of self._output[0]
+        self._emitted = 0
+        self._frame_index = 0
+        self._previous = 0  # absolute input position of the last frame used
+        self._odd_byte = b""
+
+    def process(self, pcm: bytes) -> bytes:
+        """Adds a block of int16 PCM and returns the stretched samples that are ready."""
+        if self.speed == 1.0:
+            return pcm
+
+        pcm = self._odd_byte + pcm
+        usable = len(pcm) - len(pcm) % 2
+        self._odd_byte = pcm[usable:]
+        samples = np.frombuffer(pcm[:usable], dtype="<i2").astype(np.float32)
+
+        self._input = np.concatenate((self._input, samples))
+        self._input_total += len(samples)
+        return self._run(final=False)
+
+    def flush(self) -> bytes:
+        """Stretches whatever input is left and returns the end of the output."""
+        if self.speed == 1.0:
+            return b""
+        # Silence after the end lets the last frames be matched and overlap-added
+        self._input = np.concatenate(
+            (self._input, np.zeros(self.frame + 2 * self.tolerance, dtype=np.float32))
+        )
+        return self._run(final=True)
+
+    def _run(self, final: bool) -> bytes:
+        input_end = self._input_start + len(self._input)
+        expected = round(self._input_total / self.speed)
+
+        while True:
+            k = self._frame_index
+            nominal = round(k * self.hop_in)
+            if final and nominal >= self._input_total:
+                break
+            if k == 0:
+                position = 0
+                if input_end < self.frame:
+                    break
+            else:
+                natural = self._previous + self.hop_out
+                low = max(0, nominal - self.tolerance)
+                high = nominal + self.tolerance
+                if max(high, natural) + self.frame > input_end:
+                    break
+                position = low + self._best_offset(natural, low, high)
+
+            segment = self._slice(position, self.frame)
+            window = self.first_window if k == 0 else self.window
+            start = k * self.hop_out - self._output_start
+            self._output[start:start + self.frame] += segment * window
+
+            self._previous = position
+            self._frame_index += 1
+            self._grow_output()
+            self._trim_input()
+
+        if final:
+            ready = min(expected, self._output_start + len(self._output))
+        else:
+            # Everything before the next frame's start will not change anymore
+            ready = self._frame_index * self.hop_out
+        return self._emit(ready)
+
+    def _best_offset(self, natural: int, low: int, high: int) -> int:
+        template = self._slice(natural, self.frame)
+        candidates = sliding_window_view(self._slice(low, high - low + self.frame), self.frame)
+        return int(np.argmax(candidates @ template))
+
+    def _slice(self, position: int, length: int) -> np.ndarray:
+        start = position - self._input_start
+        return self._input[start:start + length]
+
+    def _grow_output(self) -> None:
+        needed = (self._frame_index + 1) * self.hop_out + self.frame - self._output_start
+        if needed > len(self._output):
+            # Grow geometrically so stretching a whole clip at once stays linear
+            grown = np.zeros(max(needed, 2 * len(self._output)), dtype=np.float32)
+            grown[:len(self._output)] = self._output
+            self._output = grown
+
+    def _trim_input(self) -> None:
+        # The next frame never looks before its search window or the natural continuation
+        next_low = round(self._frame_index * self.hop_in) - self.tolerance
+        keep_from = min(next_low, self._previous + self.hop_out)
+        drop = keep_from - self._input_start
+        if drop > 0:
+            self._input = self._input[drop:]
+            self._input_start += drop
+
+    def _emit(self, ready: int) -> bytes:
+        count = ready - self._emitted
+        if count <= 0:
+            return b""
+        start = self._emitted - self._output_start
+        block = self._output[start:start + count]
+        self._emitted = ready
+
+        # Drop emitted samples that no frame will touch again
+        drop = self._emitted - self._output_start
+        self._output = self._output[drop:]
+        self._output_start += drop
+        return np.clip(np.rint(block), -32768, 32767).astype("<i2").tobytes()
+
+
+def time_stretch(pcm: bytes, speed: float, sample_rate: int = 24000) -> bytes:
+    """Stretches a whole 16-bit mono PCM clip in memory (see TimeStretcher)."""
+    stretcher = TimeStretcher(speed, sample_rate)
+    return stretcher.process(pcm) + stretcher.flush()
+
+
+# Half-length of the resampling filter in samples of the lower of the two rates, and its
+# Kaiser beta: about 80 dB of stopband attenuation, so aliasing stays below microphone noise
+RESAMPLE_HALF_TAPS = 16
+RESAMPLE_KAISER_BETA = 8.6
+
+
+def _polyphase_filter(up: int, down: int, half_taps: int) -> np.ndarray:
+    """Anti-aliasing low-pass split into up phases, each reversed for a dot product with a window."""
+    length = 2 * half_taps * max(up, down) + 1
+    taps = -(-length // up)
+    cutoff = 0.5 / max(up, down)
+    n = np.arange(length) - (length - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, RESAMPLE_KAISER_BETA) * up
+    h = np.concatenate((h, np.zeros(taps * up - length)))
+    # phases[p, k] = h[p + k * up]
+    return h.reshape(taps, up).T[:, ::-1].astype(np.float32)
+
+
+def resample_poly(samples: np.ndarray, up: int, down: int, half_taps: int = RESAMPLE_HALF_TAPS) -> np.ndarray:
+    """
+    Resamples a mono float signal by up / down with a polyphase FIR filter.
+
+    Output samples that share a filter phase are evenly spaced (every up-th one), and their
+    input windows are every down-th row of a sliding-window view, so each phase is a
+    single matrix-vector product over strided views of the input, with no zero-stuffing.
+    """
+    g = np.gcd(up, down)
+    up, down = up // g, down // g
+    if up == down:
+        return samples.astype(np.float32, copy=True)
+
+    phases = _polyphase_filter(up, down, half_taps)
+    taps = phases.shape[1]
+    delay = half_taps * max(up, down)
+    count = -(-len(samples) * up // down)  # ceil
+
+    padded = np.concatenate((
+        np.zeros(taps - 1, dtype=np.float32),
+        samples.astype(np.float32, copy=False),
+        np.zeros(delay // up + 2, dtype=np.float32),
+    ))
+    windows = sliding_window_view(padded, taps)
+
+    out = np.empty(count, dtype=np.float32)
+    for r in range(min(up, count)):
+        # Outputs r, r + up, r + 2 * up, ... use phase p and windows base, base + down, ...
+        t = r * down + delay
+        phase, base = t % up, t // up
+        n = len(range(r, count, up))
+        out[r::up] = windows[base:base + n * down:down] @ phases[phase]
+    return out
+
+
+def resample(samples: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """Resamples a mono float signal between two sample rates (see resample_poly)."""
+    if from_rate == to_rate:
+        return samples.astype(np.float32, copy=False)
+    return resample_poly(samples, to_rate, from_rate)
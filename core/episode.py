@@ -0,0 +1,214 @@
+import os
+import io
+import json
+import uuid
+import struct
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import soundfile as sf
+
+from core.dsp import resample
+
+# Whole-debate recordings are kept here, one <episode_id>.wav (+ .jsonl chapters) per debate
+EPISODE_DIR = os.getenv("EPISODE_DIR", "audio_references/episodes")
+EPISODE_GAP_MS = int(os.getenv("EPISODE_GAP_MS", "300"))
+EPISODE_CROSSFADE_MS = int(os.getenv("EPISODE_CROSSFADE_MS", "20"))
+
+# Canonical 44-byte header of a 16-bit mono PCM WAV; the two sizes are patched on every append
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+RIFF_SIZE_OFFSET = 4
+DATA_SIZE_OFFSET = 40
+
+
+def _wav_header(sample_rate: int, data_bytes: int) -> bytes:
+    return WAV_HEADER.pack(
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", data_bytes,
+    )
+
+
+class EpisodeTrack:
+    """
+    A debate's audio as one growing WAV file on disk.
+
+    Turns are appended as they are produced, separated by gap_ms of silence; with gap_ms=0
+    consecutive turns overlap by crossfade_ms instead, otherwise each turn is faded in and out
+    over crossfade_ms. An append only writes the new samples (plus the short overlap region)
+    and patches the two size fields of the header, so the file is a valid, playable WAV at
+    any moment and never has to be re-mixed or re-encoded.
+
+    Given the id of an episode already on disk, the track reopens it and continues appending.
+    """
+
+    def __init__(
+        self,
+        episode_id: Optional[str] = None,
+        directory: str = EPISODE_DIR,
+        sample_rate: int = 24000,
+        gap_ms: int = EPISODE_GAP_MS,
+        crossfade_ms: int = EPISODE_CROSSFADE_MS,
+    ):
+        self.episode_id = episode_id or uuid.uuid4().hex
+        self.path = os.path.join(directory, f"{self.episode_id}.wav")
+        self.chapters_path = os.path.join(directory, f"{self.episode_id}.jsonl")
+        self.sample_rate = sample_rate
+        self.gap = sample_rate * gap_ms // 1000
+        self.crossfade = sample_rate * crossfade_ms // 1000
+        self._lock = threading.Lock()
+
+        # Samples in the file, and a copy of its last crossfade samples for the next overlap
+        self.samples = 0
+        self.turns = 0
+        self._tail = np.zeros(0, dtype=np.float32)
+
+        # Fade curves (equal-power, so a crossfade keeps the loudness constant)
+        ramp = (np.arange(self.crossfade, dtype=np.float32) + 0.5) / max(self.crossfade, 1)
+        self._fade_in = np.sin(ramp * np.pi / 2).astype(np.float32)
+        self._fade_out = self._fade_in[::-1].copy()
+
+        os.makedirs(directory, exist_ok=True)
+        try:
+            # Exclusive create, so an existing recording is never truncated
+            with open(self.path, "xb") as f:
+                f.write(_wav_header(sample_rate, 0))
+        except FileExistsError:
+            self._reopen()
+        else:
+            open(self.chapters_path, "w").close()
+
+    def _reopen(self) -> None:
+        """Picks up an episode on disk where it ended: its length, turns and last samples."""
+        with open(self.path, "rb") as f:
+            header = f.read(WAV_HEADER.size)
+            if len(header) < WAV_HEADER.size:
+                raise ValueError(f"episode {self.episode_id} is not a WAV file")
+            fields = WAV_HEADER.unpack(header)
+            if fields[0] != b"RIFF" or fields[2] != b"WAVE" or fields[11] != b"data":
+                raise ValueError(f"episode {self.episode_id} is not a WAV file")
+            if fields[7] != self.sample_rate:
+                raise ValueError(
+                    f"episode {self.episode_id} is recorded at {fields[7]} Hz, not {self.sample_rate} Hz"
+                )
+            # The header only counts samples whose write completed
+            self.samples = fields[12] // 2
+            keep = min(self.crossfade, self.samples)
+            f.seek(WAV_HEADER.size + (self.samples - keep) * 2)
+            self._tail = np.frombuffer(f.read(keep * 2), dtype="<i2").astype(np.float32)
+        if os.path.exists(self.chapters_path):
+            self.turns = len(read_chapters(self.chapters_path))
+        else:
+            open(self.chapters_path, "w").close()
+
+    @property
+    def duration_s(self) -> float:
+        return self.samples / self.sample_rate
+
+    def append_pcm(self, pcm: bytes, speaker: str = "", text: str = "") -> Dict[str, Any]:
+        """Appends one turn of 16-bit mono PCM at sample_rate and returns its chapter entry."""
+        clip = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype="<i2").astype(np.float32)
+        with self._lock:
+            return self._append(clip, speaker, text)
+
+    def append_audio(self, data: bytes, speaker: str = "", text: str = "") -> Dict[str, Any]:
+        """
+        Appends one turn given as an encoded clip (WAV, FLAC, Opus, MP3, ...); a clip at
+        another sample rate is resampled to the track's.
+        """
+        clip, rate = sf.read(io.BytesIO(data), dtype="int16")
+        if clip.ndim > 1:
+            clip = clip.mean(axis=1)
+        clip = resample(clip.astype(np.float32), rate, self.sample_rate)
+        with self._lock:
+            return self._append(clip, speaker, text)
+
+    def _append(self, clip: np.ndarray, speaker: str, text: str) -> Dict[str, Any]:
+        clip = clip.copy()
+        n = len(self._tail)
+        if not self.samples:
+            # First turn: fade in from silence
+            k = min(self.crossfade, len(clip))
+            clip[:k] *= self._fade_in[:k]
+            block, rewrite, start = clip, 0, 0
+        elif self.gap:
+            # Fade the previous turn out (rewriting its last samples), leave a gap, fade this one in
+            k = min(self.crossfade, len(clip))
+            clip[:k] *= self._fade_in[:k]
+            faded = self._tail * self._fade_out[self.crossfade - n:]
+            block = np.concatenate((faded, np.zeros(self.gap, dtype=np.float32), clip))
+            rewrite, start = n, self.samples + self.gap
+        else:
+            # No gap: overlap the start of this turn with the end of the previous one
+            n = min(n, len(clip))
+            mixed = (
+                self._tail[len(self._tail) - n:] * self._fade_out[self.crossfade - n:]
+                + clip[:n] * self._fade_in[:n]
+            )
+            block = np.concatenate((mixed, clip[n:]))
+            rewrite, start = n, self.samples - n
+
+        at = self.samples - rewrite
+        self._write(at, np.clip(np.rint(block), -32768, 32767).astype("<i2").tobytes())
+
+        if self.crossfade:
+            kept = self._tail[:len(self._tail) - rewrite]
+            self._tail = np.concatenate((kept, block))[-self.crossfade:]
+        self.samples = at + len(block)
+        self.turns += 1
+
+        chapter = {
+            "turn": self.turns,
+            "speaker": speaker,
+            "text": text,
+            "start_s": round(start / self.sample_rate, 3),
+            "end_s": round(self.samples / self.sample_rate, 3),
+        }
+        with open(self.chapters_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(chapter) + "\n")
+        return chapter
+
+    def _write(self, at_sample: int, data: bytes) -> None:
+        data_bytes = at_sample * 2 + len(data)
+        with open(self.path, "r+b") as f:
+            f.seek(WAV_HEADER.size + at_sample * 2)
+            f.write(data)
+            # Sizes last, so a concurrent reader never sees a header promising missing data
+            f.seek(RIFF_SIZE_OFFSET)
+            f.write(struct.pack("<I", 36 + data_bytes))
+            f.seek(DATA_SIZE_OFFSET)
+            f.write(struct.pack("<I", data_bytes))
+
+    def chapters(self) -> List[Dict[str, Any]]:
+        return read_chapters(self.chapters_path)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "episode_id": self.episode_id,
+            "turns": self.turns,
+            "duration_s": round(self.duration_s, 3),
+            "bytes": WAV_HEADER.size + self.samples * 2,
+        }
+
+
+def read_chapters(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def episode_paths(episode_id: str, directory: str = EPISODE_DIR):
+    """(wav path, chapters path) of a stored episode."""
+    return (
+        os.path.join(directory, f"{episode_id}.wav"),
+        os.path.join(directory, f"{episode_id}.jsonl"),
+    )
+
+
+def delete_episode(episode_id: str, directory: str = EPISODE_DIR) -> None:
+    """Removes a stored episode (its audio and chapters); missing files are ignored."""
+    for path in episode_paths(episode_id, directory):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
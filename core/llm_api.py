@@ -1,25 +1,64 @@
 import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import openai
-from typing import List, Dict, Optional
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 from openai.types.chat import ChatCompletionMessageParam
+from core import ratelimit, tracing
+from core.transcript import TranscriptView
 
 load_dotenv() 
 
 BOSON_API_KEY = os.getenv("BOSON_API_KEY")
 LLM_MODEL_NAME = "Qwen3-32B-non-thinking-Hackathon" 
-BASE_URL = "https://hackathon.boson.ai/v1"
+# Overridable so the app can run against a local stand-in (see bench/stub_server.py)
+BASE_URL = os.getenv("BOSON_LLM_ENDPOINT", "https://hackathon.boson.ai/v1")
+
+# End of a sentence: terminal punctuation (plus closing quotes/brackets) followed by whitespace.
+# Requiring the whitespace means "3.5" or a trailing "." mid-stream is not split too early.
+SENTENCE_END = re.compile(r"[.!?\u2026]+[\"')\]]*\s+")
+WORD = re.compile(r"\S+")
+
+# Rolling summaries of old turns are produced here so they never block a turn
+SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+SUMMARY_PROMPT = (
+    "Summarize the conversation below for the speaker labelled 'You' in at most 120 words. "
+    "Keep every position, argument and concession that matters for continuing the debate."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting prompts."""
+    return len(text) // 4 + 1
+
+
+def estimate_message_tokens(message: ChatCompletionMessageParam) -> int:
+    # A few tokens of chat-template overhead per message
+    return estimate_tokens(str(message.get("content") or "")) + 4
 
 # 1. API Key Check
 if not BOSON_API_KEY:
     # Log an error but do not exit, allowing the rest of the application to run (graceful failure)
     print("FATAL ERROR: BOSON_API_KEY not found. LLM functionality is disabled.")
     CLIENT = None
+    ASYNC_CLIENT = None
 else:
-    # 2. Initialize the OpenAI-compatible client once globally
+    # 2. Initialize the OpenAI-compatible clients once globally
+    # (http_client queues calls by endpoint and priority, and records/replays them when a
+    # cassette is active; see core/ratelimit.py and core/cassette.py)
     CLIENT = openai.Client(
         api_key=BOSON_API_KEY,
-        base_url=BASE_URL 
+        base_url=BASE_URL,
+        http_client=ratelimit.http_client("llm"),
+    )
+    # Async twin used by the agenerate_* path, so one event loop can drive many debates
+    ASYNC_CLIENT = openai.AsyncClient(
+        api_key=BOSON_API_KEY,
+        base_url=BASE_URL,
+        http_client=ratelimit.async_http_client("llm"),
     )
 
 class LLMAgent:
@@ -29,54 +68,231 @@ class LLMAgent:
     via the Boson LLM API.
     """
     
-    def __init__(self, name: str, persona: str, model: str):
+    def __init__(
+        self,
+        name: str,
+        persona: str,
+        model: str,
+        context_token_budget: Optional[int] = None,
+        keep_last_turns: int = 4,
+    ):
         self.name = name
         self.model = model
         self.persona = persona
         
         # History stores the ChatML format required by the API: 
         # [{"role": "system", "content": persona}, {"role": "user", "content": "..."}]
+        # It can also be a TranscriptView over a transcript shared with other agents.
         self.history: List[ChatCompletionMessageParam] = [
             {"role": "system", "content": self.persona}
         ]
+
+        # Bounded memory: with a budget, only the system prompt, a running summary and the
+        # most recent turns are sent. Older turns are folded into the summary in the background.
+        # This bounds the prompt, not memory: with a TranscriptView the folded lines leave the
+        # agent's history, but the shared transcript keeps them for dialogue_history and the UI.
+        self.context_token_budget = context_token_budget
+        # Optional callback returning extra context (e.g. retrieved passages) for the newest
+        # prompt; it is added to that prompt only, so earlier turns stay byte-identical
+        self.context_provider: Optional[Callable[[str], str]] = None
+        self.keep_last_turns = keep_last_turns
+        self.summary = ""
+        self._context_lock = threading.Lock()
+        self._summarizing = False
+        self._history_generation = 0  # bumped on reset, so a stale summary is not folded in
+        self._folded_tokens = 0  # estimated tokens of the turns already folded into the summary
+        self.context_stats = {
+            "prompt_tokens": 0,  # estimated prompt size of the last request
+            "full_prompt_tokens": 0,  # what the last request would have cost without the window
+            "saved_last_turn": 0,
+            "saved_total": 0,
+            "summaries": 0,
+        }
+        # (sent, full) estimated tokens of the last prompt built, until its reply is kept
+        self._prompt_size: Optional[Tuple[int, int]] = None
+
+    def reset_history(self) -> None:
+        """Clears the conversation (and its summary), keeping only the persona."""
+        with self._context_lock:
+            if isinstance(self.history, TranscriptView):
+                self.history.reset()
+            else:
+                self.history = [{"role": "system", "content": self.persona}]
+            self.summary = ""
+            self._folded_tokens = 0
+            self._history_generation += 1
+
+    def _context_messages(self) -> List[ChatCompletionMessageParam]:
+        """
+        The messages to send for the next request. Without a budget this is the full history;
+        with one, the system prompt (plus summary) and the newest messages that fit the budget.
+        """
+        if self.context_token_budget is None:
+            # A copy, which also materializes a TranscriptView into plain messages
+            return self._with_provided_context(list(self.history))
+
+        with self._context_lock:
+            system = self.history[0]
+            if self.summary:
+                system = {
+                    "role": "system",
+                    "content": f"{self.persona}\n\nSummary of the earlier conversation: {self.summary}",
+                }
+            turns = self.history[1:]
+            folded_tokens = self._folded_tokens
+
+        # Walk back from the newest message; the latest prompt is always kept
+        budget = self.context_token_budget - estimate_message_tokens(system)
+        window: List[ChatCompletionMessageParam] = []
+        for message in reversed(turns):
+            cost = estimate_message_tokens(message)
+            if window and cost > budget:
+                break
+            window.append(message)
+            budget -= cost
+        window.reverse()
+
+        sent = estimate_message_tokens(system) + sum(estimate_message_tokens(m) for m in window)
+        full = (
+            estimate_message_tokens(self.history[0])
+            + folded_tokens
+            + sum(estimate_message_tokens(m) for m in turns)
+        )
+        # Counted by _record_prompt_size once a reply to this prompt is actually kept, so
+        # drafts that are not spoken and failed requests do not inflate the counters
+        self._prompt_size = (sent, full)
+
+        return self._with_provided_context([system] + window)
+
+    def _record_prompt_size(self) -> None:
+        """Adds the size of the prompt the kept reply was generated from to context_stats."""
+        if self._prompt_size is None:
+            return
+        sent, full = self._prompt_size
+        self._prompt_size = None
+        self.context_stats["prompt_tokens"] = sent
+        self.context_stats["full_prompt_tokens"] = full
+        self.context_stats["saved_last_turn"] = full - sent
+        self.context_stats["saved_total"] += full - sent
+
+    def _with_provided_context(
+        self, messages: List[ChatCompletionMessageParam]
+    ) -> List[ChatCompletionMessageParam]:
+        if self.context_provider is None or messages[-1]["role"] != "user":
+            return messages
+        extra = self.context_provider(str(messages[-1]["content"]))
+        if extra:
+            messages[-1] = {"role": "user", "content": f"{messages[-1]['content']}\n\n{extra}"}
+        return messages
+
+    def _maybe_fold_history(self) -> None:
+        """Starts a background summary of the oldest turns once the history outgrows the budget."""
+        if self.context_token_budget is None or CLIENT is None:
+            return
+
+        with self._context_lock:
+            if self._summarizing:
+                return
+            total = sum(estimate_message_tokens(m) for m in self.history)
+            keep = 2 * self.keep_last_turns  # a turn is a prompt plus a reply
+            if total <= self.context_token_budget or len(self.history) - 1 <= keep:
+                return
+            to_fold = self.history[1:len(self.history) - keep]
+            previous_summary = self.summary
+            generation = self._history_generation
+            self._summarizing = True
+
+        SUMMARY_EXECUTOR.submit(tracing.bind(self._fold_history), to_fold, previous_summary, generation)
+
+    def _fold_history(
+        self,
+        to_fold: List[ChatCompletionMessageParam],
+        previous_summary: str,
+        generation: int,
+    ) -> None:
+        try:
+            transcript = "\n".join(
+                f"{'You' if m['role'] == 'assistant' else 'Other speaker'}: {m['content']}"
+                for m in to_fold
+            )
+            if previous_summary:
+                transcript = f"Summary so far: {previous_summary}\n\n{transcript}"
+
+            with tracing.span("llm.summarize", model=self.model):
+                response = CLIENT.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT},
+                        {"role": "user", "content": transcript},
+                    ],
+                    max_tokens=250,
+                    temperature=0.3,
+                )
+            tracing.record_usage(response.usage, self.model)
+            summary = (response.choices[0].message.content or "").strip()
+            if not summary:
+                return
+
+            with self._context_lock:
+                # Only fold if the history was not reset while we were summarizing
+                if generation == self._history_generation:
+                    del self.history[1:1 + len(to_fold)]
+                    self.summary = summary
+                    self._folded_tokens += sum(estimate_message_tokens(m) for m in to_fold)
+                    self.context_stats["summaries"] += 1
+        except Exception as e:
+            print(f"Summarizing history failed for {self.name}: {e}")
+        finally:
+            with self._context_lock:
+                self._summarizing = False
         
-    def generate_response(self, prompt: str, max_tokens: int = 250) -> str:
+    def generate_response(
+        self,
+        prompt: str,
+        max_tokens: int = 250,
+        stream: bool = False,
+        on_sentence: Optional[Callable[[str], None]] = None,
+        max_words: Optional[int] = None,
+    ) -> str:
         if CLIENT is None:
             return f"[{self.name}]: ERROR - LLM client is not initialized due to missing API key."
 
+        if stream:
+            # Consume the token stream; on_sentence still fires as each sentence completes
+            try:
+                for _ in self.stream_response(prompt, max_tokens, on_sentence, max_words):
+                    pass
+            except openai.APIError as e:
+                print(f"API CALL FAILED for {self.name}: {e}")
+                return f"[{self.name}]: API ERROR: {e}"
+            except Exception as e:
+                print(f"An unexpected error occurred for {self.name}: {e}")
+                return f"[{self.name}]: UNEXPECTED ERROR: {e}"
+
+            return f"{self.name}: {self.history[-1]['content']}"
+
         # 1. Add the new incoming prompt/context from the user or other agent to history
         # We model the previous agent's output as the "user" role to drive the conversation
         self.history.append({"role": "user", "content": prompt})
         
         try:
             # 2. Make the API call using the full history as context
-            response = CLIENT.chat.completions.create(
-                model=self.model,
-                messages=self.history,  # Passing the list of messages for history/context
-                max_tokens=max_tokens,
-                temperature=0.7
-            )
+            with tracing.span("llm.generate", model=self.model):
+                response = CLIENT.chat.completions.create(
+                    model=self.model,
+                    messages=self._context_messages(),  # Recent history (within the token budget) as context
+                    max_tokens=max_tokens,
+                    temperature=0.7
+                )
+            tracing.record_usage(response.usage, self.model)
             
             # 3: Safe Content Extraction and Tool Check ---
-            
-            message_content = response.choices[0].message.content
-            
-            # Check if content is None (often happens if a tool call is made or response is blocked)
-            if message_content is None:
-                # Check for tool calls (if model is designed to use them)
-                tool_calls = response.choices[0].message.tool_calls
-                if tool_calls:
-                    # If the model is using a tool, we report the action instead of crashing.
-                    text_response = f"DECISION: {self.name} is calling a tool. Output content is None."
-                else:
-                    # If content is None and no tool call, the response was likely empty or blocked.
-                    text_response = "The model returned an empty response. Response may be blocked."
-            else:
-                # Content exists, so we safely strip the whitespace
-                text_response = message_content.strip()
+            text_response = self._extract_text(response)
             
             # 4. Add the model's reply (as the 'assistant') back into the history for continuity
             self.history.append({"role": "assistant", "content": text_response})
+            self._record_prompt_size()
+            self._maybe_fold_history()
             
             # Return the agent's name and the text content for the UI
             return f"{self.name}: {text_response}"
@@ -91,5 +307,187 @@ class LLMAgent:
             print(f"An unexpected error occurred for {self.name}: {e}")
             return f"[{self.name}]: UNEXPECTED ERROR: {e}"
 
+    def _extract_text(self, response) -> str:
+        """Pulls the reply text out of a (non-streamed) chat completion."""
+        message_content = response.choices[0].message.content
+        
+        # Check if content is None (often happens if a tool call is made or response is blocked)
+        if message_content is None:
+            # Check for tool calls (if model is designed to use them)
+            tool_calls = response.choices[0].message.tool_calls
+            if tool_calls:
+                # If the model is using a tool, we report the action instead of crashing.
+                return f"DECISION: {self.name} is calling a tool. Output content is None."
+            # If content is None and no tool call, the response was likely empty or blocked.
+            return "The model returned an empty response. Response may be blocked."
+
+        # Content exists, so we safely strip the whitespace
+        return message_content.strip()
+
+    async def agenerate_response(self, prompt: str, max_tokens: int = 250) -> str:
+        """Async version of generate_response: same history handling, awaits the API call."""
+        if ASYNC_CLIENT is None:
+            return f"[{self.name}]: ERROR - LLM client is not initialized due to missing API key."
+
+        self.history.append({"role": "user", "content": prompt})
+
+        try:
+            with tracing.span("llm.generate", model=self.model):
+                response = await ASYNC_CLIENT.chat.completions.create(
+                    model=self.model,
+                    messages=self._context_messages(),
+                    max_tokens=max_tokens,
+                    temperature=0.7
+                )
+            tracing.record_usage(response.usage, self.model)
+            text_response = self._extract_text(response)
+            self.history.append({"role": "assistant", "content": text_response})
+            self._record_prompt_size()
+            self._maybe_fold_history()
+            return f"{self.name}: {text_response}"
+
+        except openai.APIError as e:
+            self.history.pop()
+            print(f"API CALL FAILED for {self.name}: {e}")
+            return f"[{self.name}]: API ERROR: {e}"
+        except Exception as e:
+            self.history.pop()
+            print(f"An unexpected error occurred for {self.name}: {e}")
+            return f"[{self.name}]: UNEXPECTED ERROR: {e}"
+
+    def draft_response(self, max_tokens: int = 250) -> Optional[str]:
+        """
+        A reply to the history as it stands (ending with the prompt), without recording it.
+        Panel mode drafts with several agents at once and keeps one (see accept_draft).
+        Returns None if the request fails.
+        """
+        if CLIENT is None:
+            return None
+        try:
+            with tracing.span("llm.draft", model=self.model):
+                response = CLIENT.chat.completions.create(
+                    model=self.model,
+                    messages=self._context_messages(),
+                    max_tokens=max_tokens,
+                    temperature=0.7
+                )
+            tracing.record_usage(response.usage, self.model)
+            return self._extract_text(response)
+        except Exception as e:
+            print(f"Draft failed for {self.name}: {e}")
+            return None
+
+    async def adraft_response(self, max_tokens: int = 250) -> Optional[str]:
+        """Async version of draft_response."""
+        if ASYNC_CLIENT is None:
+            return None
+        try:
+            with tracing.span("llm.draft", model=self.model):
+                response = await ASYNC_CLIENT.chat.completions.create(
+                    model=self.model,
+                    messages=self._context_messages(),
+                    max_tokens=max_tokens,
+                    temperature=0.7
+                )
+            tracing.record_usage(response.usage, self.model)
+            return self._extract_text(response)
+        except Exception as e:
+            print(f"Draft failed for {self.name}: {e}")
+            return None
+
+    def accept_draft(self, text: str) -> str:
+        """Records a draft as this agent's reply, like generate_response does for its own."""
+        self.history.append({"role": "assistant", "content": text})
+        self._record_prompt_size()
+        self._maybe_fold_history()
+        return f"{self.name}: {text}"
+
+    def stream_response(
+        self,
+        prompt: str,
+        max_tokens: int = 250,
+        on_sentence: Optional[Callable[[str], None]] = None,
+        max_words: Optional[int] = None,
+    ) -> Iterator[str]:
+        """
+        Streams the reply to prompt, yielding text deltas as they arrive.
+
+        on_sentence is called with each complete sentence as soon as it is available,
+        so TTS or the UI can start before the last token. Generation is stopped once
+        max_words words have been produced. The final text is added to history just
+        like generate_response does; on failure the prompt is removed and the error re-raised.
+        The prompt is also removed if the caller stops iterating early (e.g. the client went away).
+        """
+        if CLIENT is None:
+            raise RuntimeError("LLM client is not initialized due to missing API key.")
+
+        self.history.append({"role": "user", "content": prompt})
+
+        text = ""
+        sentence_start = 0
+        replied = False
+        try:
+            stream_start = time.perf_counter()
+            with tracing.span("llm.stream", model=self.model) as span:
+                stream = CLIENT.chat.completions.create(
+                    model=self.model,
+                    messages=self._context_messages(),
+                    max_tokens=max_tokens,
+                    temperature=0.7,
+                    stream=True,
+                )
+                try:
+                    for chunk in stream:
+                        if getattr(chunk, "usage", None) is not None:
+                            tracing.record_usage(chunk.usage, self.model)
+                        # Some chunks (e.g. the trailing usage chunk) carry no choices/content
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if not text:
+                            span.set("ttft_ms", round((time.perf_counter() - stream_start) * 1000, 1))
+
+                        # Stop at the word budget: only count words once the next one has started,
+                        # so the last kept word is known to be complete
+                        over_budget = False
+                        if max_words is not None:
+                            candidate = text + delta
+                            words = list(WORD.finditer(candidate))
+                            if len(words) > max_words:
+                                delta = candidate[len(text):words[max_words - 1].end()]
+                                over_budget = True
+
+                        text += delta
+                        if delta:
+                            yield delta
+
+                        # Fire the callback for every sentence completed by this delta
+                        if on_sentence is not None:
+                            for match in SENTENCE_END.finditer(text, sentence_start):
+                                on_sentence(text[sentence_start:match.end()].strip())
+                                sentence_start = match.end()
+
+                        if over_budget:
+                            break
+                finally:
+                    # Closing the response stops the server from generating the rest
+                    stream.close()
+
+            text_response = text.strip()
+            if on_sentence is not None and text[sentence_start:].strip():
+                on_sentence(text[sentence_start:].strip())
+            if not text_response:
+                text_response = "The model returned an empty response. Response may be blocked."
+
+            self.history.append({"role": "assistant", "content": text_response})
+            replied = True
+        finally:
+            # Failed, or abandoned by the caller (GeneratorExit is not an Exception)
+            if not replied:
+                self.history.pop()
+
+        self._record_prompt_size()
+        self._maybe_fold_history()
+
 # Note: The original test call logic is removed from this file, as it is 
 # now encapsulated in the LLMAgent class and will be driven by the AgentManager.
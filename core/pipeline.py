@@ -0,0 +1,287 @@
+import io
+import time
+import wave
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from core import tracing
+from core.agent_manager import AgentManager
+from core.audio_codecs import ENCODER_POOL, encode_audio, get_audio_format
+from core.audio_api import (
+    PCM_SAMPLE_RATE,
+    agenerate_dialogue_audio,
+    generate_dialogue_audio,
+    stream_dialogue_audio,
+)
+
+# Shared pool for the audio stages of every exchange. Each exchange submits at most
+# two syntheses, so this comfortably covers a handful of concurrent requests.
+# Work is submitted through tracing.bind so its spans land in the request's trace.
+EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="exchange")
+
+
+class ExchangeCancelled(Exception):
+    """Raised by run_exchange when its cancel event is set between stages."""
+
+
+def _timed(timings: Dict[str, float], stage: str, fn: Callable, *args, **kwargs) -> Any:
+    """Runs fn and records its wall time (in ms) under the given stage name."""
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def run_exchange(
+    manager: AgentManager,
+    prompt_text: str,
+    voice_a: str,
+    voice_b: str,
+    audio_speed_factor: float = 1.0,
+    audio_path_a: Optional[str] = None,
+    audio_path_b: Optional[str] = None,
+    cancelled: Optional[threading.Event] = None,
+    audio_format: str = "wav",
+) -> Dict[str, Any]:
+    """
+    Runs one exchange (agent A answers prompt_text, agent B answers agent A)
+    and synthesizes both replies.
+
+    The stages form a small dependency graph instead of a straight line:
+
+        llm_a ──> llm_b ──> tts_b
+          └────> tts_a
+
+    so agent A's audio is produced while agent B is still generating, and the
+    two syntheses can run at the same time. The audio is returned as bytes in
+    audio_format (WAV unless asked otherwise) and only written to
+    audio_path_a/audio_path_b when those are given.
+
+    Setting cancelled (used for speculative exchanges) stops the exchange before
+    its next LLM or TTS stage with ExchangeCancelled.
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    if cancelled is not None and cancelled.is_set():
+        raise ExchangeCancelled()
+
+    # 1. Agent A has to speak first, everything else depends on it
+    response1 = _timed(timings, "llm_a", manager.run_turn, prompt_text)
+
+    # 2. Start A's audio right away, it only needs response1
+    audio_a = EXECUTOR.submit(
+        tracing.bind(_timed), timings, "tts_a", generate_dialogue_audio,
+        response1, audio_path_a, voice_a,
+        audio_speed_factor=audio_speed_factor, audio_format=audio_format,
+    )
+
+    if cancelled is not None and cancelled.is_set():
+        audio_a.cancel()
+        raise ExchangeCancelled()
+
+    # 3. Agent B generates while A's audio is being synthesized
+    response2 = _timed(timings, "llm_b", manager.run_turn, response1)
+    if cancelled is not None and cancelled.is_set():
+        audio_a.cancel()
+        raise ExchangeCancelled()
+    audio_b = EXECUTOR.submit(
+        tracing.bind(_timed), timings, "tts_b", generate_dialogue_audio,
+        response2, audio_path_b, voice_b,
+        audio_speed_factor=audio_speed_factor, audio_format=audio_format,
+    )
+
+    # 4. Wait for both syntheses (re-raises any error from the worker threads)
+    a_audio = audio_a.result()
+    b_audio = audio_b.result()
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    # What the old sequential handler would have taken for the same stages
+    timings["serial_estimate"] = round(
+        timings["llm_a"] + timings["llm_b"] + timings["tts_a"] + timings["tts_b"], 1
+    )
+
+    return {
+        "response1": response1,
+        "response2": response2,
+        "a_audio": a_audio,
+        "b_audio": b_audio,
+        "audio_format": audio_format,
+        "timings": timings,
+    }
+
+
+async def _atimed(timings: Dict[str, float], stage: str, coro) -> Any:
+    """Awaits coro and records its wall time (in ms) under the given stage name."""
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+
+async def arun_exchange(
+    manager: AgentManager,
+    prompt_text: str,
+    voice_a: str,
+    voice_b: str,
+    audio_speed_factor: float = 1.0,
+    audio_format: str = "wav",
+) -> Dict[str, Any]:
+    """Async version of run_exchange: the same graph, with tasks instead of worker threads."""
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    response1 = await _atimed(timings, "llm_a", manager.arun_turn(prompt_text))
+    audio_a = asyncio.create_task(_atimed(
+        timings, "tts_a",
+        agenerate_dialogue_audio(
+            response1, None, voice_a, audio_speed_factor=audio_speed_factor, audio_format=audio_format
+        ),
+    ))
+
+    try:
+        response2 = await _atimed(timings, "llm_b", manager.arun_turn(response1))
+        audio_b = asyncio.create_task(_atimed(
+            timings, "tts_b",
+            agenerate_dialogue_audio(
+                response2, None, voice_b, audio_speed_factor=audio_speed_factor, audio_format=audio_format
+            ),
+        ))
+    except BaseException:
+        audio_a.cancel()
+        raise
+
+    a_audio, b_audio = await asyncio.gather(audio_a, audio_b)
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    timings["serial_estimate"] = round(
+        timings["llm_a"] + timings["llm_b"] + timings["tts_a"] + timings["tts_b"], 1
+    )
+
+    return {
+        "response1": response1,
+        "response2": response2,
+        "a_audio": a_audio,
+        "b_audio": b_audio,
+        "audio_format": audio_format,
+        "timings": timings,
+    }
+
+
+# Marks the end of a speaker's queue in stream_exchange
+_END_OF_CLIP = None
+
+
+def _produce_audio(out: "queue.Queue", text: str, voice: str, audio_speed_factor: float = 1.0) -> None:
+    """Pushes the PCM chunks of text into out, followed by _END_OF_CLIP (or the error)."""
+    try:
+        for chunk in stream_dialogue_audio(text, voice, audio_speed_factor=audio_speed_factor):
+            out.put(chunk)
+    except Exception as e:
+        out.put(e)
+    out.put(_END_OF_CLIP)
+
+
+def stream_exchange(
+    manager: AgentManager,
+    prompt_text: str,
+    voice_a: str,
+    voice_b: str,
+    audio_speed_factor: float = 1.0,
+) -> Iterator[Tuple[str, Optional[str], Any]]:
+    """
+    Streaming variant of run_exchange. Yields (kind, speaker, payload) events:
+
+        ("text", "a"/"b", {"text": ..., "sample_rate": ...})  a reply is ready
+        ("audio", "a"/"b", bytes)                             16-bit mono PCM chunk
+        ("end", "a"/"b", None)                                that speaker's clip is complete
+        ("error", "a"/"b", str)                               synthesis failed for that speaker
+        ("done", None, {"timings": ...})                      the exchange is finished
+
+    Agent A's audio is forwarded while it is being synthesized, so a client can start
+    playing before agent B's reply (or audio) exists. Agent B is generated and synthesized
+    in the background at the same time; its events are buffered until A's clip ends.
+    The speed factor is applied by time-stretching the PCM as it streams (the pitch is
+    unchanged); sample_rate is the rate to play the PCM at.
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    sample_rate = PCM_SAMPLE_RATE
+
+    response1 = _timed(timings, "llm_a", manager.run_turn, prompt_text)
+    yield "text", "a", {"text": response1, "sample_rate": sample_rate}
+
+    audio_a: "queue.Queue" = queue.Queue()
+    audio_b: "queue.Queue" = queue.Queue()
+    EXECUTOR.submit(tracing.bind(_produce_audio), audio_a, response1, voice_a, audio_speed_factor)
+
+    def run_agent_b():
+        try:
+            response2 = _timed(timings, "llm_b", manager.run_turn, response1)
+        except Exception as e:
+            audio_b.put(e)
+            audio_b.put(_END_OF_CLIP)
+            return
+        audio_b.put({"text": response2, "sample_rate": sample_rate})
+        _produce_audio(audio_b, response2, voice_b, audio_speed_factor)
+
+    EXECUTOR.submit(tracing.bind(run_agent_b))
+
+    for speaker, chunks in (("a", audio_a), ("b", audio_b)):
+        while True:
+            item = chunks.get()
+            if item is _END_OF_CLIP:
+                break
+            if isinstance(item, Exception):
+                yield "error", speaker, str(item)
+            elif isinstance(item, dict):
+                yield "text", speaker, item
+            else:
+                if f"first_audio_{speaker}" not in timings:
+                    timings[f"first_audio_{speaker}"] = round((time.perf_counter() - start) * 1000, 1)
+                yield "audio", speaker, item
+        yield "end", speaker, None
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    yield "done", None, {"timings": timings}
+
+
+def convert_exchange_audio(exchange: Dict[str, Any], audio_format: str) -> Dict[str, Any]:
+    """
+    Encodes both clips of a finished WAV exchange into audio_format (in parallel on the
+    encoder pool), e.g. a speculative exchange, which is kept as WAV.
+    """
+    if exchange["audio_format"] == audio_format:
+        return exchange
+    target = get_audio_format(audio_format)
+    a_audio = ENCODER_POOL.submit(encode_audio, exchange["a_audio"], target)
+    b_audio = ENCODER_POOL.submit(encode_audio, exchange["b_audio"], target)
+    return dict(
+        exchange, a_audio=a_audio.result(), b_audio=b_audio.result(), audio_format=audio_format
+    )
+
+
+def replay_exchange(
+    exchange: Dict[str, Any], chunk_size: int = 8192
+) -> Iterator[Tuple[str, Optional[str], Any]]:
+    """
+    Yields the events of stream_exchange for an exchange that run_exchange already
+    finished (a speculative one), so /api/stream can serve it without generating again.
+    The exchange must hold WAV audio.
+    """
+    for speaker, response in (("a", "response1"), ("b", "response2")):
+        with wave.open(io.BytesIO(exchange[f"{speaker}_audio"]), "rb") as wav:
+            sample_rate = wav.getframerate()
+            pcm = wav.readframes(wav.getnframes())
+
+        yield "text", speaker, {"text": exchange[response], "sample_rate": sample_rate}
+        for offset in range(0, len(pcm), chunk_size):
+            yield "audio", speaker, pcm[offset:offset + chunk_size]
+        yield "end", speaker, None
+
+    yield "done", None, {"timings": exchange["timings"]}
@@ -0,0 +1,407 @@
+"""
+Process-wide admission control for the Boson API: one token bucket per endpoint (llm, tts,
+asr) with a priority queue in front of it.
+
+Every openai client is built with http_client() from here, so each request waits for a
+token of its endpoint's bucket before it is sent. Waiting requests are served by priority,
+then in arrival order: interactive requests (the default) go ahead of batch ones, which
+run inside `with priority(BATCH):`. A request that would wait longer than its priority's
+MAX_WAIT_S is not queued at all; it gets an immediate 429 with Retry-After and
+x-should-retry: false, so openai raises RateLimitError to the caller instead of retrying
+blindly. An upstream 429 pauses the bucket for its Retry-After and the request is queued
+again at its priority (at most UPSTREAM_RETRIES times).
+
+Limits are "requests per second/burst", e.g. BOSON_RATE_LLM=5/10 (0 leaves an endpoint
+unlimited); set BOSON_RATE_LIMIT=0 to turn admission control off. Waits are recorded as
+ratelimit.<endpoint> spans, queue depths and free tokens are exported as gauges (see
+RateLimiter.gauges).
+"""
+import os
+import re
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+import contextvars
+import email.utils
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+import openai
+
+from core import cassette, tracing
+
+RATE_LIMIT_ENABLED = os.getenv("BOSON_RATE_LIMIT", "1") != "0"
+
+ENDPOINTS = ("llm", "tts", "asr")
+DEFAULT_LIMITS = {"llm": "5/10", "tts": "4/8", "asr": "2/4"}
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+# Longest a request may be expected to queue before it is turned away
+MAX_WAIT_S = {
+    INTERACTIVE: float(os.getenv("BOSON_RATE_MAX_WAIT_INTERACTIVE", "10")),
+    BATCH: float(os.getenv("BOSON_RATE_MAX_WAIT_BATCH", "300")),
+}
+# Upstream 429s absorbed by re-queueing before one is passed on to the caller
+UPSTREAM_RETRIES = 2
+# Pause after an upstream 429 without a usable Retry-After header
+DEFAULT_RETRY_AFTER_S = 1.0
+
+# Audio-endpoint chat completions are speech recognition or voice-cloned speech, by model
+ASR_MODEL_MARK = b"audio-understanding"
+# The model is a top-level key; an escaped quote can never start a key
+MODEL_PATTERN = re.compile(rb'(?<!\\)"model"\s*:\s*"([^"]*)"')
+
+_priority: "contextvars.ContextVar[str]" = contextvars.ContextVar("ratelimit_priority", default=INTERACTIVE)
+
+
+class Backpressure(Exception):
+    """The request was not admitted: the queue for its endpoint is too long."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"{endpoint} requests are queued for about {retry_after:.1f} s, try again later")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class priority:
+    """Requests made inside `with priority(BATCH):` (and in work bound with tracing.bind) queue as batch."""
+
+    def __init__(self, level: str):
+        if level not in PRIORITIES:
+            raise ValueError(f"unknown priority '{level}', expected one of: {', '.join(PRIORITIES)}")
+        self.level = level
+        self._token = None
+
+    def __enter__(self) -> "priority":
+        self._token = _priority.set(self.level)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _priority.reset(self._token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def _parse_limit(endpoint: str) -> Tuple[float, float]:
+    text = os.getenv(f"BOSON_RATE_{endpoint.upper()}", DEFAULT_LIMITS[endpoint])
+    rate, _, burst = text.partition("/")
+    return float(rate), float(burst or rate)
+
+
+class _Waiter:
+    __slots__ = ("rank", "seq", "wake")
+
+    def __init__(self, rank: int, seq: int, wake: Callable[[], None]):
+        self.rank, self.seq, self.wake = rank, seq, wake
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class TokenBucket:
+    """
+    `rate` requests per second with bursts of up to `burst`. Only the head of the priority
+    queue may take a token; it sleeps until one has accrued, the others sleep until they
+    become the head. Sync and async waiters share the queue (wake-ups are thread-safe).
+    """
+
+    def __init__(self, endpoint: str, rate: float, burst: float):
+        self.endpoint = endpoint
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def estimate_wait(self, level: str) -> float:
+        """Seconds a new request of this priority would wait, from the queue ahead of it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._estimate(PRIORITIES[level])
+
+    def _estimate(self, rank: int) -> float:
+        ahead = sum(1 for waiter in self._queue if waiter.rank <= rank)
+        return max(0.0, (ahead + 1 - self._tokens) / self.rate)
+
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def penalize(self, seconds: float) -> None:
+        """Grants nothing for the next `seconds` (the upstream asked us to back off)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def _join(self, level: str, wake: Callable[[], None]) -> Tuple[Optional[_Waiter], float]:
+        """Takes a token right away (None) or queues a waiter; raises Backpressure if too long a wait."""
+        rank = PRIORITIES[level]
+        with self._lock:
+            self._refill(time.monotonic())
+            if not self._queue and self._tokens >= 1:
+                self._tokens -= 1
+                return None, 0.0
+            expected = self._estimate(rank)
+            if expected > MAX_WAIT_S[level]:
+                raise Backpressure(self.endpoint, expected)
+            waiter = _Waiter(rank, next(self._seq), wake)
+            heapq.heappush(self._queue, waiter)
+            return waiter, time.monotonic() + MAX_WAIT_S[level]
+
+    def _poll(self, waiter: _Waiter) -> Optional[float]:
+        """0 once the waiter has its token; else how long the head should sleep (None if not the head)."""
+        with self._lock:
+            if self._queue[0] is not waiter:
+                return None
+            self._refill(time.monotonic())
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+            heapq.heappop(self._queue)
+            if self._queue:
+                self._queue[0].wake()
+            return 0.0
+
+    def _leave(self, waiter: _Waiter) -> None:
+        with self._lock:
+            was_head = self._queue[0] is waiter
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+            if was_head and self._queue:
+                self._queue[0].wake()
+
+    def _timed_out(self, waiter: _Waiter) -> Backpressure:
+        self._leave(waiter)
+        with self._lock:
+            return Backpressure(self.endpoint, self._estimate(waiter.rank))
+
+    def acquire(self, level: str) -> None:
+        event = threading.Event()
+        waiter, deadline = self._join(level, event.set)
+        if waiter is None:
+            return
+        while True:
+            delay = self._poll(waiter)
+            if delay == 0:
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._timed_out(waiter)
+            event.wait(remaining if delay is None else min(delay, remaining))
+            event.clear()
+
+    async def aacquire(self, level: str) -> None:
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter, deadline = self._join(level, lambda: loop.call_soon_threadsafe(event.set))
+        if waiter is None:
+            return
+        try:
+            while True:
+                delay = self._poll(waiter)
+                if delay == 0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(waiter)
+                try:
+                    await asyncio.wait_for(event.wait(), remaining if delay is None else min(delay, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        except asyncio.CancelledError:
+            self._leave(waiter)
+            raise
+
+
+class RateLimiter:
+    """The buckets of all endpoints, shared by every client in the process."""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]]):
+        self.buckets = {
+            endpoint: TokenBucket(endpoint, rate, burst)
+            for endpoint, (rate, burst) in limits.items()
+            if rate > 0
+        }
+
+    def retry_after(self, endpoints: Iterable[str], level: Optional[str] = None) -> Optional[float]:
+        """
+        How long a caller should back off before starting work that needs these endpoints,
+        or None if they would all admit it within its priority's MAX_WAIT_S.
+        """
+        level = level or current_priority()
+        waits = [self.buckets[e].estimate_wait(level) for e in endpoints if e in self.buckets]
+        worst = max(waits, default=0.0)
+        return worst if worst > MAX_WAIT_S[level] else None
+
+    def gauges(self) -> Dict[str, float]:
+        gauges = {}
+        for endpoint, bucket in self.buckets.items():
+            gauges[f"ratelimit_queue_depth_{endpoint}"] = bucket.queued()
+            gauges[f"ratelimit_tokens_{endpoint}"] = round(bucket.tokens(), 2)
+        return gauges
+
+
+LIMITER = RateLimiter({endpoint: _parse_limit(endpoint) for endpoint in ENDPOINTS}) if RATE_LIMIT_ENABLED else None
+
+
+def classify(request: httpx.Request, endpoint: str) -> str:
+    """The bucket of a request: the client's endpoint, or for the audio client tts vs. asr."""
+    if endpoint != "audio":
+        return endpoint
+    if request.url.path.endswith("/chat/completions"):
+        match = MODEL_PATTERN.search(request.content)
+        if match and ASR_MODEL_MARK in match.group(1):
+            return "asr"
+    return "tts"
+
+
+def _retry_after(response: httpx.Response) -> float:
+    value = response.headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return DEFAULT_RETRY_AFTER_S
+
+
+def _rejected(request: httpx.Request, error: Backpressure) -> httpx.Response:
+    """A local 429 the openai client raises as RateLimitError without retrying."""
+    return httpx.Response(
+        429,
+        headers={"retry-after": str(math.ceil(error.retry_after)), "x-should-retry": "false"},
+        json={"error": {"message": str(error), "type": "backpressure", "code": "rate_limit_queue_full"}},
+        request=request,
+    )
+
+
+class _RateLimitBase:
+    def __init__(self, limiter: RateLimiter, endpoint: str):
+        self.limiter = limiter
+        self.endpoint = endpoint
+
+    def _admitted(self, endpoint: str, level: str) -> None:
+        tracing.METRICS.inc("ratelimit_admitted_total", endpoint=endpoint, priority=level)
+
+    def _reject(self, request: httpx.Request, endpoint: str, level: str, error: Backpressure) -> httpx.Response:
+        print(f"Rate limit: rejected {level} {endpoint} request, retry after {error.retry_after:.1f} s")
+        tracing.METRICS.inc("ratelimit_rejected_total", endpoint=endpoint, priority=level)
+        return _rejected(request, error)
+
+    def _upstream_limited(self, response: httpx.Response, endpoint: str, bucket: TokenBucket) -> None:
+        tracing.METRICS.inc("ratelimit_upstream_429_total", endpoint=endpoint)
+        bucket.penalize(_retry_after(response))
+
+
+class RateLimitTransport(_RateLimitBase, httpx.BaseTransport):
+    def __init__(self, limiter: RateLimiter, endpoint: str, inner: Optional[httpx.BaseTransport] = None):
+        super().__init__(limiter, endpoint)
+        self.inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        endpoint, level = classify(request, self.endpoint), current_priority()
+        bucket = self.limiter.buckets.get(endpoint)
+        if bucket is None:
+            return self.inner.handle_request(request)
+        for attempt in range(UPSTREAM_RETRIES + 1):
+            try:
+                with tracing.span(f"ratelimit.{endpoint}", priority=level, attempt=attempt):
+                    bucket.acquire(level)
+            except Backpressure as e:
+                return self._reject(request, endpoint, level, e)
+            self._admitted(endpoint, level)
+
+            response = self.inner.handle_request(request)
+            if response.status_code != 429:
+                return response
+            self._upstream_limited(response, endpoint, bucket)
+            if attempt == UPSTREAM_RETRIES:
+                break
+            response.close()
+
+        # Already retried here; the caller gets the 429 instead of another blind retry
+        response.headers["x-should-retry"] = "false"
+        return response
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncRateLimitTransport(_RateLimitBase, httpx.AsyncBaseTransport):
+    def __init__(self, limiter: RateLimiter, endpoint: str, inner: Optional[httpx.AsyncBaseTransport] = None):
+        super().__init__(limiter, endpoint)
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        endpoint, level = classify(request, self.endpoint), current_priority()
+        bucket = self.limiter.buckets.get(endpoint)
+        if bucket is None:
+            return await self.inner.handle_async_request(request)
+        for attempt in range(UPSTREAM_RETRIES + 1):
+            try:
+                with tracing.span(f"ratelimit.{endpoint}", priority=level, attempt=attempt):
+                    await bucket.aacquire(level)
+            except Backpressure as e:
+                return self._reject(request, endpoint, level, e)
+            self._admitted(endpoint, level)
+
+            response = await self.inner.handle_async_request(request)
+            if response.status_code != 429:
+                return response
+            self._upstream_limited(response, endpoint, bucket)
+            if attempt == UPSTREAM_RETRIES:
+                break
+            await response.aclose()
+
+        response.headers["x-should-retry"] = "false"
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+def http_client(endpoint: str) -> Optional[httpx.Client]:
+    """
+    The httpx client for an openai.Client of this endpoint ("llm", or "audio" for the client
+    serving both tts and asr). Rate limiting sits below a cassette, so replays are not throttled.
+    """
+    if LIMITER is None:
+        return cassette.http_client()
+    transport = RateLimitTransport(LIMITER, endpoint)
+    if cassette.STORE is not None:
+        return cassette.http_client(transport)
+    return openai.DefaultHttpxClient(transport=transport)
+
+
+def async_http_client(endpoint: str) -> Optional[httpx.AsyncClient]:
+    """Async twin of http_client, for openai.AsyncClient."""
+    if LIMITER is None:
+        return cassette.async_http_client()
+    transport = AsyncRateLimitTransport(LIMITER, endpoint)
+    if cassette.STORE is not None:
+        return cassette.async_http_client(transport)
+    return openai.DefaultAsyncHttpxClient(transport=transport)
@@ -0,0 +1,175 @@
+import os
+import threading
+from typing import Callable, List, Optional
+
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+
+# Seconds of audio the ring buffer holds between the audio callback and the writer thread.
+# The writer drains it every few milliseconds, so this only has to cover disk hiccups.
+RECORDER_BUFFER_SECONDS = 5
+
+
+class RingBuffer:
+    """
+    Fixed-size ring of audio frames shared by one producer and one consumer thread.
+
+    The storage is allocated once; write() copies a block into it with at most two slice
+    assignments and never allocates, so it is safe to call from an audio callback. Each
+    side only advances its own counter, so no lock is needed. A block that does not fit is
+    dropped (and counted) rather than blocking the producer.
+    """
+
+    def __init__(self, capacity: int, channels: int = 1, dtype=np.float32):
+        self.capacity = capacity
+        self._data = np.zeros((capacity, channels), dtype=dtype)
+        self._written = 0  # frames ever written, advanced by the producer only
+        self._read = 0  # frames ever consumed, advanced by the consumer only
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._written - self._read
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def write(self, block: np.ndarray) -> bool:
+        frames = len(block)
+        if frames > self.capacity - len(self):
+            self.dropped += frames
+            return False
+
+        start = self._written % self.capacity
+        first = min(frames, self.capacity - start)
+        self._data[start:start + first] = block[:first]
+        if first < frames:
+            self._data[:frames - first] = block[first:]
+        self._written += frames
+        return True
+
+    def readable(self) -> List[np.ndarray]:
+        """Views of the unread frames (two when they wrap around), valid until consume()."""
+        count = len(self)
+        start = self._read % self.capacity
+        first = min(count, self.capacity - start)
+        views = [self._data[start:start + first]]
+        if first < count:
+            views.append(self._data[:count - first])
+        return views
+
+    def consume(self, frames: int) -> None:
+        self._read += frames
+
+
+class VoiceRecorder:
+    """
+    Records the microphone straight to a sound file, in constant memory.
+
+    The audio callback only copies each block into a preallocated RingBuffer; a writer
+    thread drains the ring into the file while recording goes on, so memory stays at the
+    size of the ring however long the recording is, and stopping only has to flush the
+    last few milliseconds. on_block, if given, is called on the writer thread with every
+    block as it is written (a (frames, 1) float32 view: copy it to keep it), for level
+    meters, streaming transcription and the like.
+    """
+
+    def __init__(
+        self,
+        sample_rate=44100,
+        on_block: Optional[Callable[[np.ndarray], None]] = None,
+        buffer_seconds: float = RECORDER_BUFFER_SECONDS,
+    ):
+        self.sample_rate = sample_rate
+        self.on_block = on_block
+        self.is_recording = False
+        self.stream = None
+        self.frames_recorded = 0
+        self._ring = RingBuffer(int(sample_rate * buffer_seconds))
+        self._data_ready = threading.Event()
+        self._stopping = threading.Event()
+        self._writer = None
+        self._sink = None
+        self._path = None
+
+    @property
+    def dropped_frames(self) -> int:
+        return self._ring.dropped
+
+    def start_recording(self, path="audio_references/recording.wav"):
+        if self.is_recording:
+            print("Already recording!")
+            return
+
+        self._path = path
+        self._sink = sf.SoundFile(path, "w", samplerate=self.sample_rate, channels=1)
+        self._ring = RingBuffer(self._ring.capacity)
+        self.frames_recorded = 0
+        self._stopping.clear()
+        self._writer = threading.Thread(target=self._drain, name="recorder-writer", daemon=True)
+        self._writer.start()
+        self.is_recording = True
+
+        def callback(indata, frames, time, status):
+            if self.is_recording:
+                self._ring.write(indata)
+                self._data_ready.set()
+
+        self.stream = sd.InputStream(
+            samplerate=self.sample_rate, channels=1, callback=callback, dtype="float32"
+        )
+        self.stream.start()
+        print("Recording started...")
+
+    def stop_recording(self, path=None):
+        """Stops and finalizes the file; a path differing from start_recording's moves it there."""
+        if not self.is_recording:
+            print("Not currently recording")
+            return
+
+        # Stopping the stream waits for the callbacks in flight, so the ring is complete after it
+        if self.stream:
+            self.stream.stop()
+            self.stream.close()
+        self.is_recording = False
+
+        self._stopping.set()
+        self._data_ready.set()
+        self._writer.join()
+        self._sink.close()
+
+        if self.dropped_frames:
+            print(f"Recorder fell behind, dropped {self.dropped_frames} frames")
+
+        if not self.frames_recorded:
+            os.remove(self._path)
+            print("No audio data")
+            return None
+
+        if path and path != self._path:
+            os.replace(self._path, path)
+            self._path = path
+        return self._path
+
+    def _drain(self):
+        while True:
+            self._data_ready.wait(timeout=0.1)
+            self._data_ready.clear()
+            stopping = self._stopping.is_set()
+            self._write_pending()
+            if stopping:
+                return
+
+    def _write_pending(self):
+        for block in self._ring.readable():
+            if not len(block):
+                continue
+            self._sink.write(block)
+            if self.on_block is not None:
+                try:
+                    self.on_block(block)
+                except Exception as e:
+                    print(f"Recorder block callback failed: {e}")
+            self._ring.consume(len(block))
+            self.frames_recorded += len(block)
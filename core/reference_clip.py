@@ -0,0 +1,127 @@
+"""
+Extracts a voice-cloning reference clip from a long recording.
+
+The source is scanned block by block with the voice-activity detector in core/vad.py (so
+multi-hour recordings are never loaded whole), the window of the target length with the
+most speech is picked, its long pauses are shortened, and the result is peak-normalized
+and written as 16-bit WAV. A short reference without silence keeps every clone_audio
+request small.
+
+    python -m core.reference_clip audio_references/davis_reference_full.wav \
+        audio_references/davis_trimmed.wav --seconds 20 --transcribe
+"""
+import os
+import sys
+import json
+import argparse
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from core.vad import StreamingVAD, densest_window
+
+REFERENCE_SECONDS = 20.0
+# Pauses inside the clip are shortened to this; a little silence keeps the phrasing natural
+MAX_PAUSE_MS = 200
+PEAK_DBFS = -1.0
+READ_BLOCK_SECONDS = 10
+
+
+def _mono(block: np.ndarray) -> np.ndarray:
+    return block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+
+
+def scan_speech(path: str) -> Tuple[np.ndarray, int, int]:
+    """Speech mask of every VAD frame of a file, its frame length and the sample rate."""
+    sample_rate = sf.info(path).samplerate
+    vad = StreamingVAD(sample_rate)
+    for block in sf.blocks(
+        path, blocksize=READ_BLOCK_SECONDS * sample_rate, dtype="float32", always_2d=True
+    ):
+        vad.process(_mono(block))
+    return vad.speech_mask(), vad.frame, sample_rate
+
+
+def shorten_pauses(audio: np.ndarray, mask: np.ndarray, frame: int, max_pause: int) -> np.ndarray:
+    """
+    Cuts every run of non-speech frames longer than max_pause frames down to max_pause,
+    keeping half of it on each side so speech onsets and decays are not clipped.
+    """
+    keep = np.ones(len(mask), dtype=bool)
+    edges = np.diff(np.concatenate(([0], (~mask).astype(np.int8), [0])))
+    for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        if end - start > max_pause:
+            keep[start + max_pause // 2:end - (max_pause - max_pause // 2)] = False
+    frames = audio[:len(mask) * frame].reshape(len(mask), frame)
+    return frames[keep].ravel()
+
+
+def extract_reference_clip(
+    source: str,
+    output: str,
+    seconds: float = REFERENCE_SECONDS,
+    max_pause_ms: int = MAX_PAUSE_MS,
+    peak_dbfs: float = PEAK_DBFS,
+) -> Dict[str, Any]:
+    """Writes the densest seconds of speech of source to output and returns what was picked."""
+    mask, frame, sample_rate = scan_speech(source)
+    if not mask.any():
+        raise ValueError(f"no speech found in {source}")
+
+    start, end = densest_window(mask, max(1, int(seconds * sample_rate) // frame))
+    # Trim the window to its first and last speech frame
+    speech = np.flatnonzero(mask[start:end])
+    start, end = start + int(speech[0]), start + int(speech[-1]) + 1
+
+    with sf.SoundFile(source) as f:
+        f.seek(start * frame)
+        audio = _mono(f.read((end - start) * frame, dtype="float32", always_2d=True))
+
+    max_pause = max(1, max_pause_ms * sample_rate // 1000 // frame)
+    clip = shorten_pauses(audio, mask[start:end], frame, max_pause)
+    peak = float(np.abs(clip).max())
+    if peak > 0:
+        clip = clip * (10 ** (peak_dbfs / 20) / peak)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    sf.write(output, clip, sample_rate, subtype="PCM_16")
+    return {
+        "source": source,
+        "output": output,
+        "source_s": round(len(mask) * frame / sample_rate, 2),
+        "start_s": round(start * frame / sample_rate, 2),
+        "end_s": round(end * frame / sample_rate, 2),
+        "speech_ratio": round(float(mask[start:end].mean()), 3),
+        "output_s": round(len(clip) / sample_rate, 2),
+        "bytes": os.path.getsize(output),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Extract a voice-cloning reference clip.")
+    parser.add_argument("source", help="recording to take the reference from (any length)")
+    parser.add_argument("output", help="WAV file to write")
+    parser.add_argument("--seconds", type=float, default=REFERENCE_SECONDS, help="target length")
+    parser.add_argument("--max-pause-ms", type=int, default=MAX_PAUSE_MS)
+    parser.add_argument(
+        "--transcribe", action="store_true", help="also print the clip's transcript (for the voice registry)"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        report = extract_reference_clip(args.source, args.output, args.seconds, args.max_pause_ms)
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        return 1
+    print(json.dumps(report, indent=2))
+
+    if args.transcribe:
+        from core.audio_api import transcribe_audio
+
+        print(transcribe_audio(args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
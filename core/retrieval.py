@@ -0,0 +1,274 @@
+"""
+Context documents for the debate: parsing, chunking and a local BM25 index.
+
+A .txt, .docx or .pdf file is read incrementally, cut into overlapping passages of about
+CHUNK_WORDS words and indexed once; the index is saved under CONTEXT_INDEX_DIR keyed by
+the hash of the file's content, so the same document is never parsed twice. Each turn
+then only gets the few passages that match it (see AgentManager.set_context_index).
+
+    python -m core.retrieval report.pdf "effect of automation on wages"
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import hashlib
+import zipfile
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF context files are optional
+    PdfReader = None
+
+ALLOWED_FILE_TYPES = [".docx", ".pdf", ".txt"]
+
+CONTEXT_INDEX_DIR = os.getenv("CONTEXT_INDEX_DIR", "context_index")
+# Indexes kept loaded in memory; older ones are reloaded from CONTEXT_INDEX_DIR when needed
+CONTEXT_INDEX_MEMORY_SLOTS = int(os.getenv("CONTEXT_INDEX_MEMORY_SLOTS", "16"))
+CHUNK_WORDS = 120
+CHUNK_OVERLAP_WORDS = 30
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Part of the cache key: bump it when parsing, chunking or scoring changes
+INDEX_VERSION = "bm25-1"
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i if in into is it its me my "
+    "no not of on or our she so that the their them there they this to was we were what when "
+    "which who will with you your".split()
+)
+WORDPROCESSING_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class Passage(NamedTuple):
+    text: str
+    page: int  # 1-based page of a PDF, 0 for formats without pages
+    score: float = 0.0
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def _iter_txt(path: str) -> Iterator[Tuple[int, str]]:
+    paragraph: List[str] = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.strip():
+                paragraph.append(line.strip())
+            elif paragraph:
+                yield 0, " ".join(paragraph)
+                paragraph = []
+    if paragraph:
+        yield 0, " ".join(paragraph)
+
+
+def _iter_docx(path: str) -> Iterator[Tuple[int, str]]:
+    # A .docx is a zip; its body is streamed paragraph by paragraph, nothing else is needed
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document:
+        for _, element in ET.iterparse(document, events=("end",)):
+            if element.tag == WORDPROCESSING_NS + "p":
+                text = "".join(t.text or "" for t in element.iter(WORDPROCESSING_NS + "t"))
+                if text.strip():
+                    yield 0, text
+                element.clear()
+
+
+def _iter_pdf(path: str) -> Iterator[Tuple[int, str]]:
+    if PdfReader is None:
+        raise ValueError("PDF context files need pypdf (pip install pypdf)")
+    for number, page in enumerate(PdfReader(path).pages, start=1):
+        text = page.extract_text() or ""
+        if text.strip():
+            yield number, text
+
+
+def iter_document(path: str) -> Iterator[Tuple[int, str]]:
+    """Yields (page, text) pieces of a context file in reading order, without loading it whole."""
+    extension = os.path.splitext(path)[1].lower()
+    readers = {".txt": _iter_txt, ".docx": _iter_docx, ".pdf": _iter_pdf}
+    if extension not in readers:
+        raise ValueError(
+            f"unsupported context file type '{extension}', expected one of: {', '.join(ALLOWED_FILE_TYPES)}"
+        )
+    return readers[extension](path)
+
+
+def chunk_document(
+    pieces: Iterator[Tuple[int, str]],
+    words: int = CHUNK_WORDS,
+    overlap: int = CHUNK_OVERLAP_WORDS,
+) -> Iterator[Passage]:
+    """Cuts a stream of (page, text) into passages of `words` words, overlapping by `overlap`."""
+    buffer: List[Tuple[int, str]] = []  # (page, word)
+    emitted = False
+    for page, text in pieces:
+        buffer.extend((page, word) for word in text.split())
+        while len(buffer) >= words:
+            yield Passage(" ".join(w for _, w in buffer[:words]), buffer[0][0])
+            buffer = buffer[words - overlap:]
+            emitted = True
+    # The rest, unless it is only the overlap already sent with the last passage
+    if buffer and (not emitted or len(buffer) > overlap):
+        yield Passage(" ".join(w for _, w in buffer), buffer[0][0])
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256(INDEX_VERSION.encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ContextIndex:
+    """
+    BM25 over the passages of one document, stored as a term -> postings (CSR) layout:
+    the passages containing term t are docs[ptr[t]:ptr[t + 1]], with their precomputed
+    BM25 weights in weights[ptr[t]:ptr[t + 1]]. A query adds a few slices into a score
+    vector and takes the top k, so retrieval costs well under a millisecond.
+    """
+
+    def __init__(self, passages: List[Passage], vocabulary: Dict[str, int], ptr, docs, weights):
+        self.passages = passages
+        self.vocabulary = vocabulary
+        self.ptr = ptr
+        self.docs = docs
+        self.weights = weights
+
+    @classmethod
+    def build(cls, passages: List[Passage]) -> "ContextIndex":
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        for index, passage in enumerate(passages):
+            for token in tokenize(passage.text):
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                doc_ids.append(index)
+
+        n_docs, n_terms = len(passages), len(vocabulary)
+        terms = np.asarray(term_ids, dtype=np.int64)
+        docs = np.asarray(doc_ids, dtype=np.int64)
+        doc_len = np.bincount(docs, minlength=n_docs).astype(np.float32)
+
+        # One posting per (term, passage), sorted by term, with its term frequency
+        pairs, tf = np.unique(terms * max(n_docs, 1) + docs, return_counts=True)
+        post_terms, post_docs = pairs // max(n_docs, 1), pairs % max(n_docs, 1)
+        df = np.bincount(post_terms, minlength=n_terms)
+        ptr = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / max(float(doc_len.mean()), 1.0))
+        weights = idf[post_terms] * tf * (BM25_K1 + 1) / (tf + norm[post_docs])
+        return cls(passages, vocabulary, ptr, post_docs.astype(np.int32), weights.astype(np.float32))
+
+    def search(self, query: str, k: int = 3) -> List[Passage]:
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term = self.vocabulary.get(token)
+            if term is not None:
+                start, end = self.ptr[term], self.ptr[term + 1]
+                scores[self.docs[start:end]] += self.weights[start:end]
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.passages[i]._replace(score=round(float(scores[i]), 3)) for i in top]
+
+    def save(self, path: str) -> None:
+        """
+        Writes path.json and path.npz. Each is written to a temporary file and renamed into
+        place, the .npz last, so a reader never sees a half-written or half-saved index.
+        """
+        suffix = f".{uuid.uuid4().hex}.tmp"
+        with open(path + ".json" + suffix, "w", encoding="utf-8") as f:
+            json.dump(
+                {"passages": [[p.text, p.page] for p in self.passages], "vocabulary": self.vocabulary},
+                f,
+            )
+        with open(path + ".npz" + suffix, "wb") as f:
+            np.savez(f, ptr=self.ptr, docs=self.docs, weights=self.weights)
+        os.replace(path + ".json" + suffix, path + ".json")
+        os.replace(path + ".npz" + suffix, path + ".npz")
+
+    @classmethod
+    def load(cls, path: str) -> "ContextIndex":
+        arrays = np.load(path + ".npz")
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            data = json.load(f)
+        passages = [Passage(text, page) for text, page in data["passages"]]
+        return cls(passages, data["vocabulary"], arrays["ptr"], arrays["docs"], arrays["weights"])
+
+
+# Indexes already loaded in this process, by content hash (least recently used first)
+_LOADED: "OrderedDict[str, ContextIndex]" = OrderedDict()
+_LOADED_LOCK = threading.Lock()
+
+
+def load_context_index(path: str, cache_dir: str = CONTEXT_INDEX_DIR) -> ContextIndex:
+    """
+    The index of a context file: from memory, from the on-disk cache, or built (and cached)
+    if this content has never been seen. Raises ValueError for an unreadable file type.
+    """
+    digest = file_digest(path)
+    with _LOADED_LOCK:
+        if digest in _LOADED:
+            _LOADED.move_to_end(digest)
+            return _LOADED[digest]
+
+    cached = os.path.join(cache_dir, digest) if cache_dir else None
+    index = None
+    if cached and os.path.exists(cached + ".npz") and os.path.exists(cached + ".json"):
+        try:
+            index = ContextIndex.load(cached)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"Context index cache {cached} is unreadable, rebuilding it: {e}")
+    if index is None:
+        start = time.perf_counter()
+        passages = list(chunk_document(iter_document(path)))
+        if not passages:
+            raise ValueError(f"no text found in {os.path.basename(path)}")
+        index = ContextIndex.build(passages)
+        print(
+            f"Indexed {os.path.basename(path)}: {len(index.passages)} passages in "
+            f"{time.perf_counter() - start:.2f} s"
+        )
+        if cached:
+            os.makedirs(cache_dir, exist_ok=True)
+            index.save(cached)
+
+    with _LOADED_LOCK:
+        index = _LOADED.setdefault(digest, index)
+        _LOADED.move_to_end(digest)
+        while len(_LOADED) > CONTEXT_INDEX_MEMORY_SLOTS:
+            _LOADED.popitem(last=False)
+        return index
+
+
+def format_passages(passages: List[Passage]) -> str:
+    """Passages as a numbered block for a prompt."""
+    lines = []
+    for number, passage in enumerate(passages, start=1):
+        where = f" (p. {passage.page})" if passage.page else ""
+        lines.append(f"[{number}]{where} {passage.text}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    index = load_context_index(sys.argv[1])
+    start = time.perf_counter()
+    results = index.search(" ".join(sys.argv[2:]))
+    print(f"Search took {(time.perf_counter() - start) * 1000:.2f} ms")
+    print(format_passages(results))
@@ -0,0 +1,122 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Optional
+
+from core import llm_api, tracing
+from core.retrieval import tokenize
+from core.transcript import MODERATOR
+
+
+class TurnScheduler:
+    """
+    Decides who speaks next in an AgentManager debate or panel.
+
+    Without fan_out, next_speaker names the agent that takes the following turn. With
+    fan_out, every panelist except the last speaker drafts a reply at the same time and
+    pick_draft chooses the one that is spoken, so a round costs about one LLM call
+    whatever the size of the panel.
+    """
+
+    fan_out = False
+
+    def next_speaker(self, manager, last_speaker: int) -> int:
+        return (last_speaker + 1) % len(manager.agents)
+
+    def pick_draft(self, manager, drafts: Dict[int, str]) -> int:
+        return min(drafts)
+
+
+class RoundRobinScheduler(TurnScheduler):
+    """Agents speak in order (strict alternation for two)."""
+
+
+class ModeratorScheduler(TurnScheduler):
+    """
+    A moderator model names the next speaker from the personas and the recent discussion.
+    Costs one short extra call per turn; falls back to round-robin if the answer is unusable.
+    """
+
+    RECENT_LINES = 6
+
+    def next_speaker(self, manager, last_speaker: int) -> int:
+        fallback = super().next_speaker(manager, last_speaker)
+        if llm_api.CLIENT is None:
+            return fallback
+
+        panel = "\n".join(
+            f"{index + 1}. {agent.persona}" for index, agent in enumerate(manager.agents)
+        )
+        recent = "\n".join(
+            f"{'Moderator' if r.speaker == MODERATOR else r.speaker + 1}: {r.text}"
+            for r in list(manager.transcript)[-self.RECENT_LINES:]
+        )
+        prompt = (
+            f"Panelists:\n{panel}\n\nRecent discussion (by panelist number):\n{recent}\n\n"
+            f"Panelist {last_speaker + 1} just spoke. Which other panelist should speak next "
+            "to move the discussion forward? Answer with the number only."
+        )
+        try:
+            with tracing.span("llm.moderate", model=manager.agents[0].model):
+                response = llm_api.CLIENT.chat.completions.create(
+                    model=manager.agents[0].model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=5,
+                    temperature=0,
+                )
+            tracing.record_usage(response.usage, manager.agents[0].model)
+            match = re.search(r"\d+", response.choices[0].message.content or "")
+        except Exception as e:
+            print(f"Moderator call failed, using round-robin: {e}")
+            return fallback
+
+        choice = int(match.group()) - 1 if match else -1
+        if not 0 <= choice < len(manager.agents) or choice == last_speaker:
+            return fallback
+        return choice
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b[token] for token, count in a.items() if token in b)
+    if not dot:
+        return 0.0
+    return dot / math.sqrt(sum(c * c for c in a.values()) * sum(c * c for c in b.values()))
+
+
+class MostRelevantScheduler(TurnScheduler):
+    """
+    Fan-out: the draft that best answers the line being replied to (and stays on the topic)
+    is spoken, by term-vector cosine similarity. Ties go to whoever spoke least recently.
+    """
+
+    fan_out = True
+
+    def pick_draft(self, manager, drafts: Dict[int, str]) -> int:
+        first, last = manager.transcript[0], manager.transcript.last()
+        query = Counter(tokenize(f"{first.text} {last.text}"))
+
+        last_spoke: Dict[int, int] = {}
+        for position, record in enumerate(manager.transcript):
+            last_spoke[record.speaker] = position
+
+        def rank(index: int):
+            return (_cosine(Counter(tokenize(drafts[index])), query), -last_spoke.get(index, -1))
+
+        return max(drafts, key=rank)
+
+
+SCHEDULERS = {
+    "round_robin": RoundRobinScheduler,
+    "moderator": ModeratorScheduler,
+    "most_relevant": MostRelevantScheduler,
+}
+
+
+def get_scheduler(name: Optional[str]) -> TurnScheduler:
+    """A scheduler by name (round-robin when None); raises ValueError for an unknown name."""
+    try:
+        return SCHEDULERS[name or "round_robin"]()
+    except KeyError:
+        raise ValueError(
+            f"unknown turn scheduler '{name}', expected one of: {', '.join(SCHEDULERS)}"
+        ) from None
@@ -0,0 +1,311 @@
+import re
+import sys
+import types
+import asyncio
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import openai
+
+from core.agent_manager import AgentManager
+from core.retrieval import ContextIndex
+
+# Client-supplied ids are used as dictionary keys and echoed back, so keep them simple
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# Tries at measuring a session's memory while it is in use before reporting it as unknown
+MEMORY_MEASURE_ATTEMPTS = 3
+
+# Referenced by a session but not its own: the context index is shared by every session that
+# uploaded the same content, the clients by all of them, and bound methods (an agent's
+# context_provider) lead back to objects measured on their own or shared
+SHARED_TYPES = (
+    ContextIndex, openai.OpenAI, openai.AsyncOpenAI,
+    types.MethodType, types.FunctionType, types.BuiltinFunctionType, types.ModuleType, type,
+)
+
+# Runs each session's speculative next exchange (at most one per session)
+SPECULATION_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculate")
+
+
+class SessionLimitError(Exception):
+    """Raised when a new session is needed but every slot is taken by a busy session."""
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    Approximate memory held by obj and everything it references (containers, __dict__,
+    __slots__), not counting SHARED_TYPES.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, SHARED_TYPES):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    else:
+        if hasattr(obj, "__dict__"):
+            size += deep_sizeof(vars(obj), seen)
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                size += deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+
+class DebateSession:
+    """One client's debate: its own AgentManager plus the lock that serializes its exchanges."""
+
+    def __init__(self, session_id: str, manager: AgentManager):
+        self.session_id = session_id
+        self.manager = manager
+        self.lock = threading.Lock()
+        # Used instead of lock when the session is served from an event loop (asgi.py)
+        self.async_lock = asyncio.Lock()
+        self.topic = ""
+        self.last_response = ""
+        # Whole-debate recording (core.episode.EpisodeTrack), started with each new topic;
+        # the ids of all of them are kept so they can be deleted with the session
+        self.episode = None
+        self.episode_ids: List[str] = []
+        # Uploaded context document (core.retrieval.ContextIndex), kept across debates
+        self.context_index = None
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        # (state it was measured at, bytes) of the last memory_bytes walk
+        self._memory: Optional[Tuple[Hashable, int]] = None
+        # The next exchange, generated in the background while the client plays the current one
+        self._speculation: Optional[Future] = None
+        self._speculation_key: Optional[Hashable] = None
+        self._speculation_cancel: Optional[threading.Event] = None
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
+    def is_busy(self) -> bool:
+        speculating = self._speculation is not None and not self._speculation.done()
+        return self.lock.locked() or self.async_lock.locked() or speculating
+
+    # --- Speculative exchanges (callers hold self.lock) ---
+
+    def speculate(self, key: Hashable, job: Callable[[threading.Event], Any]) -> None:
+        """
+        Starts job in the background as this session's next exchange. job receives an
+        Event that is set when the speculation is cancelled. key identifies what was
+        speculated on (e.g. the topic); take_speculation only hands out a matching job.
+        """
+        self.cancel_speculation()
+        self._speculation_cancel = threading.Event()
+        self._speculation_key = key
+        self._speculation = SPECULATION_EXECUTOR.submit(job, self._speculation_cancel)
+
+    def take_speculation(self, key: Hashable) -> Optional[Future]:
+        """
+        Removes and returns the speculative job for key, finished or still running.
+        A speculation made for a different key is cancelled and None is returned.
+        """
+        future, self._speculation = self._speculation, None
+        if future is not None and self._speculation_key != key:
+            self._speculation = future
+            self.cancel_speculation()
+            return None
+        return future
+
+    def cancel_speculation(self) -> None:
+        if self._speculation is not None:
+            self._speculation_cancel.set()
+            self._speculation.cancel()
+        self._speculation = self._speculation_key = self._speculation_cancel = None
+
+    def wait_for_speculation(self) -> None:
+        """
+        Blocks until a running speculative job is done with the manager, so it can be changed
+        in place (callers hold self.lock). The job's result stays available to take_speculation.
+        """
+        if self._speculation is not None:
+            wait([self._speculation])
+
+    def speculation_state(self) -> Optional[str]:
+        if self._speculation is None:
+            return None
+        return "ready" if self._speculation.done() else "running"
+
+    def apply_request(self, agent_1: str, agent_2: str, topic: str, end: bool) -> bool:
+        """
+        Applies the end/topic fields of a request (callers hold the session's lock). Ending the
+        debate or changing its topic starts a new one and drops any speculative exchange; a new
+        debate gets fresh agents, grounded in the uploaded context document if there is one.
+        Returns whether a new debate was started.
+        """
+        topic_changed = bool(self.topic) and topic != self.topic
+        if end or topic_changed:
+            self.cancel_speculation()
+            self.topic = ""
+
+        if self.topic:
+            return False
+        self.manager = AgentManager(agent_1, agent_2)
+        self.manager.set_context_index(self.context_index)
+        self.topic = topic
+        return True
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_used
+
+    def memory_bytes(self) -> Optional[int]:
+        """
+        Approximate memory of the debate, or None if it could not be measured. It is walked
+        without the session lock (an exchange or speculation may hold it for seconds), so a
+        container resized meanwhile can break the walk; a few attempts are made. The result
+        is reused until the debate changes (a new manager, turn or request).
+        """
+        manager = self.manager
+        state = (id(manager), len(manager.transcript), self.last_used)
+        if self._memory is not None and self._memory[0] == state:
+            return self._memory[1]
+        for _ in range(MEMORY_MEASURE_ATTEMPTS):
+            try:
+                size = deep_sizeof(manager)
+            except RuntimeError:  # "dictionary/set changed size during iteration"
+                continue
+            self._memory = (state, size)
+            return size
+        return None
+
+
+class SessionStore:
+    """
+    Live debate sessions keyed by session id.
+
+    Sessions idle for longer than ttl_seconds are dropped, and at most max_sessions are kept:
+    when the store is full the least recently used idle session makes room for a new one.
+    on_evict is called with every session that is dropped or removed (outside the store
+    lock), to release what it holds outside memory.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 30 * 60,
+        max_sessions: int = 100,
+        on_evict: Optional[Callable[[DebateSession], None]] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        # Least recently used first
+        self._sessions: "OrderedDict[str, DebateSession]" = OrderedDict()
+        self.evicted = 0
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> Optional[DebateSession]:
+        with self._lock:
+            evicted = self._evict_expired()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.touch()
+        self._release(evicted)
+        return session
+
+    def get_or_create(
+        self, session_id: Optional[str], factory: Callable[[], AgentManager]
+    ) -> DebateSession:
+        """
+        Returns the session for session_id, creating it (with a server-issued id when
+        session_id is missing or malformed) if it does not exist yet.
+        """
+        if not session_id or not SESSION_ID_PATTERN.match(session_id):
+            session_id = self.new_session_id()
+
+        session = self.get(session_id)
+        if session is not None:
+            return session
+
+        # Build the manager outside the store lock, it is the slow part
+        session = DebateSession(session_id, factory())
+        evicted = []
+        with self._lock:
+            existing = self._sessions.get(session_id)
+            if existing is not None:
+                return existing
+            if len(self._sessions) >= self.max_sessions:
+                evicted = self._evict_least_recently_used()
+            self._sessions[session_id] = session
+        self._release(evicted)
+        return session
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        self._release([session] if session is not None else [])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            evicted = self._evict_expired()
+            sessions = list(self._sessions.values())
+        self._release(evicted)
+
+        per_session = {
+            s.session_id: {
+                "idle_s": round(s.idle_seconds(), 1),
+                "turns": len(s.manager.dialogue_history),
+                "memory_bytes": s.memory_bytes(),
+                "context": s.manager.context_stats(),
+                "speculation": s.speculation_state(),
+            }
+            for s in sessions
+        }
+        return {
+            "live": len(sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "evicted": self.evicted,
+            "total_memory_bytes": sum(s["memory_bytes"] or 0 for s in per_session.values()),
+            "sessions": per_session,
+        }
+
+    def _release(self, sessions: List[DebateSession]) -> None:
+        if self.on_evict is None:
+            return
+        for session in sessions:
+            try:
+                self.on_evict(session)
+            except Exception as e:
+                print(f"Could not release session {session.session_id}: {e}")
+
+    # --- Eviction (callers hold self._lock and pass the result to _release) ---
+
+    def _evict_expired(self) -> List[DebateSession]:
+        expired = [
+            sid for sid, s in self._sessions.items()
+            if s.idle_seconds() > self.ttl_seconds and not s.is_busy()
+        ]
+        self.evicted += len(expired)
+        return [self._sessions.pop(sid) for sid in expired]
+
+    def _evict_least_recently_used(self) -> List[DebateSession]:
+        for sid, session in self._sessions.items():
+            # A session in the middle of an exchange is never dropped
+            if not session.is_busy():
+                del self._sessions[sid]
+                self.evicted += 1
+                return [session]
+        raise SessionLimitError(f"All {self.max_sessions} debate sessions are busy")
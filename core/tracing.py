@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Set BOSON_TRACING=0 to turn every span into a no-op
+TRACING_ENABLED = os.getenv("BOSON_TRACING", "1") != "0"
+# Optional JSONL file that receives one line per finished span
+TRACE_FILE = os.getenv("BOSON_TRACE_FILE") or None
+
+# Upper bounds (seconds) of the duration histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "bosons"
+
+
+class Metrics:
+    """Per-stage duration histograms and labelled counters, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # stage -> [count per bucket (+Inf last), sum of seconds, count]
+        self._histograms: Dict[str, List[Any]] = {}
+        # (name, sorted label items) -> value
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            else:
+                histogram[0][-1] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        lines = []
+        with self._lock:
+            name = f"{METRIC_PREFIX}_stage_duration_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for stage, (counts, total, count) in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+            typed = set()
+            for (counter, labels), value in sorted(self._counters.items()):
+                full_name = f"{METRIC_PREFIX}_{counter}"
+                if full_name not in typed:
+                    lines.append(f"# TYPE {full_name} counter")
+                    typed.add(full_name)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{full_name}{{{label_text}}} {value:g}")
+
+        for gauge, value in sorted((gauges or {}).items()):
+            full_name = f"{METRIC_PREFIX}_{gauge}"
+            lines.append(f"# TYPE {full_name} gauge")
+            lines.append(f"{full_name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+class Trace:
+    """The spans recorded while serving one request, used for its Server-Timing header."""
+
+    __slots__ = ("name", "trace_id", "spans")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.spans: List[Tuple[str, float]] = []
+
+    def server_timing(self, extra_ms: Optional[Dict[str, float]] = None) -> str:
+        """
+        Server-Timing header value: extra_ms (e.g. the pipeline's stage timings) followed by
+        the total time of every span name recorded in this trace.
+        """
+        totals: Dict[str, float] = dict(extra_ms or {})
+        for name, ms in self.spans:
+            key = f"span.{name}"
+            totals[key] = totals.get(key, 0.0) + ms
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in totals.items())
+
+
+_current_trace: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar(
+    "current_trace", default=None
+)
+_sink_lock = threading.Lock()
+
+
+def _write_sink(record: Dict[str, Any]) -> None:
+    line = json.dumps(record, default=str)
+    with _sink_lock:
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "start")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        seconds = time.perf_counter() - self.start
+        METRICS.observe(self.name, seconds)
+        if exc_type is not None:
+            METRICS.inc("stage_errors_total", stage=self.name, error=exc_type.__name__)
+
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((self.name, seconds * 1000))
+
+        if TRACE_FILE:
+            record = {
+                "ts": time.time(),
+                "trace": trace.trace_id if trace is not None else None,
+                "span": self.name,
+                "ms": round(seconds * 1000, 3),
+            }
+            if exc_type is not None:
+                record["error"] = exc_type.__name__
+            record.update(self.attrs)
+            _write_sink(record)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attrs: Any):
+    """
+    Times the enclosed block as stage name: the duration goes into the stage histogram,
+    the current request's trace and the JSONL sink. A shared no-op when tracing is off.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name, attrs)
+
+
+class trace:
+    """Collects the spans of one request: `with trace("api.test") as t: ...; t.server_timing()`."""
+
+    def __init__(self, name: str):
+        self._trace = Trace(name)
+        self._token = None
+        self._start = 0.0
+
+    def __enter__(self) -> Trace:
+        self._token = _current_trace.set(self._trace)
+        self._start = time.perf_counter()
+        return self._trace
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_trace.reset(self._token)
+        if TRACING_ENABLED:
+            METRICS.observe(self._trace.name, time.perf_counter() - self._start)
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    Wraps fn to run in a copy of the caller's context, so spans in a worker thread join the
+    request's trace and its API calls keep the caller's rate-limit priority (core/ratelimit.py).
+    Call it once per submission: a context can only run in one thread at a time.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+
+    return run
+
+
+def record_usage(usage: Any, model: str) -> None:
+    """Adds the token counts of a chat completion (response.usage) to the counters."""
+    if usage is None or not TRACING_ENABLED:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            METRICS.inc("llm_tokens_total", value, model=model, kind=kind.split("_")[0])
@@ -0,0 +1,186 @@
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from openai.types.chat import ChatCompletionMessageParam
+
+# Speaker id of text that does not come from an agent (the user's topic, a moderator prompt)
+MODERATOR = -1
+
+
+class Utterance:
+    """One line of the debate. Slotted so a long transcript stays small."""
+
+    __slots__ = ("speaker", "text")
+
+    def __init__(self, speaker: int, text: str):
+        self.speaker = speaker
+        self.text = text
+
+
+class Transcript:
+    """
+    The single, append-only record of a debate, shared by all agents.
+    Each utterance is stored once; agents read it through TranscriptViews.
+    """
+
+    def __init__(self):
+        self._records: List[Utterance] = []
+        # Moderator prompts by text, so a prompt given again (the topic) is not stored twice
+        self._prompts: Dict[str, Utterance] = {}
+
+    def append(self, speaker: int, text: str) -> Utterance:
+        record = Utterance(speaker, text)
+        self._records.append(record)
+        return record
+
+    def prompt(self, text: str, owner: int) -> Tuple[Utterance, bool]:
+        """
+        The record for a prompt given to agent owner, and whether it was newly added. A prompt
+        is normally the other speaker's latest line, which is already in the transcript, or a
+        moderator prompt seen before (the topic); anything else is recorded once.
+        """
+        last = self.last()
+        if last is not None and last.speaker != owner and last.text == text:
+            return last, False
+        record = self._prompts.get(text)
+        if record is not None:
+            return record, False
+        record = self._prompts[text] = self.append(MODERATOR, text)
+        return record, True
+
+    def discard_last(self, record: Utterance) -> None:
+        """Rolls back record if it is still the newest entry (used when a turn fails)."""
+        if self._records and self._records[-1] is record:
+            self._records.pop()
+            if self._prompts.get(record.text) is record:
+                del self._prompts[record.text]
+
+    def truncate(self, length: int) -> List[Utterance]:
+        """Drops every record after the first length and returns them (see AgentManager.rollback)."""
+        removed, self._records = self._records[length:], self._records[:length]
+        for record in removed:
+            if self._prompts.get(record.text) is record:
+                del self._prompts[record.text]
+        return removed
+
+    def last(self) -> Optional[Utterance]:
+        return self._records[-1] if self._records else None
+
+    def view(
+        self, owner: int, persona: str, format_prompt: Callable[[str], str]
+    ) -> "TranscriptView":
+        return TranscriptView(self, owner, persona, format_prompt)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
+
+    def __iter__(self) -> Iterator[Utterance]:
+        return iter(self._records)
+
+
+class TranscriptView:
+    """
+    One agent's chat history over a shared Transcript.
+
+    An agent sees the same messages it would with a private history: the prompts it was
+    given ("user", rendered with format_prompt) and its own replies ("assistant"), in order.
+    Other agents' exchanges it was not part of stay out of its prompt. The view only holds
+    references to transcript records, so each text is stored once however many agents
+    see it. Rendering is deterministic, so the messages for earlier turns are
+    byte-identical from one request to the next and upstream prefix/KV caches keep hitting.
+
+    It supports the list operations LLMAgent performs on its history (indexing, len,
+    iteration, append, pop, and deleting folded turns), so it can be used in its place.
+    """
+
+    def __init__(
+        self,
+        transcript: Transcript,
+        owner: int,
+        persona: str,
+        format_prompt: Callable[[str], str],
+    ):
+        self.transcript = transcript
+        self.owner = owner
+        self.persona = persona
+        self.format_prompt = format_prompt
+        # The records this agent was prompted with or said (folded ones are dropped)
+        self._records: List[Utterance] = []
+        # How many records were dropped from the front (folded or reset), so mark() keeps counting
+        self._dropped = 0
+        # Record added by the last prompt append, so a failed turn can be rolled back
+        self._pending_prompt: Optional[Utterance] = None
+        self._pending = False
+
+    def _message(self, record: Utterance) -> ChatCompletionMessageParam:
+        if record.speaker == self.owner:
+            return {"role": "assistant", "content": record.text}
+        return {"role": "user", "content": self.format_prompt(record.text)}
+
+    def __len__(self) -> int:
+        return 1 + len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index == 0:
+            return {"role": "system", "content": self.persona}
+        if not 0 < index < len(self):
+            raise IndexError("transcript view index out of range")
+        return self._message(self._records[index - 1])
+
+    def __iter__(self) -> Iterator[ChatCompletionMessageParam]:
+        yield {"role": "system", "content": self.persona}
+        for record in list(self._records):
+            yield self._message(record)
+
+    def append(self, message: ChatCompletionMessageParam) -> None:
+        if message["role"] == "assistant":
+            self._records.append(self.transcript.append(self.owner, message["content"]))
+            self._pending, self._pending_prompt = False, None
+            return
+
+        record, created = self.transcript.prompt(message["content"], self.owner)
+        self._records.append(record)
+        self._pending_prompt = record if created else None
+        self._pending = True
+
+    def pop(self) -> ChatCompletionMessageParam:
+        """Undoes the last prompt append (LLMAgent calls this when a request fails)."""
+        message = self[-1]
+        if self._pending:
+            self._records.pop()
+            if self._pending_prompt is not None:
+                self.transcript.discard_last(self._pending_prompt)
+        self._pending, self._pending_prompt = False, None
+        return message
+
+    def __delitem__(self, index) -> None:
+        # Only folding the oldest turns (del history[1:n]) is meaningful for a shared transcript
+        if not isinstance(index, slice) or index.start != 1 or index.step not in (None, 1):
+            raise TypeError("a transcript view only supports deleting its oldest messages")
+        count = max(0, min(index.stop, len(self)) - 1)
+        del self._records[:count]
+        self._dropped += count
+
+    def mark(self) -> int:
+        """Position to rewind to: how many records this view has been given so far."""
+        return self._dropped + len(self._records)
+
+    def rewind(self, mark: int) -> None:
+        """
+        Drops every record given to this view after mark, including prompts that were reused
+        from earlier in the transcript and so are not removed by Transcript.truncate.
+        """
+        del self._records[max(0, mark - self._dropped):]
+        self._pending, self._pending_prompt = False, None
+
+    def reset(self) -> None:
+        """Hides everything said so far from this agent."""
+        self._dropped += len(self._records)
+        self._records = []
+        self._pending, self._pending_prompt = False, None
@@ -0,0 +1,258 @@
+import os
+import asyncio
+import hashlib
+import json
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class TTSCache:
+    """
+    Two-tier cache for synthesized speech.
+
+    Entries are keyed on everything that changes the audio (model, voice, normalized text,
+    speed factor and format). A bounded in-memory LRU sits in front of a size-capped
+    directory on disk, and concurrent requests for the same key share a single synthesis.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # key -> size of the file on disk, oldest (least recently used) first
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        # key -> Future of the synthesis currently running for it
+        self._in_flight: Dict[str, Future] = {}
+        # Same for syntheses running on an event loop (see aget_or_create)
+        self._async_in_flight: Dict[str, asyncio.Future] = {}
+
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(model: str, voice: str, text: str, speed_factor: float, audio_format: str) -> str:
+        """Content address of one synthesis. Whitespace and Unicode form do not change the key."""
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        payload = json.dumps(
+            [model, voice, normalized, round(float(speed_factor), 3), audio_format],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the cached audio for key, or None. Disk hits are promoted to memory."""
+        with self._lock:
+            data = self._get_memory(key)
+        if data is not None:
+            return data
+
+        data = self._read_disk(key)
+        if data is None:
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+
+        with self._lock:
+            self._counters["disk_hits"] += 1
+            self._store_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if not data:
+            return
+        with self._lock:
+            self._store_memory(key, data)
+        self._write_disk(key, data)
+
+    def get_or_create(self, key: str, create: Callable[[], bytes]) -> bytes:
+        """
+        Returns the cached audio for key, calling create() on a miss.
+        If another thread is already creating the same key, waits for its result instead.
+        """
+        with self._lock:
+            data = self._get_memory(key)
+            if data is not None:
+                return data
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                owner = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            data = self.get(key)
+            if data is None:
+                data = create()
+                self.put(key, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    async def aget_or_create(self, key: str, create: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Event-loop version of get_or_create: create is a coroutine function, and concurrent
+        tasks asking for the same key await one shared synthesis. Disk access runs in a thread.
+        """
+        with self._lock:
+            data = self._get_memory(key)
+            if data is not None:
+                return data
+            future = self._async_in_flight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+
+        if future is not None:
+            # shield: a cancelled waiter must not cancel the synthesis the others share
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_in_flight[key] = future
+        try:
+            data = await asyncio.to_thread(self.get, key)
+            if data is None:
+                data = await create()
+                await asyncio.to_thread(self.put, key, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case no other task was waiting
+            future.exception()
+            raise
+        finally:
+            self._async_in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(
+                self._counters,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_bytes,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_bytes,
+                in_flight=len(self._in_flight) + len(self._async_in_flight),
+            )
+
+    # --- Memory tier (callers hold self._lock) ---
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self._counters["memory_hits"] += 1
+        return data
+
+    def _store_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters["memory_evictions"] += 1
+
+    # --- Disk tier ---
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.bin")
+
+    def _load_disk_index(self) -> None:
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith(".bin"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        with self._lock:
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            # Refresh the mtime so the LRU order survives a restart
+            os.utime(self._path(key))
+            return data
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        if not self.disk_dir or len(data) > self.max_disk_bytes:
+            return
+
+        # Write under a temporary name so readers never see a partial file
+        tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"TTS cache: could not write {key}: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.max_disk_bytes:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self._counters["disk_evictions"] += 1
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
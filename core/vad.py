@@ -0,0 +1,135 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# Analysis frame of the voice-activity detector
+VAD_FRAME_MS = 30
+# A frame is silent if it is this far below the loud (95th percentile) frames of the clip,
+# or below the absolute floor in any case
+SILENCE_RANGE_DB = 35.0
+SILENCE_FLOOR_DB = -55.0
+# Zero-crossing rate (crossings per sample) above which a frame is noise-like (hiss, wind)
+# rather than speech; quieter frames within FRICATIVE_RANGE_DB of the threshold still count
+# as speech if their rate is in the range of fricatives (s, f, sh)
+ZCR_NOISE = 0.45
+ZCR_FRICATIVE = 0.15
+FRICATIVE_RANGE_DB = 10.0
+
+
+def frame_levels_db(samples: np.ndarray, frame: int) -> np.ndarray:
+    """RMS level in dBFS of each whole frame of float samples in [-1, 1]."""
+    count = len(samples) // frame
+    frames = samples[:count * frame].reshape(count, frame).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+
+def frame_zcr(samples: np.ndarray, frame: int) -> np.ndarray:
+    """Zero-crossing rate of each whole frame, in crossings per sample."""
+    count = len(samples) // frame
+    signs = np.signbit(samples[:count * frame].reshape(count, frame))
+    return np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+
+
+def silence_threshold_db(levels: np.ndarray) -> float:
+    if not len(levels):
+        return SILENCE_FLOOR_DB
+    return max(SILENCE_FLOOR_DB, float(np.percentile(levels, 95)) - SILENCE_RANGE_DB)
+
+
+def plan_segments(
+    samples: np.ndarray,
+    sample_rate: int,
+    max_segment_s: float,
+    overlap_s: float = 0.0,
+) -> List[Tuple[int, int]]:
+    """
+    Splits a mono clip into (start, end) sample ranges of at most max_segment_s (plus the
+    overlap), cutting in silences.
+
+    Each cut is placed in the middle of the longest silent stretch within the second half
+    of the allowed window, or at the quietest frame there if no frame is silent. Segments
+    are then widened so that neighbours share overlap_s of audio, and a word that straddles
+    a cut is complete in at least one of them.
+    """
+    frame = max(1, sample_rate * VAD_FRAME_MS // 1000)
+    total = len(samples)
+    max_frames = max(1, int(max_segment_s * sample_rate) // frame)
+    levels = frame_levels_db(samples, frame)
+    silent = levels < silence_threshold_db(levels)
+
+    cuts = [0]
+    start = 0  # in frames
+    while (total - start * frame) > max_frames * frame:
+        low, high = start + max_frames // 2, start + max_frames
+        window = silent[low:high]
+        if window.any():
+            # Longest run of silent frames in the window
+            edges = np.diff(np.concatenate(([0], window.astype(np.int8), [0])))
+            run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+            longest = int(np.argmax(run_ends - run_starts))
+            cut = low + (run_starts[longest] + run_ends[longest]) // 2
+        else:
+            cut = low + int(np.argmin(levels[low:high]))
+        cut = max(int(cut), start + 1)
+        cuts.append(cut * frame)
+        start = cut
+    cuts.append(total)
+
+    overlap = int(overlap_s * sample_rate / 2)
+    return [
+        (max(0, a - overlap), min(total, b + overlap))
+        for a, b in zip(cuts[:-1], cuts[1:])
+    ]
+
+
+def speech_frames(levels: np.ndarray, zcr: np.ndarray) -> np.ndarray:
+    """Per-frame speech mask from frame levels and zero-crossing rates."""
+    threshold = silence_threshold_db(levels)
+    voiced = (levels >= threshold) & (zcr < ZCR_NOISE)
+    fricative = (
+        (levels >= threshold - FRICATIVE_RANGE_DB) & (zcr >= ZCR_FRICATIVE) & (zcr < ZCR_NOISE)
+    )
+    return voiced | fricative
+
+
+class StreamingVAD:
+    """
+    Voice-activity detection over audio fed block by block, so a recording of any length
+    can be scanned without holding it in memory. Only two numbers per frame are kept
+    (about 0.5 MB per hour); the speech decision is made by speech_mask() once the
+    whole level distribution is known.
+    """
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.frame = max(1, sample_rate * VAD_FRAME_MS // 1000)
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._levels: List[np.ndarray] = []
+        self._zcr: List[np.ndarray] = []
+
+    @property
+    def frames(self) -> int:
+        return sum(len(levels) for levels in self._levels)
+
+    def process(self, block: np.ndarray) -> None:
+        """Adds mono float samples; a partial frame at the end waits for the next block."""
+        samples = np.concatenate((self._carry, block.astype(np.float32, copy=False)))
+        whole = len(samples) - len(samples) % self.frame
+        self._levels.append(frame_levels_db(samples[:whole], self.frame))
+        self._zcr.append(frame_zcr(samples[:whole], self.frame))
+        self._carry = samples[whole:]
+
+    def speech_mask(self) -> np.ndarray:
+        if not self._levels:
+            return np.zeros(0, dtype=bool)
+        return speech_frames(np.concatenate(self._levels), np.concatenate(self._zcr))
+
+
+def densest_window(mask: np.ndarray, frames: int) -> Tuple[int, int]:
+    """(start, end) frames of the window of the given length holding the most speech frames."""
+    if len(mask) <= frames:
+        return 0, len(mask)
+    counts = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    start = int(np.argmax(counts[frames:] - counts[:-frames]))
+    return start, start + frames
@@ -0,0 +1,117 @@
+import os
+import mmap
+import base64
+import threading
+import soundfile as sf
+from core import tracing
+from typing import Dict, List, Optional
+
+
+class VoiceProfile:
+    """
+    A reference voice for cloning: the transcript of the reference clip plus the clip itself,
+    loaded once and kept base64-encoded so clone requests can use it directly.
+    """
+
+    def __init__(self, name: str, transcript: str, path: str, use_mmap: bool = False):
+        self.name = name
+        self.transcript = transcript
+        self.path = path
+        self.audio_format = os.path.splitext(path)[1].lstrip(".").lower() or "wav"
+        self.use_mmap = use_mmap
+
+        self.audio_base64 = ""
+        self.audio_bytes = 0  # size of the reference file
+        self.payload_bytes = 0  # size of the base64 payload sent with every clone request
+        self.duration_s = 0.0
+        self.error: Optional[str] = None
+
+    @property
+    def is_valid(self) -> bool:
+        return self.error is None and bool(self.audio_base64)
+
+    def load(self) -> "VoiceProfile":
+        """Reads, validates and encodes the reference clip. Problems are recorded in self.error."""
+        try:
+            if not os.path.isfile(self.path):
+                raise FileNotFoundError(self.path)
+            info = sf.info(self.path)
+            if info.frames == 0:
+                raise ValueError("reference clip contains no audio")
+
+            with tracing.span("voice.load", voice=self.name), open(self.path, "rb") as f:
+                if self.use_mmap:
+                    # Encode straight from the page cache instead of copying the file into memory first
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        encoded = base64.b64encode(mapped)
+                else:
+                    encoded = base64.b64encode(f.read())
+
+            self.audio_base64 = encoded.decode("ascii")
+            self.audio_bytes = os.path.getsize(self.path)
+            self.payload_bytes = len(encoded)
+            self.duration_s = info.frames / info.samplerate
+            self.error = None
+        except FileNotFoundError:
+            self.error = f"reference file not found at {self.path}"
+        except Exception as e:
+            self.error = f"could not load {self.path}: {e}"
+        return self
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            "path": self.path,
+            "format": self.audio_format,
+            "duration_s": round(self.duration_s, 2),
+            "audio_bytes": self.audio_bytes,
+            "payload_bytes": self.payload_bytes,
+            "valid": self.is_valid,
+            "error": self.error,
+        }
+
+
+class VoiceRegistry:
+    """Thread-safe collection of VoiceProfiles, loaded when they are registered."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, VoiceProfile] = {}
+
+    def register(
+        self, name: str, transcript: str, path: str, use_mmap: bool = False
+    ) -> VoiceProfile:
+        """Loads the reference clip at path and adds (or replaces) the voice called name."""
+        profile = VoiceProfile(name, transcript, path, use_mmap=use_mmap).load()
+        if profile.error:
+            print(f"Error: voice profile '{name}' is not usable: {profile.error}")
+
+        with self._lock:
+            self._profiles[name] = profile
+        return profile
+
+    def get(self, name: str) -> VoiceProfile:
+        """Returns a usable profile, raising KeyError/ValueError for unknown or broken voices."""
+        with self._lock:
+            profile = self._profiles.get(name)
+        if profile is None:
+            raise KeyError(f"Unknown voice profile: {name}")
+        if not profile.is_valid:
+            raise ValueError(f"Voice profile '{name}' is not usable: {profile.error}")
+        return profile
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            self._profiles.pop(name, None)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._profiles)
+
+    def validate(self) -> Dict[str, str]:
+        """Returns {name: error} for every profile that cannot be used."""
+        with self._lock:
+            return {name: p.error for name, p in self._profiles.items() if not p.is_valid}
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {name: p.describe() for name, p in self._profiles.items()}
@@ -2,8 +2,9 @@ import gradio as gr
 import os
 from typing import Optional, Any, Tuple, List
 
+from core.retrieval import ALLOWED_FILE_TYPES
+
 # --- Constants ---
-ALLOWED_FILE_TYPES = [".docx", ".pdf", ".txt"]
 # Placeholder agent names - these will come from configuration later
 AGENT_A_NAME = "Agent A (Optimist)"
 AGENT_B_NAME = "Agent B (Concerned)"
@@ -2,8 +2,9 @@ import gradio as gr
 import os
 from typing import Optional, Any
 
+from core.retrieval import ALLOWED_FILE_TYPES
+
 # --- Constants ---
-ALLOWED_FILE_TYPES = [".docx", ".pdf", ".txt"]
 
 # --- Gradio Interface Definition ---
 
@@ -0,0 +1,5 @@
+import os
+
+# core.audio_api builds its API clients at import time and refuses to without a key;
+# the tests replace whatever client they use, so nothing is sent with it
+os.environ.setdefault("BOSON_API_KEY", "test-key")
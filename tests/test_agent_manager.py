@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core import llm_api
+from core.agent_manager import AgentManager
+
+TOPIC = "Should cities ban private cars from their centres?"
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Replaces the LLM with one that answers R1, R2, ... and records every request's messages."""
+    messages_sent = []
+
+    def create(model, messages, **kwargs):
+        messages_sent.append(messages)
+        message = SimpleNamespace(content=f"R{len(messages_sent)}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm_api, "CLIENT", client)
+    return messages_sent
+
+
+def exchange(manager):
+    """What the app does for one exchange: agent A answers the topic, agent B answers A."""
+    return manager.run_turn(manager.run_turn(TOPIC))
+
+
+def roles(messages):
+    return [message["role"] for message in messages]
+
+
+def test_rollback_restores_every_agents_history(sent):
+    manager = AgentManager("hopeful", "worried")
+    exchange(manager)
+    before = [list(agent.history) for agent in manager.agents]
+    transcript = [record.text for record in manager.transcript]
+
+    checkpoint = manager.checkpoint()
+    exchange(manager)
+    assert manager.replies_since(checkpoint) == 2
+    manager.rollback(checkpoint)
+
+    # Agent A's topic prompt is reused from the first exchange, yet it leaves A's history too
+    assert [list(agent.history) for agent in manager.agents] == before
+    assert [record.text for record in manager.transcript] == transcript
+    assert manager.current_speaker is manager.agent_a
+
+    exchange(manager)
+    assert roles(sent[-2]) == ["system", "user", "assistant", "user"]
+    assert roles(sent[-1]) == ["system", "user", "assistant", "user"]
+    assert [record.text for record in manager.transcript] == [TOPIC, "R1", "R2", "R5", "R6"]
+
+
+def test_rollback_after_folding(sent):
+    manager = AgentManager("hopeful", "worried")
+    exchange(manager)
+    exchange(manager)
+    checkpoint = manager.checkpoint()
+    exchange(manager)
+    # The oldest turn of agent A is folded into its summary while the exchange is pending
+    del manager.agent_a.history[1:3]
+    manager.rollback(checkpoint)
+
+    assert roles(manager.agent_a.history) == ["system", "user", "assistant"]
+    assert manager.agent_a.history[-1]["content"] == "R3"
+    assert roles(manager.agent_b.history) == ["system", "user", "assistant", "user", "assistant"]
+
+
+def test_failed_turn_records_no_reply(sent, monkeypatch):
+    manager = AgentManager("hopeful", "worried")
+    exchange(manager)
+    checkpoint = manager.checkpoint()
+
+    def fail(**kwargs):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(llm_api.CLIENT.chat.completions, "create", fail)
+    assert "ERROR" in manager.run_turn(TOPIC)
+    assert manager.replies_since(checkpoint) == 0
+    assert roles(manager.agent_a.history) == ["system", "user", "assistant"]
@@ -0,0 +1,102 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from core import batch_runner, llm_api
+
+
+class FakeLLM:
+    """Answers R1, R2, ...; set failing to make every request fail."""
+
+    def __init__(self):
+        self.calls = 0
+        self.failing = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        if self.failing:
+            raise RuntimeError("upstream down")
+        self.calls += 1
+        message = SimpleNamespace(content=f"R{self.calls}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(llm_api, "CLIENT", fake)
+    return fake
+
+
+def write_jobs(path, *ids, turns=4):
+    with open(path, "w", encoding="utf-8") as f:
+        for job_id in ids:
+            job = {"id": job_id, "topic": "Ban cars?", "persona_a": "for", "persona_b": "against",
+                   "turns": turns, "audio": False}
+            f.write(json.dumps(job) + "\n")
+
+
+def read_turns(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_finished_jobs_are_skipped_not_counted(llm, tmp_path):
+    jobs, out = tmp_path / "jobs.jsonl", tmp_path / "out"
+    write_jobs(jobs, "one", "two")
+
+    first = batch_runner.run_batch(str(jobs), str(out), concurrency=2)
+    assert (first["debates"], first["turns"], first["skipped"]) == (2, 8, 0)
+
+    second = batch_runner.run_batch(str(jobs), str(out), concurrency=2)
+    assert (second["debates"], second["turns"], second["skipped"]) == (0, 0, 2)
+    assert second["debates_per_min"] == 0
+    assert llm.calls == 8
+    with open(out / "summary.json", "r", encoding="utf-8") as f:
+        assert json.load(f)["skipped"] == 2
+
+
+def test_interrupted_job_resumes_from_its_saved_turns(llm, tmp_path):
+    jobs, out = tmp_path / "jobs.jsonl", tmp_path / "out"
+    write_jobs(jobs, "debate")
+    (out / "debate").mkdir(parents=True)
+    saved = [
+        {"turn": 1, "speaker": "a", "text": "Cars choke the centre.", "audio": "turn_01_a.wav"},
+        {"turn": 2, "speaker": "b", "text": "Shops need drivers.", "audio": "turn_02_b.wav"},
+    ]
+    # A torn last line, as left by a run killed mid-write
+    (out / "debate" / "transcript.jsonl").write_text("".join(json.dumps(t) + "\n" for t in saved) + '{"turn": 3, "spe')
+
+    report = batch_runner.run_batch(str(jobs), str(out))
+
+    assert (report["debates"], report["turns"]) == (1, 2)
+    turns = read_turns(out / "debate" / "transcript.jsonl")
+    assert turns[:2] == saved
+    assert [(t["turn"], t["speaker"], t["text"]) for t in turns[2:]] == [(3, "a", "R1"), (4, "b", "R2")]
+    with open(out / "debate" / "result.json", "r", encoding="utf-8") as f:
+        assert json.load(f)["resumed_from_turn"] == 2
+
+
+def test_failed_job_keeps_its_turns_for_the_next_run(llm, tmp_path, monkeypatch):
+    jobs, out = tmp_path / "jobs.jsonl", tmp_path / "out"
+    write_jobs(jobs, "debate")
+
+    # The third turn fails: the agent reports it as text, the runner turns it into a failure
+    original = llm.create
+
+    def fail_third(model, messages, **kwargs):
+        llm.failing = llm.calls == 2
+        return original(model, messages, **kwargs)
+
+    monkeypatch.setattr(llm.chat.completions, "create", fail_third)
+    report = batch_runner.run_batch(str(jobs), str(out))
+    assert (report["debates"], report["failed"], report["turns"]) == (0, 1, 2)
+    assert not (out / "debate" / "result.json").exists()
+    assert [t["text"] for t in read_turns(out / "debate" / "transcript.jsonl")] == ["R1", "R2"]
+
+    monkeypatch.setattr(llm.chat.completions, "create", original)
+    llm.failing = False
+    report = batch_runner.run_batch(str(jobs), str(out))
+    assert (report["debates"], report["failed"], report["turns"]) == (1, 0, 2)
+    assert [t["text"] for t in read_turns(out / "debate" / "transcript.jsonl")] == ["R1", "R2", "R3", "R4"]
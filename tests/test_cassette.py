@@ -0,0 +1,76 @@
+import hashlib
+import json
+import socket
+
+import httpx
+import openai
+import pytest
+
+from bench.run_benchmarks import start_stub
+from bench.stub_server import StubConfig
+from core import cassette
+
+MESSAGES = [{"role": "user", "content": "Should cities ban private cars?"}]
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    return start_stub(StubConfig(latency_ms=0, jitter_ms=0, tokens_per_s=1000, reply_words=8, audio_rtf=0))
+
+
+def cassette_client(url, directory, mode, inner=None):
+    transport = cassette.CassetteTransport(cassette.CassetteStore(str(directory)), mode, inner)
+    return openai.OpenAI(api_key="x", base_url=url, max_retries=0, http_client=httpx.Client(transport=transport))
+
+
+def session(client):
+    """The calls the app makes: a chat reply, a streamed one and streamed speech."""
+    reply = client.chat.completions.create(model="m", messages=MESSAGES).choices[0].message.content
+    follow_up = MESSAGES + [{"role": "assistant", "content": reply}]
+    stream = client.chat.completions.create(model="m", messages=follow_up, stream=True)
+    streamed = "".join(chunk.choices[0].delta.content or "" for chunk in stream)
+    with client.audio.speech.with_streaming_response.create(model="tts", voice="v", input=reply) as response:
+        speech = b"".join(response.iter_bytes(4096))
+    return reply, streamed, speech
+
+
+def network_disabled(request):
+    raise AssertionError(f"replay sent {request.method} {request.url} to the network")
+
+
+def test_replay_answers_from_the_recording_without_the_network(stub_url, tmp_path, monkeypatch):
+    recorded = session(cassette_client(stub_url, tmp_path, "record"))
+    assert recorded[0] and recorded[1] and len(recorded[2]) > cassette.INLINE_BODY_BYTES
+
+    monkeypatch.setattr(socket.socket, "connect", lambda *args: pytest.fail("replay opened a connection"))
+    replayer = cassette_client(stub_url, tmp_path, "replay", httpx.MockTransport(network_disabled))
+    assert session(replayer) == recorded
+
+    # Anything not on the cassette is a miss, not a network call
+    with pytest.raises(openai.APIConnectionError):
+        replayer.chat.completions.create(model="m", messages=[{"role": "user", "content": "Something else"}])
+
+
+def chat_request(body, **headers):
+    return httpx.Request("POST", "http://boson.test/v1/chat/completions", content=body,
+                         headers={"content-type": "application/json", **headers})
+
+
+def test_request_key_hashes_the_canonical_request():
+    body = {"model": "m", "messages": MESSAGES, "stream": True}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    expected = hashlib.sha256(f"POST /v1/chat/completions?\n{canonical}".encode()).hexdigest()
+
+    assert cassette.request_key(chat_request(canonical)) == expected
+    # Key order, whitespace and credentials do not change the key
+    reordered = json.dumps(dict(reversed(list(body.items()))), indent=2)
+    assert cassette.request_key(chat_request(reordered, authorization="Bearer other")) == expected
+    # The body does
+    assert cassette.request_key(chat_request(canonical.replace('"m"', '"n"'))) != expected
+
+
+def test_request_key_sorts_the_query():
+    first = httpx.Request("GET", "http://boson.test/v1/models?b=2&a=1")
+    second = httpx.Request("GET", "http://boson.test/v1/models?a=1&b=2")
+    expected = hashlib.sha256(b"GET /v1/models?a=1&b=2\n").hexdigest()
+    assert cassette.request_key(first) == cassette.request_key(second) == expected
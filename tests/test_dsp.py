@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from core.dsp import TimeStretcher, resample, time_stretch
+
+SAMPLE_RATE = 24000
+SPEEDS = [0.5, 0.8, 1.25, 1.5, 2.0]
+
+
+def tone(frequency, rate=SAMPLE_RATE, seconds=1.0, amplitude=1.0):
+    return amplitude * np.sin(2 * np.pi * frequency * np.arange(int(rate * seconds)) / rate)
+
+
+def pcm(samples):
+    return samples.astype("<i2").tobytes()
+
+
+def samples(pcm_bytes):
+    return np.frombuffer(pcm_bytes, dtype="<i2").astype(np.float64)
+
+
+def peak_frequency(signal, rate):
+    size = 1 << 19
+    spectrum = np.abs(np.fft.rfft(signal * np.hanning(len(signal)), size))
+    return np.argmax(spectrum) * rate / size
+
+
+@pytest.mark.parametrize("speed", SPEEDS)
+def test_time_stretch_scales_length_and_keeps_pitch(speed):
+    clip = pcm(tone(220, amplitude=8000))
+    out = samples(time_stretch(clip, speed))
+
+    assert len(out) == pytest.approx(SAMPLE_RATE / speed, abs=SAMPLE_RATE * 0.015)
+    assert peak_frequency(out, SAMPLE_RATE) == pytest.approx(220, abs=0.5)
+
+
+@pytest.mark.parametrize("speed", SPEEDS)
+def test_streamed_time_stretch_matches_one_shot(speed):
+    clip = pcm(tone(220, amplitude=8000))
+    stretcher = TimeStretcher(speed)
+    sizes = np.random.default_rng(0).integers(1, 4000, size=len(clip))
+    parts, position = [], 0
+    for size in sizes:
+        if position >= len(clip):
+            break
+        parts.append(stretcher.process(clip[position:position + 2 * size]))
+        position += 2 * size
+    parts.append(stretcher.flush())
+
+    assert b"".join(parts) == time_stretch(clip, speed)
+
+
+def test_time_stretch_rejects_non_positive_speed():
+    with pytest.raises(ValueError):
+        TimeStretcher(0)
+
+
+@pytest.mark.parametrize("from_rate,to_rate", [(24000, 16000), (16000, 24000), (44100, 24000), (16000, 16000)])
+def test_resample_keeps_length_frequency_and_level(from_rate, to_rate):
+    out = resample(tone(1000, from_rate).astype(np.float32), from_rate, to_rate)
+
+    assert out.dtype == np.float32
+    assert len(out) == to_rate
+    assert peak_frequency(out, to_rate) == pytest.approx(1000, abs=0.5)
+    # Away from the edges the tone keeps its amplitude
+    assert np.abs(out[to_rate // 10:-to_rate // 10]).max() == pytest.approx(1.0, abs=0.01)
+
+
+def test_resample_filters_what_the_new_rate_cannot_hold():
+    # 10 kHz is above the 8 kHz Nyquist frequency of 16 kHz audio; it must not alias back in
+    out = resample(tone(10000).astype(np.float32), 24000, 16000)
+    level_db = 20 * np.log10(np.sqrt(np.mean(out[1600:-1600] ** 2)) / np.sqrt(0.5))
+    assert level_db < -70
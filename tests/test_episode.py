@@ -0,0 +1,79 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from core.episode import WAV_HEADER, EpisodeTrack
+
+RATE = 24000
+
+
+def tone_pcm(frequency, seconds, rate=RATE):
+    t = np.arange(int(rate * seconds)) / rate
+    return (np.sin(2 * np.pi * frequency * t) * 8000).astype("<i2").tobytes()
+
+
+def read_wav(path):
+    with wave.open(str(path), "rb") as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, RATE)
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+
+
+def test_turns_are_appended_with_a_gap_and_chapters(tmp_path):
+    track = EpisodeTrack(directory=str(tmp_path), gap_ms=300, crossfade_ms=20)
+    first = track.append_pcm(tone_pcm(220, 1.0), "a", "Cars choke the centre.")
+    second = track.append_pcm(tone_pcm(330, 0.5), "b", "Shops need drivers.")
+
+    samples = read_wav(track.path)
+    assert len(samples) == track.samples == RATE + RATE * 3 // 10 + RATE // 2
+    # The header sizes match the file, so it plays as it stands
+    assert (tmp_path / f"{track.episode_id}.wav").stat().st_size == WAV_HEADER.size + 2 * len(samples)
+    assert not samples[RATE + 10:RATE + RATE * 3 // 10 - 10].any()
+
+    assert (first["start_s"], first["end_s"]) == (0.0, 1.0)
+    assert (second["start_s"], second["end_s"]) == (1.3, 1.8)
+    assert [(c["turn"], c["speaker"], c["text"]) for c in track.chapters()] == [
+        (1, "a", "Cars choke the centre."),
+        (2, "b", "Shops need drivers."),
+    ]
+
+
+def test_encoded_clips_are_decoded_and_resampled(tmp_path):
+    buffer = io.BytesIO()
+    sf.write(buffer, np.frombuffer(tone_pcm(220, 1.0, rate=16000), dtype="<i2"), 16000, format="FLAC")
+    track = EpisodeTrack(directory=str(tmp_path))
+    chapter = track.append_audio(buffer.getvalue(), "a", "Hello")
+
+    assert chapter["end_s"] == pytest.approx(1.0, abs=0.001)
+    assert len(read_wav(track.path)) == RATE
+
+
+def test_reopening_an_episode_continues_it(tmp_path):
+    clips = [tone_pcm(220, 0.4), tone_pcm(330, 0.3), tone_pcm(440, 0.2)]
+    for gap_ms in (300, 0):
+        whole = EpisodeTrack(directory=str(tmp_path / "whole"), gap_ms=gap_ms)
+        for clip in clips:
+            whole.append_pcm(clip, "a", "")
+
+        track = EpisodeTrack(directory=str(tmp_path / "resumed"), gap_ms=gap_ms)
+        track.append_pcm(clips[0], "a", "")
+        track.append_pcm(clips[1], "a", "")
+        reopened = EpisodeTrack(track.episode_id, directory=str(tmp_path / "resumed"), gap_ms=gap_ms)
+        assert (reopened.samples, reopened.turns) == (track.samples, 2)
+        chapter = reopened.append_pcm(clips[2], "a", "")
+
+        assert chapter["turn"] == 3
+        assert reopened.samples == whole.samples
+        # The crossfade resumes from the samples on disk, which are rounded to 16 bits
+        difference = read_wav(reopened.path).astype(int) - read_wav(whole.path).astype(int)
+        assert np.abs(difference).max() <= 1
+
+
+def test_reopening_at_another_sample_rate_is_refused(tmp_path):
+    track = EpisodeTrack(directory=str(tmp_path))
+    track.append_pcm(tone_pcm(220, 0.1))
+    with pytest.raises(ValueError):
+        EpisodeTrack(track.episode_id, directory=str(tmp_path), sample_rate=16000)
+    assert len(read_wav(track.path)) == track.samples
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core import llm_api
+from core.llm_api import LLMAgent
+
+
+class FakeStream:
+    def __init__(self, deltas, error=None):
+        self.deltas, self.error, self.closed = deltas, error, False
+
+    def __iter__(self):
+        for delta in self.deltas:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))], usage=None)
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    """Each request streams the next FakeStream queued in the returned list."""
+    queued = []
+
+    def create(model, messages, stream=False, **kwargs):
+        return queued.pop(0)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm_api, "CLIENT", client)
+    return queued
+
+
+def agent():
+    return LLMAgent(name="A", persona="You are A", model="m")
+
+
+def test_streamed_reply_is_recorded(streams):
+    streams.append(FakeStream(["Cars ", "must ", "go."]))
+    speaker = agent()
+    sentences = []
+
+    assert "".join(speaker.stream_response("Ban cars?", on_sentence=sentences.append)) == "Cars must go."
+    assert [m["role"] for m in speaker.history] == ["system", "user", "assistant"]
+    assert speaker.history[-1]["content"] == "Cars must go."
+    assert sentences == ["Cars must go."]
+
+
+def test_abandoned_stream_leaves_no_unanswered_prompt(streams):
+    stream = FakeStream(["Cars ", "must ", "go."])
+    streams.append(stream)
+    speaker = agent()
+
+    deltas = speaker.stream_response("Ban cars?")
+    assert next(deltas) == "Cars "
+    deltas.close()  # the client disconnected
+
+    assert stream.closed
+    assert [m["role"] for m in speaker.history] == ["system"]
+
+
+def test_failed_stream_leaves_no_unanswered_prompt(streams):
+    streams.append(FakeStream(["Cars "], error=RuntimeError("connection reset")))
+    speaker = agent()
+
+    with pytest.raises(RuntimeError):
+        list(speaker.stream_response("Ban cars?"))
+    assert [m["role"] for m in speaker.history] == ["system"]
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+
+from core import ratelimit
+
+
+def limited_client(rate, burst, handler):
+    limiter = ratelimit.RateLimiter({"llm": (rate, burst)})
+    transport = ratelimit.RateLimitTransport(limiter, "llm", inner=httpx.MockTransport(handler))
+    return limiter.buckets["llm"], httpx.Client(transport=transport, base_url="http://boson.test/v1")
+
+
+def ok(request):
+    return httpx.Response(200, json={"ok": True})
+
+
+def test_interactive_requests_overtake_queued_batch_ones():
+    served = []
+    bucket, client = limited_client(10, 1, lambda request: served.append(request.headers["x-name"]) or ok(request))
+    client.post("/chat/completions", headers={"x-name": "warmup"})  # takes the only token
+
+    def send(name, level):
+        with ratelimit.priority(level):
+            client.post("/chat/completions", headers={"x-name": name})
+
+    threads = []
+    for name, level in [("batch-1", ratelimit.BATCH), ("batch-2", ratelimit.BATCH), ("interactive", ratelimit.INTERACTIVE)]:
+        threads.append(threading.Thread(target=send, args=(name, level)))
+        threads[-1].start()
+        # Each joins the queue before the next one arrives
+        deadline = time.monotonic() + 1
+        while bucket.queued() < len(threads) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert bucket.queued() == len(threads)
+    for thread in threads:
+        thread.join(5)
+
+    assert served == ["warmup", "interactive", "batch-1", "batch-2"]
+
+
+def test_bucket_refills_at_the_configured_rate():
+    bucket = ratelimit.TokenBucket("llm", rate=20, burst=2)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire(ratelimit.INTERACTIVE)
+    elapsed = time.monotonic() - start
+
+    # The burst is free, the other 4 tokens accrue at 20 per second
+    assert 0.18 <= elapsed < 0.35
+    time.sleep(0.05)
+    assert bucket.tokens() == pytest.approx(1.0, abs=0.3)
+
+
+def test_request_beyond_the_queue_bound_gets_a_final_429(monkeypatch):
+    monkeypatch.setitem(ratelimit.MAX_WAIT_S, ratelimit.INTERACTIVE, 0.5)
+    calls = []
+    _, http = limited_client(1, 1, lambda request: calls.append(request) or ok(request))
+
+    assert http.post("/chat/completions").status_code == 200
+    # The next token is a second away, longer than an interactive request may wait
+    started = time.monotonic()
+    response = http.post("/chat/completions")
+    assert time.monotonic() - started < 0.1
+    assert response.status_code == 429
+    assert response.headers["x-should-retry"] == "false"
+    assert response.headers["retry-after"] == "1"
+    assert response.json()["error"]["code"] == "rate_limit_queue_full"
+
+    # openai surfaces it as RateLimitError without retrying
+    client = openai.OpenAI(api_key="x", base_url="http://boson.test/v1", http_client=http, max_retries=3)
+    with pytest.raises(openai.RateLimitError):
+        client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+    assert len(calls) == 1
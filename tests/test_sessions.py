@@ -0,0 +1,26 @@
+from core.agent_manager import AgentManager
+from core.retrieval import load_context_index
+from core.sessions import DebateSession
+
+
+def test_memory_leaves_out_the_shared_context_index(tmp_path):
+    document = tmp_path / "context.txt"
+    document.write_text("Private cars crowd city centres and pollute the air. " * 2000)
+    index = load_context_index(str(document), str(tmp_path / "cache"))
+
+    plain = DebateSession("plain-session", AgentManager("hopeful", "worried"))
+    grounded = DebateSession("grounded-session", AgentManager("hopeful", "worried"))
+    grounded.context_index = index
+    grounded.manager.set_context_index(index)
+
+    assert grounded.memory_bytes() - plain.memory_bytes() < 1024
+
+
+def test_memory_is_measured_again_once_the_debate_changes():
+    session = DebateSession("some-session", AgentManager("hopeful", "worried"))
+    before = session.memory_bytes()
+    assert session.memory_bytes() == before
+
+    session.manager.agent_a.history.append({"role": "user", "content": "A long opening statement. " * 200})
+    session.manager.agent_a.history.append({"role": "assistant", "content": "Noted."})
+    assert session.memory_bytes() > before + 4000
@@ -0,0 +1,128 @@
+from core.transcript import MODERATOR, Transcript
+
+TOPIC = "Should cities ban private cars?"
+
+
+def prompt(text):
+    return f"Previous Speaker said: {text}."
+
+
+def two_views():
+    transcript = Transcript()
+    a = transcript.view(0, "You are A", prompt)
+    b = transcript.view(1, "You are B", prompt)
+    return transcript, a, b
+
+
+def texts(transcript):
+    return [(record.speaker, record.text) for record in transcript]
+
+
+def test_each_line_is_stored_once_and_seen_in_each_agents_roles():
+    transcript, a, b = two_views()
+    a.append({"role": "user", "content": TOPIC})
+    a.append({"role": "assistant", "content": "Yes."})
+    b.append({"role": "user", "content": "Yes."})
+    b.append({"role": "assistant", "content": "No."})
+    # The topic is given again each exchange; A answers B's line in a panel
+    a.append({"role": "user", "content": TOPIC})
+    a.append({"role": "assistant", "content": "Still yes."})
+
+    assert texts(transcript) == [(MODERATOR, TOPIC), (0, "Yes."), (1, "No."), (0, "Still yes.")]
+    assert list(a) == [
+        {"role": "system", "content": "You are A"},
+        {"role": "user", "content": prompt(TOPIC)},
+        {"role": "assistant", "content": "Yes."},
+        {"role": "user", "content": prompt(TOPIC)},
+        {"role": "assistant", "content": "Still yes."},
+    ]
+    assert list(b) == [
+        {"role": "system", "content": "You are B"},
+        {"role": "user", "content": prompt("Yes.")},
+        {"role": "assistant", "content": "No."},
+    ]
+    assert len(a) == 5 and a[-1] == a[4] and a[1:3] == list(a)[1:3]
+
+
+def test_own_line_is_not_reused_as_a_prompt():
+    transcript, a, _ = two_views()
+    a.append({"role": "user", "content": TOPIC})
+    a.append({"role": "assistant", "content": "Yes."})
+    # A moderator repeating A's own words is a new prompt, not A's reply
+    a.append({"role": "user", "content": "Yes."})
+    assert texts(transcript)[-1] == (MODERATOR, "Yes.")
+
+
+def test_pop_removes_a_new_prompt_but_keeps_a_reused_one():
+    transcript, a, b = two_views()
+    a.append({"role": "user", "content": TOPIC})
+    a.append({"role": "assistant", "content": "Yes."})
+
+    # B's prompt is A's line: popping it leaves the transcript alone
+    b.append({"role": "user", "content": "Yes."})
+    assert b.pop() == {"role": "user", "content": prompt("Yes.")}
+    assert len(b) == 1 and len(transcript) == 2
+
+    # A new moderator prompt is discarded with the failed turn, so it can be given again cleanly
+    a.append({"role": "user", "content": "Closing remarks?"})
+    a.pop()
+    assert texts(transcript) == [(MODERATOR, TOPIC), (0, "Yes.")]
+    a.append({"role": "user", "content": "Closing remarks?"})
+    assert texts(transcript)[-1] == (MODERATOR, "Closing remarks?")
+    assert len(transcript) == 3
+
+
+def test_discard_last_only_removes_the_newest_record():
+    transcript, a, _ = two_views()
+    a.append({"role": "user", "content": TOPIC})
+    a.append({"role": "assistant", "content": "Yes."})
+    topic = transcript[0]
+
+    transcript.discard_last(topic)
+    assert len(transcript) == 2
+    transcript.discard_last(transcript.last())
+    assert texts(transcript) == [(MODERATOR, TOPIC)]
+
+
+def test_truncate_and_rewind_across_two_views():
+    transcript, a, b = two_views()
+    a.append({"role": "user", "content": TOPIC})
+    a.append({"role": "assistant", "content": "Yes."})
+    b.append({"role": "user", "content": "Yes."})
+    b.append({"role": "assistant", "content": "No."})
+    length, marks = len(transcript), (a.mark(), b.mark())
+
+    a.append({"role": "user", "content": TOPIC})
+    a.append({"role": "assistant", "content": "Still yes."})
+    b.append({"role": "user", "content": "Still yes."})
+    b.append({"role": "assistant", "content": "Still no."})
+    a.append({"role": "user", "content": "Final words?"})
+
+    removed = transcript.truncate(length)
+    assert [record.text for record in removed] == ["Still yes.", "Still no.", "Final words?"]
+    # A's reused topic prompt was not removed from the transcript, yet it leaves A's view
+    a.rewind(marks[0])
+    b.rewind(marks[1])
+    assert [m["role"] for m in a] == ["system", "user", "assistant"]
+    assert [m["role"] for m in b] == ["system", "user", "assistant"]
+
+    # Truncated prompts are forgotten, so giving one again records it again
+    a.append({"role": "user", "content": "Final words?"})
+    assert texts(transcript)[-1] == (MODERATOR, "Final words?")
+
+
+def test_folding_drops_the_oldest_turns_of_one_view_only():
+    transcript, a, b = two_views()
+    for reply_a, reply_b in (("A1", "B1"), ("A2", "B2")):
+        a.append({"role": "user", "content": TOPIC})
+        a.append({"role": "assistant", "content": reply_a})
+        b.append({"role": "user", "content": reply_a})
+        b.append({"role": "assistant", "content": reply_b})
+    mark = a.mark()
+
+    del a[1:3]
+    assert [m["content"] for m in a][1:] == [prompt(TOPIC), "A2"]
+    assert len(b) == 5 and len(transcript) == 5
+    # Marks count folded records, so rewinding to a mark taken before the fold is a no-op
+    a.rewind(mark)
+    assert len(a) == 3